@@ -56,8 +56,13 @@ def run_migrations_online():
     and associate a connection with the context.
 
     """
+    configuration = config.get_section(config.config_ini_section)
+    # The database configured in the settings (SQLALCHEMY_DATABASE_URI or POSTGRES_SERVER), by default the SQLite
+    # database of alembic.ini
+    if settings.__fields_set__ & {"SQLALCHEMY_DATABASE_URI", "POSTGRES_SERVER"}:
+        configuration["sqlalchemy.url"] = settings.SQLALCHEMY_DATABASE_URI
     connectable = engine_from_config(
-        config.get_section(config.config_ini_section),
+        configuration,
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
     )
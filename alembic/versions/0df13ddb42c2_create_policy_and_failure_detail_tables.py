@@ -0,0 +1,103 @@
+"""Create policy and failure detail tables
+
+Revision ID: 0df13ddb42c2
+Revises: d7efad102a8a
+Create Date: 2026-10-18 09:12:44.310271
+
+"""
+import sqlalchemy as sa
+from app.db.utils import UtcNow
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import VARCHAR
+
+from alembic import op
+
+revision = "0df13ddb42c2"
+down_revision = "d7efad102a8a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "Policies",
+        sa.Column("PolicyID", sa.String(length=64), primary_key=True),
+        sa.Column(
+            "ReportID",
+            sa.String(length=64),
+            sa.ForeignKey("Reports.ReportID"),
+            nullable=False,
+        ),
+        sa.Column(
+            "PolicyType",
+            sa.Enum(
+                "tlsa",
+                "sts",
+                "no-policy-found",
+                name="PolicyType",
+                native_enum=False,
+                length=16,
+            ),
+            nullable=False,
+        ),
+        sa.Column("PolicyString", sa.JSON(), nullable=False),
+        sa.Column("PolicyDomain", VARCHAR(255), nullable=False),
+        sa.Column("MxHost", VARCHAR(450), nullable=True),
+        sa.Column("TotalSuccessfulSessionCount", sa.Integer(), nullable=False),
+        sa.Column("TotalFailureSessionCount", sa.Integer(), nullable=False),
+        sa.Column("Created", sa.DateTime(), nullable=False, server_default=UtcNow()),
+        sa.Column(
+            "Updated",
+            sa.DateTime(),
+            nullable=False,
+            server_default=UtcNow(),
+            onupdate=UtcNow(),
+        ),
+        sa.PrimaryKeyConstraint("PolicyID"),
+        sa.Index("IX_Policies_ReportID", "ReportID"),
+        sa.Index("IX_Policies_PolicyDomain", "PolicyDomain"),
+    )
+    op.create_table(
+        "FailureDetails",
+        sa.Column(
+            "FailureDetailID", sa.Integer(), primary_key=True, autoincrement=True
+        ),
+        sa.Column(
+            "PolicyID",
+            sa.String(length=64),
+            sa.ForeignKey("Policies.PolicyID"),
+            nullable=False,
+        ),
+        sa.Column(
+            "ReportID",
+            sa.String(length=64),
+            sa.ForeignKey("Reports.ReportID"),
+            nullable=False,
+        ),
+        sa.Column("ResultType", VARCHAR(64), nullable=False),
+        # RFC5952 text representation, at most 45 characters for IPv4-mapped IPv6 addresses
+        sa.Column("SendingMtaIp", VARCHAR(45), nullable=False),
+        sa.Column("ReceivingMxHostname", VARCHAR(255), nullable=True),
+        sa.Column("ReceivingMxHelo", VARCHAR(255), nullable=True),
+        sa.Column("ReceivingIp", VARCHAR(45), nullable=True),
+        sa.Column("FailedSessionCount", sa.Integer(), nullable=False),
+        sa.Column("AdditionalInformation", sa.Text(), nullable=True),
+        sa.Column("FailureReasonCode", sa.Text(), nullable=True),
+        sa.Column("Created", sa.DateTime(), nullable=False, server_default=UtcNow()),
+        sa.Column(
+            "Updated",
+            sa.DateTime(),
+            nullable=False,
+            server_default=UtcNow(),
+            onupdate=UtcNow(),
+        ),
+        sa.PrimaryKeyConstraint("FailureDetailID"),
+        sa.Index("IX_FailureDetails_ReportID", "ReportID"),
+        sa.Index("IX_FailureDetails_ResultType", "ResultType"),
+    )
+
+
+def downgrade():
+    op.drop_table("FailureDetails")
+    op.drop_table("Policies")
@@ -0,0 +1,71 @@
+"""Create daily rollup tables
+
+Revision ID: 2f7a9c0d4b61
+Revises: 8c4d2e6f1a93
+Create Date: 2026-10-18 12:41:52.903116
+
+"""
+import sqlalchemy as sa
+from app.db.utils import UtcNow
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import VARCHAR
+
+from alembic import op
+
+revision = "2f7a9c0d4b61"
+down_revision = "8c4d2e6f1a93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "DailyPolicyRollups",
+        sa.Column("Day", sa.Date(), nullable=False),
+        sa.Column("PolicyDomain", VARCHAR(255), nullable=False),
+        sa.Column(
+            "OrganisationID",
+            sa.String(length=25),
+            sa.ForeignKey("Organisations.OrganisationID"),
+            nullable=False,
+        ),
+        sa.Column("TotalSuccessfulSessionCount", sa.BigInteger(), nullable=False),
+        sa.Column("TotalFailureSessionCount", sa.BigInteger(), nullable=False),
+        sa.Column("Created", sa.DateTime(), nullable=False, server_default=UtcNow()),
+        sa.Column(
+            "Updated",
+            sa.DateTime(),
+            nullable=False,
+            server_default=UtcNow(),
+            onupdate=UtcNow(),
+        ),
+        sa.PrimaryKeyConstraint("Day", "PolicyDomain", "OrganisationID"),
+    )
+    op.create_table(
+        "DailyFailureRollups",
+        sa.Column("Day", sa.Date(), nullable=False),
+        sa.Column("PolicyDomain", VARCHAR(255), nullable=False),
+        sa.Column(
+            "OrganisationID",
+            sa.String(length=25),
+            sa.ForeignKey("Organisations.OrganisationID"),
+            nullable=False,
+        ),
+        sa.Column("ResultType", VARCHAR(64), nullable=False),
+        sa.Column("FailedSessionCount", sa.BigInteger(), nullable=False),
+        sa.Column("Created", sa.DateTime(), nullable=False, server_default=UtcNow()),
+        sa.Column(
+            "Updated",
+            sa.DateTime(),
+            nullable=False,
+            server_default=UtcNow(),
+            onupdate=UtcNow(),
+        ),
+        sa.PrimaryKeyConstraint("Day", "PolicyDomain", "OrganisationID", "ResultType"),
+    )
+
+
+def downgrade():
+    op.drop_table("DailyFailureRollups")
+    op.drop_table("DailyPolicyRollups")
@@ -0,0 +1,28 @@
+"""Add content hash to reports
+
+Revision ID: 5b1e0f3c9a27
+Revises: 0df13ddb42c2
+Create Date: 2026-10-18 10:02:17.524018
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b1e0f3c9a27"
+down_revision = "0df13ddb42c2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Hex encoded SHA-256 of the raw upload, NULL for reports stored before it was recorded
+    op.add_column("Reports", sa.Column("ContentHash", sa.CHAR(64), nullable=True))
+    op.create_index("UX_Reports_ContentHash", "Reports", ["ContentHash"], unique=True)
+
+
+def downgrade():
+    op.drop_index("UX_Reports_ContentHash", table_name="Reports")
+    with op.batch_alter_table("Reports") as batch_op:
+        batch_op.drop_column("ContentHash")
@@ -0,0 +1,43 @@
+"""Create daily failure sketch table
+
+Revision ID: 6e3b8d1f5c07
+Revises: 2f7a9c0d4b61
+Create Date: 2026-10-18 13:22:07.418265
+
+"""
+import sqlalchemy as sa
+from app.db.utils import UtcNow
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import VARCHAR
+
+from alembic import op
+
+revision = "6e3b8d1f5c07"
+down_revision = "2f7a9c0d4b61"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "DailyFailureSketches",
+        sa.Column("Day", sa.Date(), nullable=False),
+        sa.Column("PolicyDomain", VARCHAR(255), nullable=False),
+        sa.Column("Dimension", VARCHAR(32), nullable=False),
+        sa.Column("Counters", sa.JSON(), nullable=False),
+        sa.Column("TotalCount", sa.BigInteger(), nullable=False),
+        sa.Column("Created", sa.DateTime(), nullable=False, server_default=UtcNow()),
+        sa.Column(
+            "Updated",
+            sa.DateTime(),
+            nullable=False,
+            server_default=UtcNow(),
+            onupdate=UtcNow(),
+        ),
+        sa.PrimaryKeyConstraint("Day", "PolicyDomain", "Dimension"),
+    )
+
+
+def downgrade():
+    op.drop_table("DailyFailureSketches")
@@ -0,0 +1,40 @@
+"""Add report listing indexes
+
+Revision ID: 8c4d2e6f1a93
+Revises: 5b1e0f3c9a27
+Create Date: 2026-10-18 11:24:05.118342
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8c4d2e6f1a93"
+down_revision = "5b1e0f3c9a27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pagination on (StartDatetime, ReportID), optionally per organisation
+    op.create_index(
+        "IX_Reports_StartDatetime_ReportID", "Reports", ["StartDatetime", "ReportID"]
+    )
+    op.create_index(
+        "IX_Reports_OrganisationID_StartDatetime_ReportID",
+        "Reports",
+        ["OrganisationID", "StartDatetime", "ReportID"],
+    )
+    # Supersedes the index on PolicyDomain, the filter on the domain is answered from the index alone
+    op.create_index(
+        "IX_Policies_PolicyDomain_ReportID", "Policies", ["PolicyDomain", "ReportID"]
+    )
+    op.drop_index("IX_Policies_PolicyDomain", table_name="Policies")
+
+
+def downgrade():
+    op.create_index("IX_Policies_PolicyDomain", "Policies", ["PolicyDomain"])
+    op.drop_index("IX_Policies_PolicyDomain_ReportID", table_name="Policies")
+    op.drop_index(
+        "IX_Reports_OrganisationID_StartDatetime_ReportID", table_name="Reports"
+    )
+    op.drop_index("IX_Reports_StartDatetime_ReportID", table_name="Reports")
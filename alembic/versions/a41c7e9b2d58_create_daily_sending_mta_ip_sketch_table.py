@@ -0,0 +1,41 @@
+"""Create daily sending MTA IP sketch table
+
+Revision ID: a41c7e9b2d58
+Revises: 6e3b8d1f5c07
+Create Date: 2026-10-18 13:58:41.730912
+
+"""
+import sqlalchemy as sa
+from app.db.utils import UtcNow
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import VARCHAR
+
+from alembic import op
+
+revision = "a41c7e9b2d58"
+down_revision = "6e3b8d1f5c07"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "DailySendingMtaIpSketches",
+        sa.Column("Day", sa.Date(), nullable=False),
+        sa.Column("PolicyDomain", VARCHAR(255), nullable=False),
+        sa.Column("Registers", sa.LargeBinary(), nullable=False),
+        sa.Column("Created", sa.DateTime(), nullable=False, server_default=UtcNow()),
+        sa.Column(
+            "Updated",
+            sa.DateTime(),
+            nullable=False,
+            server_default=UtcNow(),
+            onupdate=UtcNow(),
+        ),
+        sa.PrimaryKeyConstraint("Day", "PolicyDomain"),
+    )
+
+
+def downgrade():
+    op.drop_table("DailySendingMtaIpSketches")
@@ -0,0 +1,40 @@
+"""Add report failure details purged
+
+Revision ID: c93f0a6d7e14
+Revises: a41c7e9b2d58
+Create Date: 2026-10-18 14:47:12.093554
+
+"""
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+from alembic import op
+
+revision = "c93f0a6d7e14"
+down_revision = "a41c7e9b2d58"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # When the failure details were deleted by the retention job
+    op.add_column(
+        "Reports", sa.Column("FailureDetailsPurged", sa.DateTime(), nullable=True)
+    )
+    op.create_index(
+        "IX_Reports_FailureDetailsPurged_StartDatetime",
+        "Reports",
+        ["FailureDetailsPurged", "StartDatetime"],
+    )
+    if op.get_bind().dialect.name == "sqlite":
+        # Lets the retention job return the pages of deleted rows to the file system bit by bit. Only takes effect
+        # after a VACUUM, which cannot run in a transaction.
+        with op.get_context().autocommit_block():
+            op.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            op.execute("VACUUM")
+
+
+def downgrade():
+    op.drop_index("IX_Reports_FailureDetailsPurged_StartDatetime", table_name="Reports")
+    with op.batch_alter_table("Reports") as batch_op:
+        batch_op.drop_column("FailureDetailsPurged")
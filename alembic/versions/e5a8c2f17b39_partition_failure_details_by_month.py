@@ -0,0 +1,240 @@
+"""Partition failure details by month
+
+Revision ID: e5a8c2f17b39
+Revises: c93f0a6d7e14
+Create Date: 2026-10-18 16:05:31.528417
+
+"""
+import datetime
+import re
+from typing import List
+
+import sqlalchemy as sa
+from app.db.utils import UtcNow
+
+# revision identifiers, used by Alembic.
+from sqlalchemy import VARCHAR
+
+from alembic import op
+
+revision = "e5a8c2f17b39"
+down_revision = "c93f0a6d7e14"
+branch_labels = None
+depends_on = None
+
+# The columns of the failure details before they were partitioned
+COLUMNS = (
+    "FailureDetailID",
+    "PolicyID",
+    "ReportID",
+    "ResultType",
+    "SendingMtaIp",
+    "ReceivingMxHostname",
+    "ReceivingMxHelo",
+    "ReceivingIp",
+    "FailedSessionCount",
+    "AdditionalInformation",
+    "FailureReasonCode",
+    "Created",
+    "Updated",
+)
+
+
+def _columns() -> List[sa.Column]:
+    return [
+        sa.Column("FailureDetailID", sa.Integer(), autoincrement=True),
+        sa.Column(
+            "PolicyID",
+            sa.String(length=64),
+            sa.ForeignKey("Policies.PolicyID"),
+            nullable=False,
+        ),
+        sa.Column(
+            "ReportID",
+            sa.String(length=64),
+            sa.ForeignKey("Reports.ReportID"),
+            nullable=False,
+        ),
+        sa.Column("ResultType", VARCHAR(64), nullable=False),
+        # RFC5952 text representation, at most 45 characters for IPv4-mapped IPv6 addresses
+        sa.Column("SendingMtaIp", VARCHAR(45), nullable=False),
+        sa.Column("ReceivingMxHostname", VARCHAR(255), nullable=True),
+        sa.Column("ReceivingMxHelo", VARCHAR(255), nullable=True),
+        sa.Column("ReceivingIp", VARCHAR(45), nullable=True),
+        sa.Column("FailedSessionCount", sa.Integer(), nullable=False),
+        sa.Column("AdditionalInformation", sa.Text(), nullable=True),
+        sa.Column("FailureReasonCode", sa.Text(), nullable=True),
+        sa.Column("Created", sa.DateTime(), nullable=False, server_default=UtcNow()),
+        sa.Column(
+            "Updated",
+            sa.DateTime(),
+            nullable=False,
+            server_default=UtcNow(),
+            onupdate=UtcNow(),
+        ),
+    ]
+
+
+def _quoted(columns, alias: str = "") -> str:
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(f'{prefix}"{column}"' for column in columns)
+
+
+def _next_month(month: datetime.date) -> datetime.date:
+    if month.month == 12:
+        return datetime.date(month.year + 1, 1, 1)
+    return datetime.date(month.year, month.month + 1, 1)
+
+
+def _partition(month: datetime.date) -> str:
+    return f"FailureDetails_{month:%Y_%m}"
+
+
+def _upgrade_postgresql():
+    # The unpartitioned table makes way for the partitioned one, including the names of its indexes and sequence
+    op.rename_table("FailureDetails", "FailureDetails_Unpartitioned")
+    for index in ("IX_FailureDetails_ReportID", "IX_FailureDetails_ResultType"):
+        op.execute(
+            f'ALTER INDEX "{index}" RENAME TO "{index.replace("FailureDetails", "FailureDetails_Unpartitioned")}"'
+        )
+    op.execute(
+        'ALTER TABLE "FailureDetails_Unpartitioned" '
+        'RENAME CONSTRAINT "FailureDetails_pkey" TO "FailureDetails_Unpartitioned_pkey"'
+    )
+    op.execute(
+        'ALTER SEQUENCE "FailureDetails_FailureDetailID_seq" '
+        'RENAME TO "FailureDetails_Unpartitioned_FailureDetailID_seq"'
+    )
+
+    op.create_table(
+        "FailureDetails",
+        *_columns(),
+        # The first day of the month the report starts in, the partition key
+        sa.Column("StartMonth", sa.Date(), nullable=False),
+        # Every unique constraint of a partitioned table includes the partition key
+        sa.PrimaryKeyConstraint("FailureDetailID", "StartMonth"),
+        sa.Index("IX_FailureDetails_ReportID", "ReportID"),
+        sa.Index("IX_FailureDetails_ResultType", "ResultType"),
+        postgresql_partition_by='RANGE ("StartMonth")',
+    )
+    months = op.get_bind().execute(
+        sa.text(
+            'SELECT DISTINCT CAST(date_trunc(\'month\', "Reports"."StartDatetime") AS DATE) '
+            'FROM "FailureDetails_Unpartitioned" JOIN "Reports" USING ("ReportID")'
+        )
+    )
+    for (month,) in months.all():
+        op.execute(
+            f'CREATE TABLE "{_partition(month)}" PARTITION OF "FailureDetails" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+        )
+    columns = _quoted(COLUMNS)
+    op.execute(
+        f'INSERT INTO "FailureDetails" ({columns}, "StartMonth") '
+        f"SELECT {_quoted(COLUMNS, 'f')}, "
+        "CAST(date_trunc('month', r.\"StartDatetime\") AS DATE) "
+        'FROM "FailureDetails_Unpartitioned" f JOIN "Reports" r ON r."ReportID" = f."ReportID"'
+    )
+    op.execute(
+        "SELECT setval(pg_get_serial_sequence('\"FailureDetails\"', 'FailureDetailID'), "
+        'COALESCE(MAX("FailureDetailID"), 0) + 1, false) FROM "FailureDetails"'
+    )
+    op.drop_table("FailureDetails_Unpartitioned")
+
+
+def _upgrade_sqlite():
+    # One table per month, SQLite has no partitioning
+    months = op.get_bind().execute(
+        sa.text(
+            'SELECT DISTINCT substr("Reports"."StartDatetime", 1, 7) '
+            'FROM "FailureDetails" JOIN "Reports" USING ("ReportID")'
+        )
+    )
+    columns = _quoted(COLUMNS)
+    for (year_month,) in months.all():
+        month = datetime.date.fromisoformat(f"{year_month}-01")
+        name = _partition(month)
+        op.create_table(
+            name,
+            *_columns(),
+            # The first day of the month the report starts in, the partition key
+            sa.Column("StartMonth", sa.Date(), nullable=False),
+            sa.PrimaryKeyConstraint("FailureDetailID"),
+            sa.Index(f"IX_{name}_ReportID", "ReportID"),
+            sa.Index(f"IX_{name}_ResultType", "ResultType"),
+        )
+        op.execute(
+            f'INSERT INTO "{name}" ({columns}, "StartMonth") '
+            f"SELECT {_quoted(COLUMNS, 'f')}, "
+            f"'{month.isoformat()}' "
+            'FROM "FailureDetails" f JOIN "Reports" r ON r."ReportID" = f."ReportID" '
+            f"WHERE r.\"StartDatetime\" >= '{month.isoformat()}' "
+            f"AND r.\"StartDatetime\" < '{_next_month(month).isoformat()}'"
+        )
+    op.drop_table("FailureDetails")
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        _upgrade_postgresql()
+    else:
+        _upgrade_sqlite()
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.create_table(
+            "FailureDetails_Unpartitioned",
+            *_columns(),
+            sa.PrimaryKeyConstraint("FailureDetailID"),
+        )
+        columns = _quoted(COLUMNS)
+        op.execute(
+            f'INSERT INTO "FailureDetails_Unpartitioned" ({columns}) SELECT {columns} FROM "FailureDetails"'
+        )
+        # Drops the partitions as well
+        op.drop_table("FailureDetails")
+        op.rename_table("FailureDetails_Unpartitioned", "FailureDetails")
+        op.execute(
+            'ALTER TABLE "FailureDetails" '
+            'RENAME CONSTRAINT "FailureDetails_Unpartitioned_pkey" TO "FailureDetails_pkey"'
+        )
+        for column in ("PolicyID", "ReportID"):
+            op.execute(
+                'ALTER TABLE "FailureDetails" '
+                f'RENAME CONSTRAINT "FailureDetails_Unpartitioned_{column}_fkey" TO "FailureDetails_{column}_fkey"'
+            )
+        op.execute(
+            'ALTER SEQUENCE "FailureDetails_Unpartitioned_FailureDetailID_seq" '
+            'RENAME TO "FailureDetails_FailureDetailID_seq"'
+        )
+        op.execute(
+            "SELECT setval(pg_get_serial_sequence('\"FailureDetails\"', 'FailureDetailID'), "
+            'COALESCE(MAX("FailureDetailID"), 0) + 1, false) FROM "FailureDetails"'
+        )
+        op.create_index("IX_FailureDetails_ReportID", "FailureDetails", ["ReportID"])
+        op.create_index(
+            "IX_FailureDetails_ResultType", "FailureDetails", ["ResultType"]
+        )
+        return
+
+    op.create_table(
+        "FailureDetails",
+        *_columns(),
+        sa.PrimaryKeyConstraint("FailureDetailID"),
+        sa.Index("IX_FailureDetails_ReportID", "ReportID"),
+        sa.Index("IX_FailureDetails_ResultType", "ResultType"),
+    )
+    names = bind.execute(
+        sa.text("SELECT name FROM sqlite_master WHERE type = 'table'")
+    ).all()
+    # The identifiers of the partitions overlap, the failure details are numbered anew
+    columns = _quoted(COLUMNS[1:])
+    for (name,) in sorted(names):
+        if re.match(r"^FailureDetails_\d{4}_\d{2}$", name):
+            op.execute(
+                f'INSERT INTO "FailureDetails" ({columns}) '
+                f'SELECT {columns} FROM "{name}" ORDER BY "FailureDetailID"'
+            )
+            op.drop_table(name)
@@ -0,0 +1,111 @@
+from typing import Dict, List
+
+from app.core import exceptions, metrics, profiling
+from app.crud import mta_sts
+from app.models.mta_sts import organisations
+from app.schemas import IDENTIFIER_INFORMATION
+from app.schemas.cache_statistics import CacheStatistics
+from app.schemas.http_exception import HttpException
+from app.schemas.profile import ProfileSummary
+from fastapi import APIRouter, Depends, Path, status
+from fastapi.responses import PlainTextResponse
+
+router = APIRouter(tags=["Administration"])
+
+# The profiles are only returned to requests carrying the PROFILING_HEADER with the PROFILING_TOKEN
+_FORBIDDEN = {
+    "model": HttpException,
+    "description": "The request does not carry the `PROFILING_HEADER` with the `PROFILING_TOKEN`.",
+    "content": {
+        "application/json": {
+            "examples": exceptions.openapi_examples(
+                frozenset({exceptions.Forbidden.ERROR_CODE})
+            )
+        }
+    },
+}
+
+
+@router.get(
+    "/admin/caches",
+    operation_id="get_cache_statistics",
+    response_model=Dict[str, CacheStatistics],
+    status_code=status.HTTP_200_OK,
+)
+async def get_cache_statistics():
+    """The hit and miss counters of the in-process caches, counted since the worker process started."""
+    return {
+        "organisations": organisations.identifiers.stats(),
+        "content_hashes": mta_sts.content_hashes.stats(),
+        "reports": mta_sts.serialized_reports.stats(),
+    }
+
+
+@router.get(
+    "/metrics",
+    operation_id="get_metrics",
+    response_class=PlainTextResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {metrics.CONTENT_TYPE: {"schema": {"type": "string"}}},
+        },
+    },
+)
+async def get_metrics():
+    """The metrics of the worker process in the Prometheus text format, counted since it started.
+
+    The seconds taken by each stage of storing the uploaded reports, their size before and after inflating, their number
+    of failure details, and the number of errors returned by error code."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get(
+    "/admin/profiles",
+    operation_id="list_profiles",
+    response_model=List[ProfileSummary],
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(profiling.require_token)],
+    responses={status.HTTP_403_FORBIDDEN: _FORBIDDEN},
+)
+async def list_profiles():
+    """The profiles kept by the worker process, the most recent first, see `PROFILING_SAMPLE_RATE` and
+    `PROFILING_TOKEN`. Requires the `PROFILING_HEADER` with the `PROFILING_TOKEN`."""
+    return [profile.summary() for profile in profiling.profiles.list()]
+
+
+@router.get(
+    "/admin/profiles/{identifier}",
+    operation_id="get_profile",
+    response_class=PlainTextResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(profiling.require_token)],
+    responses={
+        status.HTTP_403_FORBIDDEN: _FORBIDDEN,
+        status.HTTP_200_OK: {
+            "content": {"text/plain": {"schema": {"type": "string"}}},
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": HttpException,
+            "description": "The profile was never taken, by this worker process, or has been evicted.",
+            "content": {
+                "application/json": {
+                    "examples": exceptions.openapi_examples(
+                        frozenset({exceptions.ResourceNotFound.ERROR_CODE})
+                    )
+                }
+            },
+        },
+    },
+)
+async def get_profile(identifier: str = Path(..., **IDENTIFIER_INFORMATION)):
+    """The samples of a profile as collapsed stacks: a line per distinct stack, with the frames from the outermost
+    separated by `;`, followed by a space and the number of samples. Flame graph tools such as `flamegraph.pl` and
+    speedscope read this format.
+
+    A frame is the module and the function. A task awaiting while other tasks run ends in `(awaiting)`. Requires the
+    `PROFILING_HEADER` with the `PROFILING_TOKEN`."""
+    profile = profiling.profiles.get(identifier)
+    if profile is None:
+        raise exceptions.ResourceNotFound(LookupError(identifier))
+    return PlainTextResponse(profile.collapsed())
@@ -0,0 +1,97 @@
+import datetime
+from typing import AsyncIterator, Optional
+
+from app.core import exceptions, http_headers
+from app.core.mta_sts_columnar import require_pyarrow
+from app.core.mta_sts_export import COLUMNAR_FORMATS, MEDIA_TYPES, ExportFormat
+from app.crud import mta_sts
+from app.db.session import read_only_connection
+from app.schemas.http_exception import HttpException
+from fastapi import APIRouter, Query, status
+from fastapi.responses import StreamingResponse
+
+router = APIRouter(tags=["MTA-STS Export"])
+
+
+@router.get(
+    "/mta-sts/export",
+    operation_id="export_mta_sts_failure_details",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": "The failure details, one per line or row.",
+            "content": {media_type: {} for media_type in MEDIA_TYPES.values()},
+        },
+        status.HTTP_501_NOT_IMPLEMENTED: {
+            "model": HttpException,
+            "description": "The columnar formats are not available on this server.",
+            "content": {
+                "application/json": {
+                    "examples": exceptions.openapi_examples(
+                        frozenset({exceptions.ExportFormatUnavailable.ERROR_CODE})
+                    )
+                }
+            },
+        },
+    },
+)
+async def export_mta_sts_failure_details(
+    export_format: ExportFormat = Query(
+        ExportFormat.NDJSON, alias="format", description="The format of the export."
+    ),
+    compress: bool = Query(
+        False, alias="gzip", description="Whether to gzip the export."
+    ),
+    start_datetime: Optional[datetime.datetime] = Query(
+        None,
+        alias="start-datetime",
+        description="Only reports whose date range starts at or after this time.",
+    ),
+    end_datetime: Optional[datetime.datetime] = Query(
+        None,
+        alias="end-datetime",
+        description="Only reports whose date range ends at or before this time.",
+    ),
+    organisation: Optional[str] = Query(
+        None, description="Only reports of the organisation with this name."
+    ),
+    policy_domain: Optional[str] = Query(
+        None,
+        alias="policy-domain",
+        description="Only failure details of policies for this domain.",
+    ),
+):
+    """Exports the failure details of the stored reports as NDJSON or CSV, with the report and policy they belong to.
+
+    For analytics, the failure details can be exported as an Arrow IPC stream or Parquet file as well. These include
+    the summary of the policies and the policies without failure details, store the domains, result types and other
+    repetitive text dictionary encoded and the IP addresses as 16 bytes (IPv4 mapped into IPv6).
+
+    The export is streamed while it is read from the database, in order of the start of the reports, so exports of
+    any size use a bounded amount of memory."""
+    if export_format in COLUMNAR_FORMATS:
+        require_pyarrow()
+
+    async def content() -> AsyncIterator[bytes]:
+        # Not a dependency: the connection must stay open until the response is streamed
+        async with read_only_connection() as connection:
+            async for chunk in mta_sts.export_failure_details(
+                connection,
+                export_format=export_format,
+                compress=compress,
+                start_datetime=start_datetime,
+                end_datetime=end_datetime,
+                organisation_name=organisation,
+                policy_domain=policy_domain,
+            ):
+                yield chunk
+
+    headers = {
+        http_headers.CONTENT_DISPOSITION: f'attachment; filename="failure-details.{export_format.value}"'
+    }
+    if compress:
+        headers[http_headers.CONTENT_ENCODING] = "gzip"
+    return StreamingResponse(
+        content(), media_type=MEDIA_TYPES[export_format], headers=headers
+    )
@@ -1,26 +1,43 @@
+import asyncio
+import datetime
+from typing import List, Optional, Tuple, Union
 from urllib.parse import urljoin
 
 from app.api import deps
-from app.core import exceptions, http_headers
+from app.core import decode_executor, exceptions, http_headers, metrics, profiling
+from app.core.config import settings
 from app.core.mta_sts import MtaSts
+from app.core.mta_sts_bulk import (
+    ARCHIVE_MEDIA_TYPES,
+    FORM_FIELD,
+    NDJSON_MEDIA_TYPES,
+    BulkItem,
+    iter_bulk_items,
+)
 from app.crud import mta_sts
+from app.db import writer
+from app.db.session import AsyncReadSessionLocal
 from app.schemas import IDENTIFIER_INFORMATION
-from app.schemas.http_exception import HttpException
+from app.schemas.bulk_resources_created import BulkItemResult, BulkResourcesCreated
+from app.schemas.http_exception import ExceptionDetail, HttpException
 from app.schemas.mta_sts_report import MtaStsReport
+from app.schemas.mta_sts_report_page import MtaStsReportPage
 from app.schemas.resource_created import ResourceCreated
 from fastapi import (
     APIRouter,
     Depends,
     File,
+    Header,
     Path,
+    Query,
     Request,
     Response,
     UploadFile,
     status,
 )
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-router = APIRouter()
+router = APIRouter(tags=["MTA-STS Reports"])
 
 
 @router.post(
@@ -82,12 +99,23 @@ router = APIRouter()
                 }
             },
         },
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE: {
+            "model": HttpException,
+            "description": "The report exceeds the configured size limits.",
+            "content": {
+                "application/json": {
+                    "examples": exceptions.openapi_examples(
+                        frozenset({exceptions.ReportTooLarge.ERROR_CODE})
+                    )
+                }
+            },
+        },
     },
 )
+@profiling.profiled
 async def create_mta_sts_report(
     response: Response,
     request: Request,
-    db: Session = Depends(deps.get_db),
     report: UploadFile = File(
         ...,
         title="The MTA-STS report to be handled",
@@ -113,27 +141,357 @@ async def create_mta_sts_report(
     3. Aggregate counts, comprising result type, Sending MTA IP, receiving MTA hostname, session count, and an optional
     additional information field containing a URI for recipients to review further information on a failure type.
 
-    Processes a new MTA-STS report in either plain text or encoded in gz format."""
-    mta_sts_report = await MtaSts.parse(report)
+    Processes a new MTA-STS report in either plain text or encoded in gz format. Large reports are inflated and
+    parsed incrementally, while the failure details are persisted in batches. An upload identical to a stored report
+    is rejected as a conflict without being decoded.
 
-    try:
-        result = await mta_sts.create_mta_sts_report(
-            db=db, mta_sts_report=mta_sts_report
+    Requests may be profiled, see `GET /admin/profiles`."""
+    # Retried uploads are answered before anything is decoded
+    content_hash = await MtaSts.hash_upload(report)
+    async with AsyncReadSessionLocal() as db:
+        await mta_sts.raise_if_existing_content(db, content_hash)
+    if MtaSts.is_streamable(report):
+        events = MtaSts.stream(report.file)
+        result: ResourceCreated
+        try:
+            result = await writer.run(
+                lambda db: mta_sts.create_mta_sts_report_from_events(
+                    db=db, events=events, content_hash=content_hash
+                )
+            )
+        finally:
+            await events.aclose()
+    else:
+        mta_sts_report = await MtaSts.parse(report)
+        # Small reports may share a commit with concurrent uploads, see MTA_STS_GROUP_COMMIT
+        result = await writer.run_grouped(
+            lambda db: mta_sts.create_mta_sts_report(
+                db=db,
+                mta_sts_report=mta_sts_report,
+                commit=False,
+                content_hash=content_hash,
+            )
         )
-    except Exception:
-        db.rollback()
-        raise
 
     response.headers["Location"] = urljoin(str(request.url) + "/", result.identifier)
     return result
 
 
+def _bulk_item_result(
+    index: int,
+    name: str,
+    result: Union[ResourceCreated, exceptions.TLSReportingExceptionBase],
+) -> BulkItemResult:
+    if isinstance(result, ResourceCreated):
+        return BulkItemResult(
+            index=index,
+            name=name,
+            status_code=status.HTTP_201_CREATED,
+            identifier=result.identifier,
+        )
+    metrics.count_error(result)
+    return BulkItemResult(
+        index=index,
+        name=name,
+        status_code=result.status_code,
+        detail=ExceptionDetail(**result.error_detail),
+    )
+
+
+async def _create_streamed(
+    item: BulkItem, content_hash: Optional[str]
+) -> Union[ResourceCreated, exceptions.TLSReportingExceptionBase]:
+    """Stores a large report of a bulk request on its own, decoding it incrementally like a single upload."""
+    assert item.file is not None
+    events = MtaSts.stream(item.file)
+    try:
+        return await writer.run(
+            lambda db: mta_sts.create_mta_sts_report_from_events(
+                db=db, events=events, content_hash=content_hash
+            )
+        )
+    except exceptions.TLSReportingExceptionBase as e:
+        return e
+    finally:
+        await events.aclose()
+
+
+async def _create_batch(batch: List[Tuple[int, BulkItem]]) -> List[BulkItemResult]:
+    results: List[BulkItemResult] = []
+    hashes = {index: await item.content_hash() for index, item in batch}
+    async with AsyncReadSessionLocal() as db:
+        existing = await mta_sts.find_existing_content(
+            db, [content_hash for content_hash in hashes.values() if content_hash]
+        )
+    pending: List[Tuple[int, BulkItem]] = []
+    streamed: List[Tuple[int, BulkItem]] = []
+    for index, item in batch:
+        content_hash = hashes[index]
+        if content_hash is not None and content_hash in existing:
+            conflict = exceptions.ResourceAlreadyExists(
+                LookupError(content_hash), existing[content_hash]
+            )
+            results.append(_bulk_item_result(index, item.name, conflict))
+        elif item.is_streamable():
+            streamed.append((index, item))
+        else:
+            pending.append((index, item))
+
+    # The reports of a batch are decoded concurrently by the decode executor, only as many at a time as it decodes, so
+    # the raw reports waiting for a worker are not read into memory yet
+    semaphore = asyncio.Semaphore(decode_executor.concurrency())
+
+    async def decode(item: BulkItem) -> MtaStsReport:
+        async with semaphore:
+            return await item.decode()
+
+    decoded = await asyncio.gather(
+        *(decode(item) for _, item in pending), return_exceptions=True
+    )
+    valid: List[Tuple[int, str, MtaStsReport]] = []
+    for (index, item), report in zip(pending, decoded):
+        if isinstance(report, exceptions.TLSReportingExceptionBase):
+            results.append(_bulk_item_result(index, item.name, report))
+        elif isinstance(report, BaseException):
+            raise report
+        else:
+            valid.append((index, item.name, report))
+
+    created: List[
+        Union[ResourceCreated, exceptions.TLSReportingExceptionBase]
+    ] = await writer.run(
+        lambda db: mta_sts.create_mta_sts_reports(
+            db=db,
+            mta_sts_reports=[report for _, _, report in valid],
+            hashes=[hashes[index] for index, _, _ in valid],
+        )
+    )
+    results.extend(
+        _bulk_item_result(index, name, result)
+        for (index, name, _), result in zip(valid, created)
+    )
+    # Large reports are not held in memory as a whole, they are stored one at a time in transactions of their own
+    for index, item in streamed:
+        results.append(
+            _bulk_item_result(
+                index, item.name, await _create_streamed(item, hashes[index])
+            )
+        )
+    return results
+
+
+async def _create_and_close_batch(
+    batch: List[Tuple[int, BulkItem]]
+) -> List[BulkItemResult]:
+    try:
+        return await _create_batch(batch)
+    finally:
+        for _, item in batch:
+            item.close()
+
+
+@router.post(
+    "/mta-sts/bulk",
+    operation_id="create_mta_sts_reports",
+    status_code=status.HTTP_200_OK,
+    response_model=BulkResourcesCreated,
+    response_description="Every report has been processed, see the result of each report.",
+    responses={
+        status.HTTP_200_OK: {
+            "content": {
+                "application/json": {
+                    "examples": BulkResourcesCreated.openapi_examples()
+                }
+            },
+        },
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE: {
+            "model": HttpException,
+            "description": "The request exceeds the configured size limits.",
+            "content": {
+                "application/json": {
+                    "examples": exceptions.openapi_examples(
+                        frozenset({exceptions.ReportTooLarge.ERROR_CODE})
+                    )
+                }
+            },
+        },
+        status.HTTP_415_UNSUPPORTED_MEDIA_TYPE: {
+            "model": HttpException,
+            "description": "The request is neither NDJSON, multipart nor an archive.",
+            "content": {
+                "application/json": {
+                    "examples": exceptions.openapi_examples(
+                        frozenset({exceptions.UnsupportedMediaType.ERROR_CODE})
+                    )
+                }
+            },
+        },
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "model": HttpException,
+            "description": "The archive could not be read.",
+            "content": {
+                "application/json": {
+                    "examples": exceptions.openapi_examples(
+                        frozenset({exceptions.GzipError.ERROR_CODE})
+                    )
+                }
+            },
+        },
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {
+                            FORM_FIELD: {
+                                "type": "array",
+                                "items": {"type": "string", "format": "binary"},
+                            }
+                        },
+                        "required": [FORM_FIELD],
+                    }
+                },
+                **{
+                    media_type: {"schema": {"type": "string"}}
+                    for media_type in sorted(NDJSON_MEDIA_TYPES)
+                },
+                **{
+                    media_type: {"schema": {"type": "string", "format": "binary"}}
+                    for media_type in sorted(ARCHIVE_MEDIA_TYPES)
+                },
+            },
+        }
+    },
+)
+async def create_mta_sts_reports(request: Request):
+    """Processes many MTA-STS reports in a single request.
+
+    The reports are sent as NDJSON (one report per line), as a multipart list of files in the `reports` field, or as a
+    zip or (compressed) tar archive. Each report is plain text or encoded in gz format, archives in a multipart list are
+    expanded as well.
+
+    The reports are stored in batches sharing a transaction, while large reports are decoded incrementally and stored
+    on their own. A report that cannot be processed does not affect the others: the result of each report holds either
+    the identifier of the new resource, or the error a single upload of the report would have been answered with."""
+    results: List[BulkItemResult] = []
+    batch: List[Tuple[int, BulkItem]] = []
+    index = 0
+    items = iter_bulk_items(request)
+    try:
+        async for item in items:
+            batch.append((index, item))
+            index += 1
+            if len(batch) >= settings.MTA_STS_BULK_BATCH_SIZE:
+                results.extend(await _create_and_close_batch(batch))
+                batch = []
+        if batch:
+            results.extend(await _create_and_close_batch(batch))
+    finally:
+        # Stops reading the archives, should a batch fail
+        await items.aclose()
+
+    results.sort(key=lambda result: result.index)
+    return BulkResourcesCreated(results=results)
+
+
+@router.get(
+    "/mta-sts",
+    operation_id="list_mta_sts_reports",
+    response_model=MtaStsReportPage,
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "model": HttpException,
+            "description": "The cursor is malformed.",
+            "content": {
+                "application/json": {
+                    "examples": exceptions.openapi_examples(
+                        frozenset({exceptions.InvalidCursor.ERROR_CODE})
+                    )
+                }
+            },
+        },
+    },
+)
+async def list_mta_sts_reports(
+    organisation: Optional[str] = Query(
+        None, description="Only reports of the organisation with this name."
+    ),
+    policy_domain: Optional[str] = Query(
+        None,
+        alias="policy-domain",
+        description="Only reports with a policy for this domain.",
+    ),
+    start_datetime: Optional[datetime.datetime] = Query(
+        None,
+        alias="start-datetime",
+        description="Only reports whose date range starts at or after this time.",
+    ),
+    end_datetime: Optional[datetime.datetime] = Query(
+        None,
+        alias="end-datetime",
+        description="Only reports whose date range ends at or before this time.",
+    ),
+    limit: int = Query(
+        settings.MTA_STS_PAGE_SIZE,
+        ge=1,
+        le=settings.MTA_STS_MAX_PAGE_SIZE,
+        description="The maximum number of reports of the page.",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="The `next_cursor` of the previous page."
+    ),
+    db: AsyncSession = Depends(deps.get_async_read_db),
+):
+    """Lists the stored MTA-STS reports, the most recent (by start of the date range) first.
+
+    The reports are returned page by page: pass the `next_cursor` of a page as `cursor` to get the next page. Every
+    page is equally fast to retrieve, however deep it is."""
+    return await mta_sts.list_mta_sts_reports(
+        db,
+        limit=limit,
+        cursor=cursor,
+        organisation_name=organisation,
+        policy_domain=policy_domain,
+        start_datetime=start_datetime,
+        end_datetime=end_datetime,
+    )
+
+
+def _if_none_match(header: Optional[str], etag: str) -> bool:
+    """Whether the ``If-None-Match`` header matches the entity tag, using the weak comparison of RFC 7232."""
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    weak_etag = f"W/{etag}"
+    return any(
+        candidate.strip() in (etag, weak_etag) for candidate in header.split(",")
+    )
+
+
 @router.get(
     "/mta-sts/{identifier}",
     operation_id="get_mta_sts_report",
     response_model=MtaStsReport,
     status_code=status.HTTP_200_OK,
     responses={
+        status.HTTP_200_OK: {
+            "headers": {
+                http_headers.ETAG: {
+                    "description": "A strong entity tag of the report, stored reports never change.",
+                    "schema": {"type": "string"},
+                }
+            },
+        },
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "The report matches the entity tag given in `If-None-Match`.",
+        },
         status.HTTP_404_NOT_FOUND: {
             "model": HttpException,
             "content": {
@@ -143,9 +501,24 @@ async def create_mta_sts_report(
                     )
                 }
             },
-        }
+        },
     },
 )
-async def get_mta_sts_report(identifier: str = Path(..., **IDENTIFIER_INFORMATION)):
-    """Retrieves a given MTA-STS report."""
-    raise exceptions.ResourceNotFound(NotImplementedError(identifier))
+async def get_mta_sts_report(
+    identifier: str = Path(..., **IDENTIFIER_INFORMATION),
+    if_none_match: Optional[str] = Header(
+        None, description="Entity tags of the report already known to the client."
+    ),
+    db: AsyncSession = Depends(deps.get_async_read_db),
+):
+    """Retrieves a given MTA-STS report.
+
+    Recently retrieved reports are served from memory. A client that already has the report can send its `ETag` in
+    `If-None-Match`, and is answered with `304 Not Modified` without a body."""
+    serialized = await mta_sts.get_serialized_mta_sts_report(db, identifier)
+    headers = {http_headers.ETAG: serialized.etag}
+    if _if_none_match(if_none_match, serialized.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        content=serialized.body, media_type="application/json", headers=headers
+    )
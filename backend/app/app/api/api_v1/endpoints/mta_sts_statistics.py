@@ -0,0 +1,129 @@
+import datetime
+from typing import Optional
+
+from app.api import deps
+from app.core.config import settings
+from app.crud import mta_sts
+from app.models.mta_sts.sketch import SketchDimension
+from app.schemas.mta_sts_statistics import (
+    DistinctSendingMtaIps,
+    MtaStsStatistics,
+    TopFailures,
+)
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+router = APIRouter(tags=["MTA-STS Statistics"])
+
+
+@router.get(
+    "/mta-sts/statistics",
+    operation_id="get_mta_sts_statistics",
+    response_model=MtaStsStatistics,
+    response_model_by_alias=True,
+    status_code=status.HTTP_200_OK,
+)
+async def get_mta_sts_statistics(
+    start_date: Optional[datetime.date] = Query(
+        None, alias="start-date", description="The first day (UTC), inclusive."
+    ),
+    end_date: Optional[datetime.date] = Query(
+        None, alias="end-date", description="The last day (UTC), inclusive."
+    ),
+    organisation: Optional[str] = Query(
+        None, description="Only the statistics of the organisation with this name."
+    ),
+    policy_domain: Optional[str] = Query(
+        None,
+        alias="policy-domain",
+        description="Only the statistics of this policy domain.",
+    ),
+    db: AsyncSession = Depends(deps.get_async_read_db),
+):
+    """The successful and failed session counts by day, policy domain and organisation.
+
+    The counts are kept up to date while the reports are stored, a report counts towards the day its date range starts
+    on."""
+    return await mta_sts.get_mta_sts_statistics(
+        db,
+        start_day=start_date,
+        end_day=end_date,
+        organisation_name=organisation,
+        policy_domain=policy_domain,
+    )
+
+
+@router.get(
+    "/mta-sts/statistics/top-failures",
+    operation_id="get_mta_sts_top_failures",
+    response_model=TopFailures,
+    response_model_by_alias=True,
+    status_code=status.HTTP_200_OK,
+)
+async def get_mta_sts_top_failures(
+    policy_domain: str = Query(
+        ..., alias="policy-domain", description="The policy domain of the failures."
+    ),
+    dimension: SketchDimension = Query(
+        SketchDimension.SENDING_MTA_IP,
+        description="The field of the failure details to rank.",
+    ),
+    start_date: Optional[datetime.date] = Query(
+        None, alias="start-date", description="The first day (UTC), inclusive."
+    ),
+    end_date: Optional[datetime.date] = Query(
+        None, alias="end-date", description="The last day (UTC), inclusive."
+    ),
+    limit: int = Query(
+        10,
+        ge=1,
+        le=settings.MTA_STS_SKETCH_SIZE,
+        description="The maximum number of values.",
+    ),
+    db: AsyncSession = Depends(deps.get_async_read_db),
+):
+    """The sending MTA IPs or result types with the most failed sessions for a policy domain.
+
+    The counts are estimated from sketches kept per day while the reports are stored, so they are quick to get for
+    any period. Every count is at most `error` too high, and any value which is not listed has at most
+    `unlisted-failed-session-count` failed sessions. A report counts towards the day its date range starts on."""
+    return await mta_sts.get_top_failures(
+        db,
+        policy_domain=policy_domain,
+        dimension=dimension,
+        limit=limit,
+        start_day=start_date,
+        end_day=end_date,
+    )
+
+
+@router.get(
+    "/mta-sts/statistics/sending-mta-ips",
+    operation_id="get_mta_sts_distinct_sending_mta_ips",
+    response_model=DistinctSendingMtaIps,
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+)
+async def get_mta_sts_distinct_sending_mta_ips(
+    policy_domain: Optional[str] = Query(
+        None,
+        alias="policy-domain",
+        description="Only the sending MTA IPs of this policy domain.",
+    ),
+    start_date: Optional[datetime.date] = Query(
+        None, alias="start-date", description="The first day (UTC), inclusive."
+    ),
+    end_date: Optional[datetime.date] = Query(
+        None, alias="end-date", description="The last day (UTC), inclusive."
+    ),
+    db: AsyncSession = Depends(deps.get_async_read_db),
+):
+    """The number of distinct sending MTA IPs of the failure details.
+
+    The number is estimated from sketches kept per day and policy domain while the reports are stored, so it is quick
+    to get for any period. Reports only name the sending MTA IPs of failed sessions, senders which only had successful
+    sessions are not counted. A report counts towards the day its date range starts on."""
+    return await mta_sts.get_distinct_sending_mta_ips(
+        db, policy_domain=policy_domain, start_day=start_date, end_day=end_date
+    )
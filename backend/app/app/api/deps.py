@@ -1,6 +1,6 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
-from app.db.session import SessionLocal
+from app.db.session import AsyncReadSessionLocal, AsyncSessionLocal, SessionLocal
 
 
 def get_db() -> Generator:
@@ -11,3 +11,14 @@ def get_db() -> Generator:
     finally:
         if db:
             db.close()
+
+
+async def get_async_db() -> AsyncGenerator:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db() -> AsyncGenerator:
+    """A session for requests that only read, see ``AsyncReadSessionLocal``."""
+    async with AsyncReadSessionLocal() as db:
+        yield db
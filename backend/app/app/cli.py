@@ -0,0 +1,191 @@
+"""Maintenance commands, run from `backend/app`, e.g.
+
+    python -m app.cli rebuild-rollups --start 2021-01-01 --end 2021-12-31
+    python -m app.cli export --format parquet --output failure-details.parquet
+    MTA_STS_RETENTION_DAYS=90 python -m app.cli purge-failure-details
+"""
+import argparse
+import asyncio
+import datetime
+import sys
+from typing import Callable, Dict, Optional, Tuple
+
+from app.core import exceptions
+from app.core.mta_sts_columnar import require_pyarrow
+from app.core.mta_sts_export import COLUMNAR_FORMATS, ExportFormat
+from app.crud import mta_sts, retention
+from app.db.session import AsyncSessionLocal, async_engine, read_only_connection
+from app.models.mta_sts import (
+    daily_failure_sketches,
+    daily_rollups,
+    daily_sending_mta_ip_sketches,
+)
+from app.models.mta_sts.rollup import RebuildableAggregate
+
+SKETCHES: Tuple[RebuildableAggregate, ...] = (
+    daily_failure_sketches,
+    daily_sending_mta_ip_sketches,
+)
+
+
+async def rebuild_rollups(
+    start: Optional[datetime.date],
+    end: Optional[datetime.date],
+    shard_days: int,
+    workers: int,
+) -> None:
+    """Recomputes the daily rollups and sketches from the stored reports, shard by shard of
+    ``shard_days`` days.
+
+    Every shard is a transaction of its own, up to ``workers`` shards run concurrently. SQLite serialises the shards
+    on its write lock, Postgres runs them in parallel.
+    """
+    if start is None or end is None:
+        async with AsyncSessionLocal() as db:
+            day_range = await daily_rollups.get_day_range(db)
+        if day_range is None:
+            print("No reports")
+            return
+        start = start or day_range[0]
+        end = end or day_range[1]
+
+    semaphore = asyncio.Semaphore(workers)
+
+    async def rebuild_shard(shard_start: datetime.date) -> None:
+        shard_end = min(shard_start + datetime.timedelta(days=shard_days), stop)
+        async with semaphore, AsyncSessionLocal() as db:
+            await daily_rollups.rebuild(db, start_day=shard_start, end_day=shard_end)
+            for sketches in SKETCHES:
+                await sketches.rebuild(db, start_day=shard_start, end_day=shard_end)
+            await db.commit()
+        print(f"Rebuilt {shard_start} - {shard_end - datetime.timedelta(days=1)}")
+
+    stop = end + datetime.timedelta(days=1)
+    shards = []
+    shard_start = start
+    while shard_start < stop:
+        shards.append(rebuild_shard(shard_start))
+        shard_start += datetime.timedelta(days=shard_days)
+    await asyncio.gather(*shards)
+
+
+async def export(
+    export_format: ExportFormat,
+    output: str,
+    compress: bool,
+    start_datetime: Optional[datetime.datetime],
+    end_datetime: Optional[datetime.datetime],
+    organisation: Optional[str],
+    policy_domain: Optional[str],
+) -> None:
+    """Writes the export of the failure details to a file, as `GET /mta-sts/export` would return it."""
+    if export_format in COLUMNAR_FORMATS:
+        try:
+            require_pyarrow()
+        except exceptions.ExportFormatUnavailable as e:
+            sys.exit(e.error_detail["message"])
+
+    file = sys.stdout.buffer if output == "-" else open(output, "wb")
+    try:
+        async with read_only_connection() as connection:
+            async for chunk in mta_sts.export_failure_details(
+                connection,
+                export_format=export_format,
+                compress=compress,
+                start_datetime=start_datetime,
+                end_datetime=end_datetime,
+                organisation_name=organisation,
+                policy_domain=policy_domain,
+            ):
+                file.write(chunk)
+    finally:
+        if file is not sys.stdout.buffer:
+            file.close()
+
+
+async def purge_failure_details() -> None:
+    """Deletes the failure details which expired according to the retention policies, see ``retention``."""
+    result = await retention.purge_expired_failure_details()
+    print(
+        f"Purged {result.failure_details} failure details and {result.partitions} partitions "
+        f"of {result.reports} reports"
+    )
+
+
+async def _run(command: Callable, arguments: Dict) -> None:
+    try:
+        await command(**arguments)
+    finally:
+        await async_engine.dispose()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="TLS reporting maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-rollups",
+        help="Recompute the daily rollups and sketches from the stored reports",
+    )
+    rebuild.add_argument(
+        "--start",
+        type=datetime.date.fromisoformat,
+        help="The first day, the first day of any report by default",
+    )
+    rebuild.add_argument(
+        "--end",
+        type=datetime.date.fromisoformat,
+        help="The last day (inclusive), the last day of any report by default",
+    )
+    rebuild.add_argument("--shard-days", type=int, default=7)
+    rebuild.add_argument("--workers", type=int, default=4)
+    rebuild.set_defaults(handler=rebuild_rollups)
+
+    export_parser = commands.add_parser(
+        "export", help="Export the failure details of the stored reports"
+    )
+    export_parser.add_argument(
+        "--format",
+        dest="export_format",
+        type=ExportFormat,
+        choices=list(ExportFormat),
+        default=ExportFormat.PARQUET,
+    )
+    export_parser.add_argument(
+        "--output", required=True, help="The file to write, - for standard output"
+    )
+    export_parser.add_argument(
+        "--gzip", dest="compress", action="store_true", help="Gzip the export"
+    )
+    export_parser.add_argument(
+        "--start-datetime",
+        type=datetime.datetime.fromisoformat,
+        help="Only reports whose date range starts at or after this time",
+    )
+    export_parser.add_argument(
+        "--end-datetime",
+        type=datetime.datetime.fromisoformat,
+        help="Only reports whose date range ends at or before this time",
+    )
+    export_parser.add_argument(
+        "--organisation", help="Only reports of the organisation with this name"
+    )
+    export_parser.add_argument(
+        "--policy-domain", help="Only failure details of policies for this domain"
+    )
+    export_parser.set_defaults(handler=export)
+
+    purge = commands.add_parser(
+        "purge-failure-details",
+        help="Delete the failure details which expired according to MTA_STS_RETENTION_DAYS(_BY_ORGANISATION)",
+    )
+    purge.set_defaults(handler=purge_failure_details)
+
+    arguments = vars(parser.parse_args(argv))
+    arguments.pop("command")
+    handler = arguments.pop("handler")
+    asyncio.run(_run(handler, {k.replace("-", "_"): v for k, v in arguments.items()}))
+
+
+if __name__ == "__main__":
+    main()
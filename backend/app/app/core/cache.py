@@ -0,0 +1,127 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Key of the entries waiting for the transaction of a session to commit, see ``put_after_commit``
+_PENDING = "pending_cache_entries"
+
+
+class LRUCache(Generic[K, V]):
+    """A bounded, in-process mapping which evicts the least recently used entry, and optionally entries older than a
+    time to live.
+
+    Not shared between worker processes: each process warms its own cache, so a miss must always fall back to the
+    database. The event loop is single threaded, hence no locking.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        """
+        :param maxsize: The maximum number of entries, 0 disables the cache.
+        :param ttl: The number of seconds an entry is kept, None keeps it until it is evicted.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # The value and the monotonic time it expires at
+        self._entries: "OrderedDict[K, Tuple[V, Optional[float]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def get(self, key: K) -> Optional[V]:
+        try:
+            value, expires = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        if expires is not None and expires <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def put_after_commit(session: Session, cache: LRUCache[K, V], key: K, value: V) -> None:
+    """Caches the value once the transaction of the session commits, a rolled back row never ends up in the cache.
+
+    Within a savepoint (``begin_nested``), the value is discarded as well when the savepoint is rolled back.
+
+    :param session: The (synchronous) session, i.e. ``AsyncSession.sync_session``.
+    :param cache: The cache to put the value in.
+    :param key: The key of the value.
+    :param value: The value, e.g. the identifier of the row being inserted.
+    """
+    pending: List[
+        Tuple[Optional[SessionTransaction], LRUCache, Hashable, object]
+    ] = session.info.setdefault(_PENDING, [])
+    pending.append((session.get_nested_transaction(), cache, key, value))
+
+
+def _within(
+    transaction: Optional[SessionTransaction], savepoint: SessionTransaction
+) -> bool:
+    while transaction is not None:
+        if transaction is savepoint:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(Session, "after_commit")
+def _put_pending(session: Session) -> None:
+    if session.in_nested_transaction():
+        # A savepoint was released, the transaction itself is yet to commit
+        return
+    for _, cache, key, value in session.info.pop(_PENDING, ()):
+        cache.put(key, value)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(
+    session: Session, previous_transaction: SessionTransaction
+) -> None:
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING, None)
+        return
+    pending = session.info.get(_PENDING)
+    if pending:
+        pending[:] = [
+            entry for entry in pending if not _within(entry[0], previous_transaction)
+        ]
@@ -1,6 +1,14 @@
-from typing import Optional
+from typing import Any, Dict, Literal, Optional
+from urllib.parse import quote
 
-from pydantic import AnyUrl, BaseSettings, validator
+from pydantic import AnyUrl, BaseSettings, PostgresDsn, validator
+
+# Drivers used by the async engine, see Settings.SQLALCHEMY_ASYNC_DATABASE_URI
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
 
 
 class Settings(BaseSettings):
@@ -34,24 +42,128 @@ heartbeat to indicate that systems are successfully negotiating TLS during sessi
 Text from https://datatracker.ietf.org/doc/html/rfc8460
 """
 
-    # POSTGRES_SERVER: str
-    # POSTGRES_USER: str
-    # POSTGRES_PASSWORD: str
-    # POSTGRES_DB: str
-    SQLALCHEMY_DATABASE_URI: Optional[str] = "sqlite:///../../../sql_app.db"
-    #
-    # @classmethod
-    # @validator("SQLALCHEMY_DATABASE_URI", pre=True)
-    # def assemble_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
-    #     if isinstance(v, str):
-    #         return v
-    #     return PostgresDsn.build(
-    #         scheme="postgresql",
-    #         user=values.get("POSTGRES_USER"),
-    #         password=values.get("POSTGRES_PASSWORD"),
-    #         host=values.get("POSTGRES_SERVER"),
-    #         path=f"/{values.get('POSTGRES_DB') or ''}",
-    #     )
+    # The Postgres server used unless SQLALCHEMY_DATABASE_URI is set, the default being the SQLite database otherwise
+    POSTGRES_SERVER: Optional[str] = None
+    POSTGRES_PORT: int = 5432
+    POSTGRES_USER: str = "postgres"
+    POSTGRES_PASSWORD: str = ""
+    POSTGRES_DB: str = "tls_reporting"
+    SQLALCHEMY_DATABASE_URI: Optional[str] = None
+
+    @validator("SQLALCHEMY_DATABASE_URI", pre=True, always=True)
+    def assemble_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> str:
+        if isinstance(v, str):
+            return v
+        if values.get("POSTGRES_SERVER") is None:
+            return "sqlite:///../../../sql_app.db"
+        return PostgresDsn.build(
+            scheme="postgresql",
+            user=quote(values.get("POSTGRES_USER") or "", safe=""),
+            password=quote(values.get("POSTGRES_PASSWORD") or "", safe="") or None,
+            host=values.get("POSTGRES_SERVER"),
+            port=str(values.get("POSTGRES_PORT")),
+            path=f"/{values.get('POSTGRES_DB') or ''}",
+        )
+
+    # Whether policies and failure details are inserted with COPY rather than INSERT on Postgres, faster from a single
+    # row on according to benchmarks.copy_rows
+    POSTGRES_BULK_COPY: bool = True
+    # Seconds a SQLite connection waits for the write lock before failing with "database is locked"
+    SQLITE_BUSY_TIMEOUT: float = 30.0
+    # The production profile of SQLite: the WAL journal and the pragmas below, a pool of read connections separate from
+    # the write connections, and a single task writing the uploaded reports one after the other, see app/db/writer.py
+    # and MTA_STS_GROUP_COMMIT
+    SQLITE_PRODUCTION: bool = False
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    # Page cache per connection in KiB, and bytes of the database file mapped into memory
+    SQLITE_CACHE_SIZE_KIB: int = 64 * 1024
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_READ_POOL_SIZE: int = 8
+    # SQL statements taking at least this many seconds are logged with their parameters, None logs none
+    SQL_SLOW_QUERY_SECONDS: Optional[float] = 1.0
+    # Derived from SQLALCHEMY_DATABASE_URI unless set explicitly
+    SQLALCHEMY_ASYNC_DATABASE_URI: Optional[str] = None
+
+    @validator("SQLALCHEMY_ASYNC_DATABASE_URI", pre=True, always=True)
+    def assemble_async_db_connection(
+        cls, v: Optional[str], values: Dict[str, Any]
+    ) -> Optional[str]:
+        if isinstance(v, str):
+            return v
+        uri = values.get("SQLALCHEMY_DATABASE_URI")
+        if uri is None:
+            return None
+        scheme, separator, rest = uri.partition("://")
+        return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+    # Limits enforced while reading an uploaded MTA-STS report (sizes in bytes)
+    MTA_STS_MAX_COMPRESSED_SIZE: int = 64 * 1024 * 1024
+    MTA_STS_MAX_INFLATED_SIZE: int = 512 * 1024 * 1024
+    MTA_STS_MAX_COMPRESSION_RATIO: int = 200
+    # Uploads of at least this size are inflated and parsed incrementally
+    MTA_STS_STREAMING_THRESHOLD: int = 4 * 1024 * 1024
+    MTA_STS_STREAM_CHUNK_SIZE: int = 64 * 1024
+    MTA_STS_FAILURE_DETAIL_BATCH_SIZE: int = 1000
+    # Where whole reports are decoded (inflated, parsed and validated): in a pool of processes, in a pool of threads,
+    # or inline on the event loop. Reports smaller than the threshold (in bytes) are always decoded inline.
+    MTA_STS_DECODE_EXECUTOR: Literal["process", "thread", "inline"] = "process"
+    MTA_STS_DECODE_WORKERS: Optional[int] = None
+    MTA_STS_DECODE_INLINE_THRESHOLD: int = 64 * 1024
+    # Number of organisation identifiers kept in memory, all of them are loaded at startup
+    ORGANISATION_CACHE_SIZE: int = 1000
+    # Number of SHA-256 hashes of recent uploads kept in memory, so retried uploads are rejected before decoding
+    MTA_STS_CONTENT_HASH_CACHE_SIZE: int = 10_000
+    # Number of serialized reports kept in memory for `GET /mta-sts/{identifier}`, and for how many seconds
+    MTA_STS_REPORT_CACHE_SIZE: int = 1000
+    MTA_STS_REPORT_CACHE_TTL: Optional[float] = 3600.0
+    # Page size of `GET /mta-sts`, by default and at most
+    MTA_STS_PAGE_SIZE: int = 100
+    MTA_STS_MAX_PAGE_SIZE: int = 1000
+    # Number of rows fetched from the database and written to the response at a time by the exports
+    MTA_STS_EXPORT_BATCH_SIZE: int = 1000
+    # Number of rows per row group of the Parquet exports, which are buffered in memory until written
+    MTA_STS_EXPORT_ROW_GROUP_SIZE: int = 100_000
+    # Number of values counted per day, policy domain and dimension by the top failures sketches
+    MTA_STS_SKETCH_SIZE: int = 100
+    # The distinct sending MTA IPs are estimated in 2 ** precision registers, with a relative error of 1.04 / sqrt(2 **
+    # precision). Changing it requires `rebuild-rollups`
+    MTA_STS_HYPERLOGLOG_PRECISION: int = 12
+    # The failure details of reports starting more than this many days ago are deleted by the retention job, once
+    # rolled up into the daily rollups and sketches. None keeps them.
+    MTA_STS_RETENTION_DAYS: Optional[int] = None
+    # The same by organisation name, overriding MTA_STS_RETENTION_DAYS, e.g. {"Company-X": 30, "Company-Y": null}
+    MTA_STS_RETENTION_DAYS_BY_ORGANISATION: Dict[str, Optional[int]] = {}
+    # Seconds between the runs of the retention job in the API process, None to run it from the CLI only
+    MTA_STS_RETENTION_INTERVAL: Optional[float] = None
+    # The retention job deletes in transactions of about this many seconds, pausing in between for other writers
+    MTA_STS_RETENTION_CHUNK_SECONDS: float = 0.05
+    MTA_STS_RETENTION_PAUSE_SECONDS: float = 0.01
+    MTA_STS_RETENTION_MAX_CHUNK_SIZE: int = 50_000
+    MTA_STS_RETENTION_REPORT_BATCH_SIZE: int = 100
+    # Pages returned to the file system per transaction when SQLite uses incremental auto vacuum
+    MTA_STS_RETENTION_VACUUM_PAGES: int = 1000
+    # Number of reports sharing a transaction in the bulk endpoint
+    MTA_STS_BULK_BATCH_SIZE: int = 100
+    # Archives sent to the bulk endpoint are spooled to disk up to this size
+    MTA_STS_BULK_MAX_SIZE: int = 1024 * 1024 * 1024
+    # Group commit: reports uploaded one at a time (below MTA_STS_STREAMING_THRESHOLD) are written by a single task,
+    # see app/db/writer.py, committing those queued within MTA_STS_GROUP_COMMIT_DELAY seconds of the first together,
+    # up to MTA_STS_GROUP_COMMIT_MAX_REPORTS. A longer delay means fewer commits, each upload waiting up to the delay
+    # longer; with 0 only the reports queued while the previous group was written share a commit. Groups smaller than
+    # the concurrent uploads keep the parsing of the next reports overlapping the writing, see benchmarks.group_commit.
+    # It pays off where commits are costly, e.g. a rollback journal or slow fsync; on Postgres the uploads otherwise
+    # write concurrently
+    MTA_STS_GROUP_COMMIT: bool = False
+    MTA_STS_GROUP_COMMIT_DELAY: float = 0.002
+    MTA_STS_GROUP_COMMIT_MAX_REPORTS: int = 16
+    # Sampling profiles of `POST /mta-sts`, see app/core/profiling.py: requests carrying PROFILING_HEADER with
+    # PROFILING_TOKEN are profiled, and this fraction of the others. The stack is sampled every PROFILING_INTERVAL
+    # seconds, and the last PROFILING_MAX_PROFILES profiles are kept per worker process, see `GET /admin/profiles`
+    PROFILING_TOKEN: Optional[str] = None
+    PROFILING_HEADER: str = "X-Profile"
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL: float = 0.005
+    PROFILING_MAX_PROFILES: int = 20
 
     class Config:
         case_sensitive = True
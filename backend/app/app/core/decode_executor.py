@@ -0,0 +1,110 @@
+import asyncio
+import os
+from concurrent.futures import BrokenExecutor, Executor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple, TypeVar, Union
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.exceptions import InternalServerError, TLSReportingExceptionBase
+
+T = TypeVar("T")
+
+_executor: Optional[Executor] = None
+
+
+def get_executor() -> Optional[Executor]:
+    """The executor configured by ``MTA_STS_DECODE_EXECUTOR``, None when decoding inline."""
+    global _executor
+    if _executor is None:
+        if settings.MTA_STS_DECODE_EXECUTOR == "process":
+            # Imported on first use, as multiprocessing adds to the import time of every worker
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Spawned rather than forked, as forking the threads of the database drivers is unsafe
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.MTA_STS_DECODE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        elif settings.MTA_STS_DECODE_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MTA_STS_DECODE_WORKERS,
+                thread_name_prefix="decode",
+            )
+    return _executor
+
+
+def concurrency() -> int:
+    """The number of reports decoded at a time by the executor, one when decoding inline."""
+    if settings.MTA_STS_DECODE_EXECUTOR == "inline":
+        return 1
+    return settings.MTA_STS_DECODE_WORKERS or os.cpu_count() or 1
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _call(
+    func: Callable[..., T], *args: Any
+) -> Tuple[Union[T, TLSReportingExceptionBase], List[metrics.Observation]]:
+    """Runs in the executor, expected errors are returned instead of raised, so they are passed back as is. So are the
+    metrics recorded, see ``metrics.collect``."""
+    with metrics.collect() as observations:
+        try:
+            return func(*args), observations
+        except TLSReportingExceptionBase as e:
+            return e, observations
+
+
+async def run(func: Callable[[bytes], T], buffer: bytes) -> T:
+    """Runs ``func(buffer)`` in the decode executor, or inline when the buffer is below the inline threshold.
+
+    :param func: A picklable function, e.g. ``MtaSts.decode``.
+    :param buffer: The raw report.
+    :return: The result of the function, errors such as ``GzipError`` and ``JsonError`` are raised as if the function
+        ran inline.
+    """
+    executor = get_executor()
+    if executor is None or len(buffer) < settings.MTA_STS_DECODE_INLINE_THRESHOLD:
+        return func(buffer)
+
+    try:
+        result, observations = await asyncio.get_running_loop().run_in_executor(
+            executor, _call, func, buffer
+        )
+    except BrokenExecutor as e:
+        # A worker died, e.g. killed for running out of memory. The next report gets a new pool, but this report is
+        # not retried inline as it might take down the server instead.
+        shutdown()
+        raise InternalServerError(e)
+    metrics.replay(observations)
+    if isinstance(result, TLSReportingExceptionBase):
+        raise result
+    return result
+
+
+async def run_in_thread(func: Callable[[], T]) -> T:
+    """Runs ``func()`` in a thread of the decode executor, e.g. to decode the next events of a ``MtaStsReportStream``,
+    which reads from the upload and cannot be passed to another process.
+
+    With the process pool the function runs in the default executor of the event loop instead, and inline when
+    decoding inline.
+
+    :return: The result of the function, errors such as ``GzipError`` and ``JsonError`` are raised as if the function
+        ran inline.
+    """
+    executor = get_executor()
+    if executor is None:
+        return func()
+
+    result, observations = await asyncio.get_running_loop().run_in_executor(
+        executor if isinstance(executor, ThreadPoolExecutor) else None, _call, func
+    )
+    metrics.replay(observations)
+    if isinstance(result, TLSReportingExceptionBase):
+        raise result
+    return result
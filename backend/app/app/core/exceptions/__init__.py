@@ -1,4 +1,5 @@
-from typing import Any, List, Optional
+import functools
+from typing import Any, Dict, List, Optional, Type, cast
 
 from app.schemas import IDENTIFIER_INFORMATION
 from fastapi import HTTPException, status
@@ -27,10 +28,42 @@ class TLSReportingExceptionBase(HTTPException):
         super().__init__(status_code=http_status_code, detail=detail)
         self.original_exception = original_exception
 
+    @property
+    def error_detail(self) -> Dict[str, Any]:
+        """The ``detail``, the message and code (and additional information) of the error rather than a string."""
+        return cast(Dict[str, Any], self.detail)
+
     @classmethod
     def additional_example(cls) -> Optional[List[Any]]:
         return cls._ADDITIONAL_EXAMPLE
 
+    def __reduce__(self):
+        # The constructor arguments differ per subclass, so the state is restored as is, e.g. when an error is passed
+        # back from a decode worker process
+        return _restore_exception, (type(self), self.__dict__)
+
+
+def _restore_exception(
+    cls: Type[TLSReportingExceptionBase], state: dict
+) -> TLSReportingExceptionBase:
+    exception = cls.__new__(cls)
+    exception.__dict__.update(state)
+    return exception
+
+
+class Forbidden(TLSReportingExceptionBase):
+    STATUS_CODE = status.HTTP_403_FORBIDDEN
+    MESSAGE = "The request lacks the credentials required by the resource."
+    ERROR_CODE = "403-01"
+
+    def __init__(self, original_exception: Exception):
+        super().__init__(
+            original_exception=original_exception,
+            message=Forbidden.MESSAGE,
+            error_code=Forbidden.ERROR_CODE,
+            http_status_code=Forbidden.STATUS_CODE,
+        )
+
 
 class ResourceNotFound(TLSReportingExceptionBase):
     STATUS_CODE = status.HTTP_404_NOT_FOUND
@@ -76,6 +109,34 @@ class GzipError(TLSReportingExceptionBase):
         )
 
 
+class ReportTooLarge(TLSReportingExceptionBase):
+    STATUS_CODE = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    MESSAGE = "The report exceeds the maximum size accepted by the server."
+    ERROR_CODE = "413-01"
+
+    def __init__(self, original_exception: Exception):
+        super().__init__(
+            original_exception=original_exception,
+            message=ReportTooLarge.MESSAGE,
+            error_code=ReportTooLarge.ERROR_CODE,
+            http_status_code=ReportTooLarge.STATUS_CODE,
+        )
+
+
+class UnsupportedMediaType(TLSReportingExceptionBase):
+    STATUS_CODE = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    MESSAGE = "The content type of the request is not supported by this endpoint."
+    ERROR_CODE = "415-01"
+
+    def __init__(self, original_exception: Exception):
+        super().__init__(
+            original_exception=original_exception,
+            message=UnsupportedMediaType.MESSAGE,
+            error_code=UnsupportedMediaType.ERROR_CODE,
+            http_status_code=UnsupportedMediaType.STATUS_CODE,
+        )
+
+
 class JsonError(TLSReportingExceptionBase):
     STATUS_CODE = status.HTTP_422_UNPROCESSABLE_ENTITY
     MESSAGE = "An error occurred while parsing the JSON content, e.g., not well formatted or incorrect types."
@@ -106,6 +167,38 @@ class JsonError(TLSReportingExceptionBase):
         )
 
 
+class InvalidCursor(TLSReportingExceptionBase):
+    STATUS_CODE = status.HTTP_422_UNPROCESSABLE_ENTITY
+    MESSAGE = (
+        "The cursor is malformed, use the `next_cursor` of the previous page as is."
+    )
+    ERROR_CODE = "422-03"
+
+    def __init__(self, original_exception: Exception):
+        super().__init__(
+            original_exception=original_exception,
+            message=InvalidCursor.MESSAGE,
+            error_code=InvalidCursor.ERROR_CODE,
+            http_status_code=InvalidCursor.STATUS_CODE,
+        )
+
+
+class ExportFormatUnavailable(TLSReportingExceptionBase):
+    STATUS_CODE = status.HTTP_501_NOT_IMPLEMENTED
+    MESSAGE = (
+        "The export format requires pyarrow, which is not installed on the server."
+    )
+    ERROR_CODE = "501-01"
+
+    def __init__(self, original_exception: Exception):
+        super().__init__(
+            original_exception=original_exception,
+            message=ExportFormatUnavailable.MESSAGE,
+            error_code=ExportFormatUnavailable.ERROR_CODE,
+            http_status_code=ExportFormatUnavailable.STATUS_CODE,
+        )
+
+
 class InternalServerError(TLSReportingExceptionBase):
     STATUS_CODE = status.HTTP_500_INTERNAL_SERVER_ERROR
     MESSAGE = "The server encountered an unexpected condition that prevented it from fulfilling the request."
@@ -120,11 +213,14 @@ class InternalServerError(TLSReportingExceptionBase):
         )
 
 
+@functools.lru_cache(maxsize=None)
 def openapi_examples(error_codes: frozenset = None) -> dict:
     """Generates a list of all or a subset of all errors to be used in OpenAPI documentation.
 
     If error_codes is provided only the error codes
 
+    The examples are generated once per set of error codes, as several routes document the same errors. The result
+    is shared, so it must not be modified.
     """
     all_exceptions = dict()
     for subclass in TLSReportingExceptionBase.__subclasses__():
@@ -146,5 +242,4 @@ def openapi_examples(error_codes: frozenset = None) -> dict:
         raise RuntimeError(
             'Not all exceptions in "error_codes" could be matched with an error!'
         )
-    print(all_exceptions)
     return all_exceptions
@@ -1 +1,5 @@
 LOCATION = "Location"
+ETAG = "ETag"
+IF_NONE_MATCH = "If-None-Match"
+CONTENT_DISPOSITION = "Content-Disposition"
+CONTENT_ENCODING = "Content-Encoding"
@@ -0,0 +1,67 @@
+import hashlib
+import math
+import zlib
+from typing import Optional
+
+
+class HyperLogLog:
+    """A HyperLogLog (Flajolet et al., with the small range correction of Heule et al.) estimating the number of
+    distinct values added, in ``2 ** precision`` bytes.
+
+    The relative standard error is ``1.04 / sqrt(2 ** precision)``, about 1.6% for the default precision of 12.
+    Registers are mergeable: the union of any number of HyperLogLogs of the same precision is estimated as accurately
+    as each of them.
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[bytes] = None):
+        """
+        :param precision: The number of bits of the hash selecting the register, between 4 and 16.
+        :param registers: The registers of a HyperLogLog of the same precision, see ``to_bytes``.
+        """
+        self.precision = precision
+        self.registers = bytearray(registers or bytes(1 << precision))
+        if len(self.registers) != 1 << precision:
+            raise ValueError(f"Expected {1 << precision} registers")
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, value: str) -> None:
+        hashed = int.from_bytes(
+            hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+        )
+        index = hashed >> (64 - self.precision)
+        remainder_bits = 64 - self.precision
+        remainder = hashed & ((1 << remainder_bits) - 1)
+        # The position of the leftmost 1-bit of the remainder
+        rank = remainder_bits - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """The HyperLogLog of the union of both."""
+        if other.precision != self.precision:
+            raise ValueError("Only HyperLogLogs of the same precision merge")
+        return HyperLogLog(
+            self.precision,
+            bytes(max(a, b) for a, b in zip(self.registers, other.registers)),
+        )
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def to_bytes(self) -> bytes:
+        """The registers, compressed: mostly zero for the few senders of a domain on a single day."""
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int = 12) -> "HyperLogLog":
+        return cls(precision, zlib.decompress(data))
@@ -0,0 +1,284 @@
+"""Counters and histograms of the ingestion and of the database queries, exposed in the Prometheus text format by
+`GET /metrics`.
+
+Like the caches, the metrics are kept in memory per worker process, and start from zero when the process starts: a
+scraper adds up the workers by their instance. Recording a value is a few list operations, so they are always on.
+
+Values recorded in the decode executor are collected and recorded by the event loop along with the result, see
+``collect`` and ``replay``, as the workers of a process pool have registries of their own.
+"""
+import abc
+import bisect
+import contextlib
+import contextvars
+import math
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.exceptions import TLSReportingExceptionBase
+
+# The content type of version 0.0.4 of the text format, the response adds the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+SECONDS_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+# 1 KiB to 1 GiB
+BYTES_BUCKETS = tuple(1024 * 4 ** power for power in range(11))
+COUNT_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# The name, the label values and the value of a recorded value, see ``collect``
+Observation = Tuple[str, Tuple[str, ...], float]
+
+# By name, in the order they are rendered
+_metrics: Dict[str, "_Metric"] = {}
+_collected: "contextvars.ContextVar[Optional[List[Observation]]]" = (
+    contextvars.ContextVar("collected_observations", default=None)
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(abc.ABC):
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _labels(
+        self, labelvalues: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()
+    ) -> str:
+        pairs = [*zip(self.labelnames, labelvalues), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+    def _record(self, labelvalues: Tuple[str, ...], value: float) -> None:
+        collected = _collected.get()
+        if collected is None:
+            self._apply(labelvalues, value)
+        else:
+            collected.append((self.name, labelvalues, value))
+
+    @abc.abstractmethod
+    def _apply(self, labelvalues: Tuple[str, ...], value: float) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _samples(self) -> Iterator[str]:
+        ...
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+        yield from self._samples()
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        self._record(labelvalues, amount)
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def _apply(self, labelvalues: Tuple[str, ...], value: float) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + value
+
+    def _samples(self) -> Iterator[str]:
+        for labelvalues, value in sorted(self._values.items()):
+            yield f"{self.name}{self._labels(labelvalues)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float],
+        labelnames: Sequence[str] = (),
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # By label values: the count per bucket (not cumulative, the last one being +Inf), the sum and the count
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        self._record(labelvalues, value)
+
+    @contextlib.contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        """Observes the seconds taken by the block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(labelvalues, time.perf_counter() - start)
+
+    def count(self, *labelvalues: str) -> int:
+        values = self._values.get(labelvalues)
+        return 0 if values is None else int(values[-1])
+
+    def _apply(self, labelvalues: Tuple[str, ...], value: float) -> None:
+        values = self._values.get(labelvalues)
+        if values is None:
+            values = self._values[labelvalues] = [0.0] * (len(self.buckets) + 3)
+        # Bucket bounds are inclusive
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def _samples(self) -> Iterator[str]:
+        for labelvalues, values in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), values):
+                cumulative += int(count)
+                labels = self._labels(labelvalues, (("le", _format_value(bound)),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = self._labels(labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(values[-2])}"
+            yield f"{self.name}_count{labels} {int(values[-1])}"
+
+
+class Stages:
+    """Adds up the seconds of the stages of one report, e.g. of the batches of failure details, until observed."""
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.seconds: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = (
+                self.seconds.get(stage, 0) + time.perf_counter() - start
+            )
+
+    def observe(self) -> None:
+        for stage, seconds in self.seconds.items():
+            self.histogram.observe(seconds, stage)
+
+
+ingest_stage_seconds = Histogram(
+    "tls_reporting_ingest_stage_seconds",
+    "Seconds per stage of storing an uploaded report, per report or per transaction for the commit.",
+    SECONDS_BUCKETS,
+    ("stage",),
+)
+ingest_upload_bytes = Histogram(
+    "tls_reporting_ingest_upload_bytes",
+    "Bytes of the uploaded reports as received, gzipped or not.",
+    BYTES_BUCKETS,
+)
+ingest_inflated_bytes = Histogram(
+    "tls_reporting_ingest_inflated_bytes",
+    "Bytes of the JSON of the uploaded reports, after inflating the gzipped ones.",
+    BYTES_BUCKETS,
+)
+ingest_failure_details = Histogram(
+    "tls_reporting_ingest_failure_details",
+    "Failure details per stored report.",
+    COUNT_BUCKETS,
+)
+# The code of the errors of requests with invalid parameters, see ``count_request_validation_error``
+REQUEST_VALIDATION_CODE = "request-validation"
+errors = Counter(
+    "tls_reporting_errors_total",
+    "Errors returned by error code and HTTP status code, including those of the reports of the bulk endpoint.",
+    ("code", "status_code"),
+)
+
+
+query_seconds = Histogram(
+    "tls_reporting_query_seconds",
+    "Seconds per SQL statement, from sending it until the driver returned.",
+    SECONDS_BUCKETS,
+)
+request_queries = Histogram(
+    "tls_reporting_request_queries",
+    "SQL statements per request by the operation ID of the endpoint, see app/db/queries.py.",
+    QUERY_BUCKETS,
+    ("operation",),
+)
+request_query_seconds = Histogram(
+    "tls_reporting_request_query_seconds",
+    "Seconds spent in SQL statements per request by the operation ID of the endpoint.",
+    SECONDS_BUCKETS,
+    ("operation",),
+)
+
+
+def count_error(error: TLSReportingExceptionBase) -> None:
+    """Counts an error returned to the client, see ``errors``."""
+    errors.inc(str(error.error_detail["code"]), str(error.status_code))
+
+
+def count_request_validation_error() -> None:
+    """Counts a request rejected by FastAPI's validation of its parameters, which has no error code of its own."""
+    errors.inc(REQUEST_VALIDATION_CODE, "422")
+
+
+@contextlib.contextmanager
+def collect() -> Iterator[List[Observation]]:
+    """Collects the values recorded by the block in the current context, rather than recording them.
+
+    Used by the decode executor, to pass the values of a worker back with the result, see ``replay``.
+    """
+    observations: List[Observation] = []
+    token = _collected.set(observations)
+    try:
+        yield observations
+    finally:
+        _collected.reset(token)
+
+
+def replay(observations: Sequence[Observation]) -> None:
+    """Records the values collected by ``collect``."""
+    for name, labelvalues, value in observations:
+        _metrics[name]._apply(labelvalues, value)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format."""
+    return (
+        "\n".join(line for metric in _metrics.values() for line in metric.render())
+        + "\n"
+    )
@@ -1,37 +1,168 @@
-import gzip
-import io
+import asyncio
+import functools
+import hashlib
 import json
+import os
+from typing import IO, AsyncGenerator, cast
 
-from app.core.exceptions import GzipError, JsonError
+from app.core import decode_executor, metrics
+from app.core.config import settings
+from app.core.exceptions import JsonError, ReportTooLarge
+from app.core.mta_sts_stream import (
+    MAGIC_BYTE_GZ,
+    BoundedInflater,
+    MtaStsReportStream,
+    ReportEvent,
+    next_events,
+)
 from app.schemas.mta_sts_report import MtaStsReport
 from fastapi import UploadFile
 from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 
 
 class MtaSts:
 
     # The magic bytes for gz or tar.gz is 1f8b
-    MAGIC_BYTE_GZ = b"\x1f\x8b"
+    MAGIC_BYTE_GZ = MAGIC_BYTE_GZ
 
     @staticmethod
     def unzip(buffer: bytes) -> bytes:
-        compressed_file = io.BytesIO(buffer)
-        try:
-            return gzip.GzipFile(fileobj=compressed_file).read()
-        except Exception as e:
-            raise GzipError(e)
+        inflater = BoundedInflater()
+        inflated = b"".join(inflater.inflate(buffer))
+        inflater.finish()
+        return inflated
 
     @classmethod
-    async def parse(cls, raw_content: UploadFile) -> MtaStsReport:
-        buffer = await raw_content.read()
+    def decode(cls, buffer: bytes) -> MtaStsReport:
+        metrics.ingest_upload_bytes.observe(len(buffer))
         if buffer.startswith(cls.MAGIC_BYTE_GZ):
-            buffer = cls.unzip(buffer)
+            with metrics.ingest_stage_seconds.time("gunzip"):
+                buffer = cls.unzip(buffer)
+        elif len(buffer) > settings.MTA_STS_MAX_INFLATED_SIZE:
+            raise ReportTooLarge(
+                ValueError(f"Report exceeds {settings.MTA_STS_MAX_INFLATED_SIZE} bytes")
+            )
+        metrics.ingest_inflated_bytes.observe(len(buffer))
 
         try:
-            raw_report = json.loads(buffer)
+            with metrics.ingest_stage_seconds.time("json"):
+                raw_report = json.loads(buffer)
         except (json.JSONDecodeError, ValueError, TypeError, KeyError) as e:
             raise JsonError(e)
         try:
-            return MtaStsReport(**raw_report)
+            with metrics.ingest_stage_seconds.time("validation"):
+                return MtaStsReport(**raw_report)
         except ValidationError as e:
             raise JsonError(e)
+
+    @classmethod
+    async def dispatch_decode(cls, buffer: bytes) -> MtaStsReport:
+        """Decodes the report in the configured decode executor, so large reports do not block the event loop."""
+        return await decode_executor.run(cls.decode, buffer)
+
+    @staticmethod
+    def file_size(file: IO[bytes]) -> int:
+        """The size of the (spooled) file, without reading it."""
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(0)
+        return size
+
+    @classmethod
+    def inflated_size(cls, file: IO[bytes]) -> int:
+        """The size of the (spooled) file once inflated, without inflating it.
+
+        Gzip records the inflated size modulo 2 ** 32 in its trailer (ISIZE), of the last member when several are
+        concatenated. A trailer not matching the data is rejected while inflating, and either way the inflated size
+        remains bounded by ``MTA_STS_MAX_INFLATED_SIZE``.
+        """
+        size = cls.file_size(file)
+        if file.read(len(cls.MAGIC_BYTE_GZ)) != cls.MAGIC_BYTE_GZ:
+            file.seek(0)
+            return size
+        file.seek(-min(size, 4), os.SEEK_END)
+        trailer_size = int.from_bytes(file.read(4), "little")
+        file.seek(0)
+        return max(size, trailer_size)
+
+    @classmethod
+    def size(cls, raw_content: UploadFile) -> int:
+        """The size of the raw upload, without reading it."""
+        return cls.file_size(raw_content.file)
+
+    @classmethod
+    def check_size(cls, raw_content: UploadFile) -> int:
+        """The size of the raw upload, raises ``ReportTooLarge`` if it exceeds the compressed size limit."""
+        size = cls.size(raw_content)
+        if size > settings.MTA_STS_MAX_COMPRESSED_SIZE:
+            raise ReportTooLarge(
+                ValueError(
+                    f"Upload exceeds {settings.MTA_STS_MAX_COMPRESSED_SIZE} bytes"
+                )
+            )
+        return size
+
+    @classmethod
+    def is_streamable(cls, raw_content: UploadFile) -> bool:
+        """Whether the upload is large enough once inflated to be decoded incrementally, see ``MtaSts.stream``."""
+        return (
+            cls.inflated_size(raw_content.file) >= settings.MTA_STS_STREAMING_THRESHOLD
+        )
+
+    @staticmethod
+    def content_hash(buffer: bytes) -> str:
+        """The hex encoded SHA-256 of the raw (possibly gzipped) report, identifying exact duplicates."""
+        return hashlib.sha256(buffer).hexdigest()
+
+    @staticmethod
+    def _hash_file(file: IO[bytes]) -> str:
+        sha256 = hashlib.sha256()
+        file.seek(0)
+        for chunk in iter(lambda: file.read(settings.MTA_STS_STREAM_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+        file.seek(0)
+        return sha256.hexdigest()
+
+    @classmethod
+    async def hash_file(cls, file: IO[bytes]) -> str:
+        """The ``content_hash`` of the (spooled) file, without decoding it. Large files are hashed in a thread."""
+        if cls.file_size(file) < settings.MTA_STS_DECODE_INLINE_THRESHOLD:
+            return cls._hash_file(file)
+        return await run_in_threadpool(cls._hash_file, file)
+
+    @classmethod
+    async def hash_upload(cls, raw_content: UploadFile) -> str:
+        """The ``content_hash`` of the upload, raises ``ReportTooLarge`` if it exceeds the compressed size limit."""
+        cls.check_size(raw_content)
+        return await cls.hash_file(raw_content.file)
+
+    @classmethod
+    async def parse(cls, raw_content: UploadFile) -> MtaStsReport:
+        cls.check_size(raw_content)
+        # Uploads are read as bytes
+        buffer = cast(bytes, await raw_content.read())
+        return await cls.dispatch_decode(buffer)
+
+    @staticmethod
+    async def stream(raw_content: IO[bytes]) -> AsyncGenerator[ReportEvent, None]:
+        """Decodes the report incrementally while it is inflated and read from the (spooled) upload.
+
+        The events are decoded by the decode executor a batch at a time, see ``next_events``, the next batch while the
+        current one is stored, so reading, inflating and parsing do not run on the event loop (nor in the writer
+        task). The caller closes the iterator (``aclose``) once done with it.
+        """
+        advance = functools.partial(next_events, iter(MtaStsReportStream(raw_content)))
+        pending = asyncio.ensure_future(decode_executor.run_in_thread(advance))
+        try:
+            while True:
+                batch = await pending
+                if not batch:
+                    return
+                pending = asyncio.ensure_future(decode_executor.run_in_thread(advance))
+                for event in batch:
+                    yield event
+        finally:
+            # The batch decoded ahead is not needed anymore, nor is its error
+            if not pending.cancel():
+                pending.exception()
@@ -0,0 +1,304 @@
+import asyncio
+import io
+import tarfile
+import tempfile
+import threading
+import zipfile
+from typing import (
+    IO,
+    AsyncGenerator,
+    AsyncIterator,
+    BinaryIO,
+    Iterator,
+    NamedTuple,
+    Optional,
+)
+
+from app.core.config import settings
+from app.core.exceptions import (
+    GzipError,
+    ReportTooLarge,
+    TLSReportingExceptionBase,
+    UnsupportedMediaType,
+)
+from app.core.mta_sts import MtaSts
+from app.schemas.mta_sts_report import MtaStsReport
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+# Name of the multipart field holding the reports
+FORM_FIELD = "reports"
+MULTIPART_MEDIA_TYPE = "multipart/form-data"
+NDJSON_MEDIA_TYPES = frozenset({"application/x-ndjson", "application/jsonl"})
+ARCHIVE_MEDIA_TYPES = frozenset(
+    {
+        "application/x-tar",
+        "application/x-gtar",
+        "application/gzip",
+        "application/x-gzip",
+        "application/zip",
+        "application/x-zip-compressed",
+    }
+)
+MAGIC_BYTE_ZIP = b"PK\x03\x04"
+
+
+class BulkItem(NamedTuple):
+    """A single report of a bulk request, either its raw content (spooled to disk when large) or the error that
+    prevented reading it."""
+
+    name: str
+    file: Optional[BinaryIO] = None
+    error: Optional[TLSReportingExceptionBase] = None
+
+    async def content_hash(self) -> Optional[str]:
+        return None if self.file is None else await MtaSts.hash_file(self.file)
+
+    def is_streamable(self) -> bool:
+        """Whether the report is large enough once inflated to be decoded incrementally, see ``MtaSts.stream``."""
+        return (
+            self.file is not None
+            and MtaSts.inflated_size(self.file) >= settings.MTA_STS_STREAMING_THRESHOLD
+        )
+
+    async def decode(self) -> MtaStsReport:
+        """Reads and decodes the whole report, see ``MtaSts.dispatch_decode``."""
+        if self.error is not None:
+            raise self.error
+        assert self.file is not None
+        return await MtaSts.dispatch_decode(self.file.read())
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+def _too_large(name: str) -> BulkItem:
+    return BulkItem(
+        name,
+        error=ReportTooLarge(
+            ValueError(f"Report exceeds {settings.MTA_STS_MAX_COMPRESSED_SIZE} bytes")
+        ),
+    )
+
+
+def _spooled_file() -> BinaryIO:
+    return tempfile.SpooledTemporaryFile(  # type: ignore
+        max_size=settings.MTA_STS_STREAM_CHUNK_SIZE * 16
+    )
+
+
+def _spool_member(name: str, member: IO[bytes]) -> BulkItem:
+    """Copies an archive member chunk by chunk, as the member can only be read while the archive is iterated."""
+    spooled = _spooled_file()
+    size = 0
+    for chunk in iter(lambda: member.read(settings.MTA_STS_STREAM_CHUNK_SIZE), b""):
+        size += len(chunk)
+        if size > settings.MTA_STS_MAX_COMPRESSED_SIZE:
+            spooled.close()
+            return _too_large(name)
+        spooled.write(chunk)
+    spooled.seek(0)
+    return BulkItem(name, spooled)
+
+
+def is_archive(file: BinaryIO) -> bool:
+    """Whether the file is a zip or (compressed) tar archive rather than a single (gzipped) report."""
+    try:
+        if file.read(len(MAGIC_BYTE_ZIP)) == MAGIC_BYTE_ZIP:
+            return True
+        file.seek(0)
+        return tarfile.is_tarfile(file)
+    except (tarfile.TarError, OSError, EOFError):
+        # E.g. a truncated gzipped report, which is reported once the report is decoded
+        return False
+    finally:
+        file.seek(0)
+
+
+def iter_archive(file: BinaryIO, name: str = "") -> Iterator[BulkItem]:
+    """Yields the regular files of a zip or (compressed) tar archive as bulk items."""
+    prefix = f"{name}/" if name else ""
+    if file.read(len(MAGIC_BYTE_ZIP)) == MAGIC_BYTE_ZIP:
+        file.seek(0)
+        yield from _iter_zip(file, prefix)
+    else:
+        file.seek(0)
+        yield from _iter_tar(file, prefix)
+
+
+def _iter_zip(file: BinaryIO, prefix: str) -> Iterator[BulkItem]:
+    try:
+        with zipfile.ZipFile(file) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if info.file_size > settings.MTA_STS_MAX_COMPRESSED_SIZE:
+                    yield _too_large(prefix + info.filename)
+                    continue
+                with archive.open(info) as member:
+                    yield _spool_member(prefix + info.filename, member)
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError, EOFError) as e:
+        raise GzipError(e)
+
+
+def _iter_tar(file: BinaryIO, prefix: str) -> Iterator[BulkItem]:
+    try:
+        with tarfile.open(fileobj=file, mode="r:*") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                if member.size > settings.MTA_STS_MAX_COMPRESSED_SIZE:
+                    yield _too_large(prefix + member.name)
+                    continue
+                extracted = archive.extractfile(member)
+                if extracted is None:
+                    continue
+                yield _spool_member(prefix + member.name, extracted)
+    except (tarfile.TarError, OSError, EOFError) as e:
+        raise GzipError(e)
+
+
+def _iter_upload(file: BinaryIO, name: str) -> Iterator[BulkItem]:
+    if is_archive(file):
+        yield from iter_archive(file, name)
+    elif MtaSts.file_size(file) > settings.MTA_STS_MAX_COMPRESSED_SIZE:
+        yield _too_large(name)
+    else:
+        yield BulkItem(name, file)
+
+
+async def _iter_in_thread(items: Iterator[BulkItem]) -> AsyncIterator[BulkItem]:
+    """Iterates the items in a thread, as inflating and spooling the members of an archive would block the event loop.
+
+    The items are handed over through a queue of at most ``MTA_STS_BULK_BATCH_SIZE`` items, so the thread does not get
+    ahead of the batches being stored. The items not handed over once the caller stops iterating are closed.
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Optional[BulkItem]]" = asyncio.Queue(
+        settings.MTA_STS_BULK_BATCH_SIZE
+    )
+    stopped = threading.Event()
+
+    def put(item: Optional[BulkItem]) -> None:
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if stopped.is_set():
+                    item.close()
+                    break
+                put(item)
+        finally:
+            # The end of the items, the error (if any) is raised by the producer
+            put(None)
+
+    producer = asyncio.ensure_future(run_in_threadpool(produce))
+    finished = False
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                finished = True
+                break
+            yield item
+        await producer
+    finally:
+        if not finished:
+            stopped.set()
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                item.close()
+            await asyncio.gather(producer, return_exceptions=True)
+
+
+async def _spool(request: Request) -> BinaryIO:
+    spooled = _spooled_file()
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > settings.MTA_STS_BULK_MAX_SIZE:
+            spooled.close()
+            raise ReportTooLarge(
+                ValueError(f"Request exceeds {settings.MTA_STS_BULK_MAX_SIZE} bytes")
+            )
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+async def _iter_ndjson(request: Request) -> AsyncIterator[BulkItem]:
+    """Yields the non-blank lines, each spooled while it is received like the members of an archive."""
+    line_number = 1
+    spooled = _spooled_file()
+    size = 0
+    blank = True
+    try:
+        async for chunk in request.stream():
+            start = 0
+            while True:
+                end = chunk.find(b"\n", start)
+                part = chunk[start:] if end < 0 else chunk[start:end]
+                size += len(part)
+                if size > settings.MTA_STS_MAX_COMPRESSED_SIZE:
+                    raise ReportTooLarge(
+                        ValueError(
+                            f"Line {line_number} exceeds the maximum report size"
+                        )
+                    )
+                spooled.write(part)
+                blank = blank and not part.strip()
+                if end < 0:
+                    break
+                spooled.seek(0)
+                if blank:
+                    spooled.truncate()
+                else:
+                    line, spooled = spooled, _spooled_file()
+                    yield BulkItem(f"line {line_number}", line)
+                line_number += 1
+                size = 0
+                blank = True
+                start = end + 1
+        if not blank:
+            spooled.seek(0)
+            line, spooled = spooled, _spooled_file()
+            yield BulkItem(f"line {line_number}", line)
+    finally:
+        spooled.close()
+
+
+async def iter_bulk_items(request: Request) -> AsyncGenerator[BulkItem, None]:
+    """Yields the reports of a bulk request.
+
+    Supported are NDJSON (one report per line), a multipart list of reports and archives in the ``reports`` field, and
+    a zip or (compressed) tar archive as the request body. Reports are plain or gzipped JSON. The caller closes the
+    items once done with them.
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if media_type == MULTIPART_MEDIA_TYPE:
+        form = await request.form()
+        for index, upload in enumerate(form.getlist(FORM_FIELD)):
+            if isinstance(upload, str):
+                yield BulkItem(f"{FORM_FIELD}[{index}]", io.BytesIO(upload.encode()))
+            else:
+                async for item in _iter_in_thread(
+                    _iter_upload(upload.file, upload.filename)
+                ):
+                    yield item
+    elif media_type in NDJSON_MEDIA_TYPES:
+        async for item in _iter_ndjson(request):
+            yield item
+    elif media_type in ARCHIVE_MEDIA_TYPES:
+        spooled = await _spool(request)
+        try:
+            async for item in _iter_in_thread(iter_archive(spooled)):
+                yield item
+        finally:
+            spooled.close()
+    else:
+        raise UnsupportedMediaType(ValueError(media_type))
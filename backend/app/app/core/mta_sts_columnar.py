@@ -0,0 +1,186 @@
+"""Columnar exports of the failure details as an Arrow IPC stream or Parquet, see ``mta_sts_export`` for the textual
+formats.
+
+pyarrow is optional: it is only imported once a columnar export is requested, and ``require_pyarrow`` tells up front
+whether it is installed.
+"""
+import functools
+import io
+import ipaddress
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+from app.core import exceptions
+from app.core.config import settings
+from app.core.mta_sts_export import FIELDS
+
+# The columns of a columnar export, in order: the summary of the policy follows the policy
+COLUMNS = (
+    FIELDS[:8]
+    + ("total-successful-session-count", "total-failure-session-count")
+    + FIELDS[8:]
+)
+# The columns of few distinct values, stored once per batch (Arrow) or column chunk (Parquet)
+DICTIONARY_COLUMNS = frozenset(
+    {
+        "organization-name",
+        "policy-type",
+        "policy-domain",
+        "mx-host",
+        "result-type",
+        "receiving-mx-hostname",
+        "failure-reason-code",
+    }
+)
+TIMESTAMP_COLUMNS = frozenset({"start-datetime", "end-datetime"})
+INTEGER_COLUMNS = frozenset(
+    {
+        "total-successful-session-count",
+        "total-failure-session-count",
+        "failed-session-count",
+    }
+)
+# Stored as 16 bytes, IPv4 addresses mapped into IPv6 (::ffff:0:0/96)
+IP_COLUMNS = frozenset({"sending-mta-ip", "receiving-ip"})
+
+
+def require_pyarrow():
+    """The pyarrow module, raises ``ExportFormatUnavailable`` if it is not installed."""
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise exceptions.ExportFormatUnavailable(e)
+    return pyarrow
+
+
+@functools.lru_cache(maxsize=4096)
+def _packed_ip(value: Optional[str]) -> Optional[bytes]:
+    if value is None:
+        return None
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if address.version == 4:
+        return b"\0" * 10 + b"\xff\xff" + address.packed
+    return address.packed
+
+
+def schema():
+    pa = require_pyarrow()
+    fields = []
+    for column in COLUMNS:
+        if column in DICTIONARY_COLUMNS:
+            data_type = pa.dictionary(pa.int32(), pa.string())
+        elif column in TIMESTAMP_COLUMNS:
+            data_type = pa.timestamp("us", tz="UTC")
+        elif column in INTEGER_COLUMNS:
+            data_type = pa.int64()
+        elif column in IP_COLUMNS:
+            data_type = pa.binary(16)
+        else:
+            data_type = pa.string()
+        fields.append(pa.field(column, data_type))
+    return pa.schema(fields)
+
+
+def record_batch(records: Sequence[Sequence[Any]], arrow_schema):
+    """The records as an Arrow record batch.
+
+    :param records: The records, their values in the order of ``COLUMNS``, timestamps as naive UTC datetimes.
+    :param arrow_schema: See ``schema``.
+    """
+    pa = require_pyarrow()
+    arrays = []
+    columns = list(zip(*records)) or [()] * len(COLUMNS)
+    for field, values in zip(arrow_schema, columns):
+        if field.name in IP_COLUMNS:
+            values = [_packed_ip(value) for value in values]
+        if pa.types.is_dictionary(field.type):
+            array = pa.array(values, pa.string()).dictionary_encode()
+        else:
+            # Naive datetimes are taken to be UTC
+            array = pa.array(values, field.type)
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=arrow_schema)
+
+
+class _Chunks(io.RawIOBase):
+    """A write-only file which hands out what is written to it chunk by chunk, while tracking its position."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        chunk = b"".join(self._chunks)
+        self._chunks = []
+        return chunk
+
+
+async def encode_arrow(
+    batches: AsyncIterator[Sequence[Sequence[Any]]],
+) -> AsyncIterator[bytes]:
+    """Encodes the batches of records as an Arrow IPC stream, one record batch per batch.
+
+    :param batches: The records, see ``record_batch``.
+    :return: The encoded chunks, which only hold a single batch in memory at a time.
+    """
+    pa = require_pyarrow()
+    arrow_schema = schema()
+    sink = _Chunks()
+    # The stream format allows the dictionaries to differ between the record batches
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), arrow_schema) as writer:
+        async for batch in batches:
+            writer.write_batch(record_batch(batch, arrow_schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+async def encode_parquet(
+    batches: AsyncIterator[Sequence[Sequence[Any]]],
+) -> AsyncIterator[bytes]:
+    """Encodes the batches of records as a (zstd compressed) Parquet file, a row group per
+    ``MTA_STS_EXPORT_ROW_GROUP_SIZE`` records.
+
+    :param batches: The records, see ``record_batch``.
+    :return: The encoded chunks, one per row group.
+    """
+    require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_schema = schema()
+    sink = _Chunks()
+    row_group: List = []
+    row_group_size = 0
+    with pq.ParquetWriter(
+        pa.PythonFile(sink, mode="w"), arrow_schema, compression="zstd"
+    ) as writer:
+        async for batch in batches:
+            row_group.append(record_batch(batch, arrow_schema))
+            row_group_size += len(batch)
+            if row_group_size >= settings.MTA_STS_EXPORT_ROW_GROUP_SIZE:
+                writer.write_table(
+                    pa.Table.from_batches(row_group), row_group_size=row_group_size
+                )
+                row_group = []
+                row_group_size = 0
+                yield sink.drain()
+        if row_group:
+            writer.write_table(
+                pa.Table.from_batches(row_group), row_group_size=row_group_size
+            )
+    yield sink.drain()
@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+import zlib
+from enum import Enum
+from typing import Any, AsyncIterator, Iterable, Sequence
+
+# The columns of an exported failure detail, in order
+FIELDS = (
+    "identifier",
+    "report-id",
+    "organization-name",
+    "start-datetime",
+    "end-datetime",
+    "policy-type",
+    "policy-domain",
+    "mx-host",
+    "result-type",
+    "sending-mta-ip",
+    "receiving-mx-hostname",
+    "receiving-mx-helo",
+    "receiving-ip",
+    "failed-session-count",
+    "additional-information",
+    "failure-reason-code",
+)
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+    # Columnar, see ``mta_sts_columnar``
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+COLUMNAR_FORMATS = frozenset({ExportFormat.ARROW, ExportFormat.PARQUET})
+
+
+def _ndjson(records: Iterable[Sequence[Any]]) -> bytes:
+    return b"".join(
+        json.dumps(
+            {field: value for field, value in zip(FIELDS, record) if value is not None},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode()
+        + b"\n"
+        for record in records
+    )
+
+
+def _csv(records: Iterable[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\r\n").writerows(records)
+    return buffer.getvalue().encode()
+
+
+async def encode(
+    batches: AsyncIterator[Sequence[Sequence[Any]]], export_format: ExportFormat
+) -> AsyncIterator[bytes]:
+    """Encodes the batches of records as NDJSON or CSV (RFC 4180), one chunk per batch.
+
+    :param batches: The records, their values in the order of ``FIELDS``.
+    :param export_format: The format of the chunks, NDJSON or CSV.
+    :return: The encoded chunks, which only hold a single batch in memory at a time.
+    """
+    write = _csv if export_format is ExportFormat.CSV else _ndjson
+    if export_format is ExportFormat.CSV:
+        yield _csv([FIELDS])
+    async for batch in batches:
+        yield write(batch)
+
+
+async def compress(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compresses the chunks into a single gzip stream, chunk by chunk."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
@@ -0,0 +1,440 @@
+import codecs
+import itertools
+import json
+import re
+import zlib
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.exceptions import GzipError, JsonError, ReportTooLarge
+from app.schemas.mta_sts_report import MtaStsReport, MtaStsReportHeader
+from app.schemas.mta_sts_report.mta_sts_policy import (
+    FailureDetail,
+    Policy,
+    PolicyContainer,
+    Summary,
+)
+from pydantic import ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+
+# The magic bytes for gz or tar.gz is 1f8b
+MAGIC_BYTE_GZ = b"\x1f\x8b"
+
+_HEADER_FIELDS = frozenset(
+    field.alias for field in MtaStsReportHeader.__fields__.values() if field.required
+)
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+# The longest literal, errors at most this many characters before the end of the buffer might be due to it
+_LONGEST_TOKEN = len("-Infinity")
+
+
+class StreamedPolicy(NamedTuple):
+    policy_index: int
+    policy: Policy
+    summary: Summary
+
+
+class StreamedFailureDetails(NamedTuple):
+    policy_index: int
+    failure_details: List[FailureDetail]
+
+
+ReportEvent = Union[MtaStsReportHeader, StreamedPolicy, StreamedFailureDetails]
+
+
+class BoundedInflater:
+    """Inflates gzip data chunk by chunk while enforcing the configured size and ratio limits.
+
+    A gzip bomb is rejected as soon as either limit is crossed instead of after it has been inflated in full.
+    """
+
+    def __init__(
+        self,
+        max_inflated_size: int = None,
+        max_compression_ratio: int = None,
+        chunk_size: int = None,
+    ):
+        self.max_inflated_size = max_inflated_size or settings.MTA_STS_MAX_INFLATED_SIZE
+        self.max_compression_ratio = (
+            max_compression_ratio or settings.MTA_STS_MAX_COMPRESSION_RATIO
+        )
+        self.chunk_size = chunk_size or settings.MTA_STS_STREAM_CHUNK_SIZE
+        self.compressed_size = 0
+        self.inflated_size = 0
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _check_limits(self) -> None:
+        if self.inflated_size > self.max_inflated_size:
+            raise GzipError(
+                ValueError(
+                    f"Inflated size exceeds {self.max_inflated_size} bytes",
+                )
+            )
+        # Small inputs are not checked, as the gzip header alone skews the ratio
+        if (
+            self.inflated_size > self.chunk_size
+            and self.inflated_size > self.compressed_size * self.max_compression_ratio
+        ):
+            raise GzipError(
+                ValueError(
+                    f"Compression ratio exceeds {self.max_compression_ratio}",
+                )
+            )
+
+    def inflate(self, data: bytes) -> Iterator[bytes]:
+        self.compressed_size += len(data)
+        while data:
+            if self._decompressor.eof:
+                # Concatenated gzip members are allowed, just like gzip.GzipFile does
+                data = self._decompressor.unused_data + data
+                if not data.startswith(MAGIC_BYTE_GZ):
+                    raise GzipError(OSError("Trailing garbage after gzip data"))
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                inflated = self._decompressor.decompress(data, self.chunk_size)
+            except zlib.error as e:
+                raise GzipError(e)
+            data = self._decompressor.unconsumed_tail
+            self.inflated_size += len(inflated)
+            self._check_limits()
+            if inflated:
+                yield inflated
+
+    def finish(self) -> None:
+        if not self._decompressor.eof:
+            raise GzipError(
+                EOFError("Compressed file ended before the end-of-stream marker")
+            )
+
+
+def iter_raw_chunks(
+    file: IO[bytes], chunk_size: int = None, max_size: int = None
+) -> Iterator[bytes]:
+    """Reads the raw (possibly compressed) upload in chunks."""
+    chunk_size = chunk_size or settings.MTA_STS_STREAM_CHUNK_SIZE
+    max_size = max_size or settings.MTA_STS_MAX_COMPRESSED_SIZE
+    total = 0
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            metrics.ingest_upload_bytes.observe(total)
+            return
+        total += len(chunk)
+        if total > max_size:
+            raise ReportTooLarge(ValueError(f"Upload exceeds {max_size} bytes"))
+        yield chunk
+
+
+def iter_inflated_chunks(raw_chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Inflates gzipped input on the fly; plain input is passed through with the inflated size limit applied."""
+    raw_chunks = iter(raw_chunks)
+    first = next(raw_chunks, b"")
+    if first.startswith(MAGIC_BYTE_GZ):
+        inflater = BoundedInflater()
+        yield from inflater.inflate(first)
+        for chunk in raw_chunks:
+            yield from inflater.inflate(chunk)
+        inflater.finish()
+        metrics.ingest_inflated_bytes.observe(inflater.inflated_size)
+        return
+
+    total = 0
+    for chunk in itertools.chain((first,), raw_chunks):
+        total += len(chunk)
+        if total > settings.MTA_STS_MAX_INFLATED_SIZE:
+            raise ReportTooLarge(
+                ValueError(f"Report exceeds {settings.MTA_STS_MAX_INFLATED_SIZE} bytes")
+            )
+        yield chunk
+    metrics.ingest_inflated_bytes.observe(total)
+
+
+def iter_text_chunks(byte_chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decodes UTF-8 input (I-JSON, RFC7493) incrementally."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        for chunk in byte_chunks:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise JsonError(e)
+    if text:
+        yield text
+
+
+def _cut_off(error: json.JSONDecodeError, buffer_size: int) -> bool:
+    """Whether the error might be due to the end of the buffer rather than invalid JSON.
+
+    An incomplete value is reported at the end of the buffer, except for an incomplete string, reported where the
+    string starts, and an incomplete literal (such as ``true`` or ``-Infinity``) or escape (``\\uXXXX``), reported
+    where it starts.
+    """
+    return (
+        error.msg.startswith("Unterminated string")
+        or buffer_size - error.pos < _LONGEST_TOKEN
+    )
+
+
+class _TextReader:
+    """Minimal pull reader on top of text chunks.
+
+    Structural characters are consumed one at a time, while each value is decoded with ``json.JSONDecoder.raw_decode``
+    once it is completely buffered, so the memory usage is bounded by the largest single value rather than the report.
+    """
+
+    def __init__(self, chunks: Iterable[str]):
+        self._chunks = iter(chunks)
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _fill(self, minimum: int = 1) -> bool:
+        """Buffers at least ``minimum`` more characters, returns False if the input ended before."""
+        self._buffer = self._buffer[self._position :]
+        self._position = 0
+        read: List[str] = []
+        read_size = 0
+        while not self._eof and read_size < minimum:
+            try:
+                read.append(next(self._chunks))
+                read_size += len(read[-1])
+            except StopIteration:
+                self._eof = True
+        self._buffer += "".join(read)
+        return read_size > 0
+
+    def _error(self, message: str) -> JsonError:
+        return JsonError(json.JSONDecodeError(message, self._buffer, self._position))
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character without consuming it."""
+        while True:
+            whitespace = _WHITESPACE.match(self._buffer, self._position)
+            # Always matches, if only the empty string
+            assert whitespace is not None
+            self._position = whitespace.end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                raise self._error("Unexpected end of input")
+
+    def expect(self, characters: str) -> str:
+        char = self.peek()
+        if char not in characters:
+            raise self._error(f"Expecting one of {characters!r}")
+        self._position += 1
+        return char
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError as e:
+                # Only a value cut off by the end of the buffer may be completed by the next chunks, in which case the
+                # buffer is doubled, keeping the retries linear in total. Any other error is raised at once, rather
+                # than after reading the rest of the report.
+                if _cut_off(e, len(self._buffer)) and self._fill(
+                    2 * (len(self._buffer) - self._position)
+                ):
+                    continue
+                raise JsonError(e)
+            # A number at the end of the buffer might continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._position = end
+            return value
+
+    def end(self) -> None:
+        try:
+            self.peek()
+        except JsonError:
+            return
+        raise self._error("Extra data")
+
+    def object_keys(self) -> Iterator[str]:
+        """Yields the keys of a JSON object, the caller must consume each value before resuming."""
+        self.expect("{")
+        if self.peek() == "}":
+            self._position += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise self._error("Expecting property name")
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def array_items(self) -> Iterator[int]:
+        """Yields the index of each array item, the caller must consume each item before resuming."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._position += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.expect(",]") == "]":
+                return
+
+
+def _validation_error(
+    e: ValidationError, loc: Tuple[Union[int, str], ...]
+) -> JsonError:
+    return JsonError(ValidationError([ErrorWrapper(e, loc=loc)], MtaStsReport))
+
+
+class MtaStsReportStream:
+    """Decodes a report incrementally into a sequence of events.
+
+    The header (``MtaStsReportHeader``) is always the first event, followed by each policy (``StreamedPolicy``) and
+    the failure details of that policy in batches of at most ``batch_size`` (``StreamedFailureDetails``). Reports
+    listing the policies before the header, or the failure details before the policy, are still accepted but the
+    events are held back in memory until they can be emitted in that order.
+    """
+
+    def __init__(self, file: IO[bytes], batch_size: int = None):
+        self._reader = _TextReader(
+            iter_text_chunks(iter_inflated_chunks(iter_raw_chunks(file)))
+        )
+        self.batch_size = batch_size or settings.MTA_STS_FAILURE_DETAIL_BATCH_SIZE
+
+    def __iter__(self) -> Iterator[ReportEvent]:
+        header: Dict[str, Any] = {}
+        held_back: Optional[List[ReportEvent]] = None
+        has_policies = False
+
+        for key in self._reader.object_keys():
+            if key != "policies":
+                header[key] = self._reader.value()
+                continue
+            has_policies = True
+            if _HEADER_FIELDS.issubset(header):
+                yield self._header(header, has_policies)
+            else:
+                held_back = []
+            for event in self._policies():
+                if held_back is None:
+                    yield event
+                else:
+                    held_back.append(event)
+        self._reader.end()
+
+        if held_back is not None or not has_policies:
+            yield self._header(header, has_policies)
+            yield from held_back or ()
+
+    @staticmethod
+    def _header(header: Dict[str, Any], has_policies: bool) -> MtaStsReportHeader:
+        try:
+            if not has_policies:
+                # Reports the missing field in the same way as the non-streaming path
+                MtaStsReport.parse_obj(header)
+            return MtaStsReportHeader.parse_obj(header)
+        except ValidationError as e:
+            raise JsonError(e)
+
+    def _policies(self) -> Iterator[Union[StreamedPolicy, StreamedFailureDetails]]:
+        for index in self._reader.array_items():
+            yield from self._policy(index)
+
+    def _policy(
+        self, index: int
+    ) -> Iterator[Union[StreamedPolicy, StreamedFailureDetails]]:
+        container: Dict[str, Any] = {}
+        held_back: List[StreamedFailureDetails] = []
+        policy: Optional[StreamedPolicy] = None
+
+        for key in self._reader.object_keys():
+            if key == "failure-details":
+                for batch in self._failure_details(index):
+                    if policy is None:
+                        held_back.append(batch)
+                    else:
+                        yield batch
+            else:
+                container[key] = self._reader.value()
+
+            if policy is None and "policy" in container and "summary" in container:
+                policy = self._validated_policy(index, container)
+                yield policy
+                yield from held_back
+                held_back.clear()
+
+        if policy is None:
+            yield self._validated_policy(index, container)
+            yield from held_back
+
+    @staticmethod
+    def _validated_policy(index: int, container: Dict[str, Any]) -> StreamedPolicy:
+        try:
+            validated = PolicyContainer.parse_obj(
+                {"policy": container.get("policy"), "summary": container.get("summary")}
+            )
+        except ValidationError as e:
+            raise _validation_error(e, ("policies", index))
+        return StreamedPolicy(index, validated.policy, validated.summary)
+
+    def _failure_details(self, policy_index: int) -> Iterator[StreamedFailureDetails]:
+        batch = []
+        for index in self._reader.array_items():
+            try:
+                batch.append(FailureDetail.parse_obj(self._reader.value()))
+            except ValidationError as e:
+                raise _validation_error(
+                    e, ("policies", policy_index, "failure-details", index)
+                )
+            if len(batch) >= self.batch_size:
+                yield StreamedFailureDetails(policy_index, batch)
+                batch = []
+        if batch:
+            yield StreamedFailureDetails(policy_index, batch)
+
+
+def next_events(events: Iterator[ReportEvent], limit: int = None) -> List[ReportEvent]:
+    """Decodes the next events, up to and including the next batch of failure details.
+
+    :param events: The events of a report, e.g. of a ``MtaStsReportStream``.
+    :param limit: The maximum number of events, by default the failure detail batch size.
+    :return: The events, empty once all of them were decoded.
+    """
+    limit = limit or settings.MTA_STS_FAILURE_DETAIL_BATCH_SIZE
+    batch: List[ReportEvent] = []
+    for event in events:
+        batch.append(event)
+        if isinstance(event, StreamedFailureDetails) or len(batch) >= limit:
+            break
+    return batch
+
+
+def events_from_report(
+    report: MtaStsReport, batch_size: int = None
+) -> Iterator[ReportEvent]:
+    """Presents an already decoded report as the same sequence of events produced by ``MtaStsReportStream``."""
+    batch_size = batch_size or settings.MTA_STS_FAILURE_DETAIL_BATCH_SIZE
+    # The report is a header as well, consumers of the header ignore the policies
+    yield report
+    for index, container in enumerate(report.policies):
+        yield StreamedPolicy(index, container.policy, container.summary)
+        for offset in range(0, len(container.failure_details), batch_size):
+            yield StreamedFailureDetails(
+                index, container.failure_details[offset : offset + batch_size]
+            )
@@ -0,0 +1,213 @@
+"""Sampling profiles of single requests, to find out why the reports of some organisations are slow to store.
+
+A request is profiled if it carries the ``PROFILING_HEADER`` with the ``PROFILING_TOKEN``, or else with the
+probability of ``PROFILING_SAMPLE_RATE``, see ``profiled``. While it is handled, a thread samples the stack of its task
+every ``PROFILING_INTERVAL`` seconds: the stack being run, or where the task awaits while other tasks run. The last
+``PROFILING_MAX_PROFILES`` profiles are kept in memory per worker process, as collapsed stacks flame graph tools read.
+
+Work done outside the task of the request is not sampled: with the process or thread decode executor, or with the
+writer task (see app/db/writer.py), the profile shows the request awaiting them.
+"""
+import asyncio
+import collections
+import datetime
+import functools
+import hmac
+import random
+import sys
+import threading
+import time
+from types import FrameType
+from typing import Any, Awaitable, Callable, Counter, Dict, List, Optional, TypeVar
+
+import cuid
+from app.core.config import settings
+from app.core.exceptions import Forbidden, TLSReportingExceptionBase
+from starlette.requests import Request
+from starlette.responses import Response
+
+T = TypeVar("T")
+
+# The leaf of the stacks of a task awaiting while other tasks run
+AWAITING = "(awaiting)"
+
+
+def _label(frame: FrameType) -> str:
+    # Neither ";" nor " " may be part of a frame of a collapsed stack
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def _coroutine_frames(coroutine: Any) -> List[FrameType]:
+    """The frames of a suspended coroutine and of those it awaits, outermost first."""
+    frames = []
+    while coroutine is not None:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(
+            coroutine, "gi_frame", None
+        )
+        if frame is None:
+            break
+        frames.append(frame)
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(
+            coroutine, "gi_yieldfrom", None
+        )
+    return frames
+
+
+class Profile:
+    """The samples of a single request, collapsed by stack."""
+
+    def __init__(self, operation: str):
+        self.identifier = cuid.cuid()
+        self.operation = operation
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.duration_seconds = 0.0
+        self.error_code: Optional[str] = None
+        self.stacks: Counter[str] = collections.Counter()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """One line per stack: the frames from the outermost separated by ";", a space, and the number of samples."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "identifier": self.identifier,
+            "operation": self.operation,
+            "started": self.started,
+            "duration_seconds": self.duration_seconds,
+            "samples": self.samples,
+            "error_code": self.error_code,
+        }
+
+
+class _Sampler(threading.Thread):
+    """Samples the stack of a task of the event loop running in the current thread, until stopped."""
+
+    def __init__(self, profile: Profile, task: asyncio.Task, interval: float):
+        super().__init__(name=f"profile-{profile.identifier}", daemon=True)
+        self.profile = profile
+        self.task = task
+        self.interval = interval
+        self._loop = task.get_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            stack = self._stack()
+            if stack:
+                self.profile.stacks[stack] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def _stack(self) -> str:
+        # The event loop keeps running meanwhile, so a sample may be off by the switch to another task
+        root = _coroutine_frames(self.task.get_coro())
+        if not root:
+            return ""
+        if asyncio.current_task(self._loop) is not self.task:
+            return ";".join([*map(_label, root), AWAITING])
+        frames = []
+        frame = sys._current_frames().get(self._loop_thread)
+        # From the frame being run up to the coroutine of the task, leaving out the event loop
+        while frame is not None and frame is not root[0]:
+            frames.append(frame)
+            frame = frame.f_back
+        if frame is None:
+            return ""
+        frames.append(frame)
+        return ";".join(map(_label, reversed(frames)))
+
+
+class ProfileStore:
+    """The last profiles, the oldest one is evicted beyond ``maxsize``."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._profiles: "collections.OrderedDict[str, Profile]" = (
+            collections.OrderedDict()
+        )
+
+    def add(self, profile: Profile) -> None:
+        if self.maxsize <= 0:
+            return
+        self._profiles[profile.identifier] = profile
+        while len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+
+    def get(self, identifier: str) -> Optional[Profile]:
+        return self._profiles.get(identifier)
+
+    def list(self) -> List[Profile]:
+        """The profiles, the most recent first."""
+        return list(reversed(self._profiles.values()))
+
+
+profiles = ProfileStore(settings.PROFILING_MAX_PROFILES)
+
+
+def _has_token(header: str) -> bool:
+    token = settings.PROFILING_TOKEN
+    if not token:
+        return False
+    return hmac.compare_digest(header.encode(), token.encode())
+
+
+def should_profile(request: Request) -> bool:
+    header = request.headers.get(settings.PROFILING_HEADER)
+    if settings.PROFILING_TOKEN and header is not None:
+        return _has_token(header)
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def require_token(request: Request) -> None:
+    """Rejects requests without the ``PROFILING_HEADER`` carrying the ``PROFILING_TOKEN``, as the profiles reveal the
+    code and timing of the requests. Without a ``PROFILING_TOKEN`` every request is rejected."""
+    if not _has_token(request.headers.get(settings.PROFILING_HEADER, "")):
+        raise Forbidden(PermissionError(settings.PROFILING_HEADER))
+
+
+def profiled(endpoint: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Profiles the endpoint for the requests selected by ``should_profile``, see the module.
+
+    The endpoint takes a ``Request`` and may take a ``Response``, the identifier of the profile is returned in the
+    ``PROFILING_HEADER`` of the latter, or of the error should the endpoint fail.
+    """
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs) -> T:
+        request = next(v for v in kwargs.values() if isinstance(v, Request))
+        if not should_profile(request):
+            return await endpoint(*args, **kwargs)
+
+        profile = Profile(endpoint.__name__)
+        # Endpoints always run in a task
+        task = asyncio.current_task()
+        assert task is not None
+        sampler = _Sampler(profile, task, settings.PROFILING_INTERVAL)
+        for value in kwargs.values():
+            if isinstance(value, Response):
+                value.headers[settings.PROFILING_HEADER] = profile.identifier
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            return await endpoint(*args, **kwargs)
+        except TLSReportingExceptionBase as e:
+            profile.error_code = e.error_detail["code"]
+            # The response of the error is created by its handler rather than from the injected response
+            e.headers = {
+                **(e.headers or {}),
+                settings.PROFILING_HEADER: profile.identifier,
+            }
+            raise
+        finally:
+            sampler.stop()
+            profile.duration_seconds = time.perf_counter() - start
+            profiles.add(profile)
+
+    return wrapper
@@ -0,0 +1,90 @@
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+
+class SpaceSaving:
+    """A weighted Space-Saving summary (Metwally et al.) of the heaviest items of a stream, in bounded space.
+
+    At most ``capacity`` items are counted. For every counted item the true count lies within
+    ``[count - error, count]``, an item which is not counted has a true count of at most ``floor``, which never
+    exceeds ``total / capacity``. Summaries are mergeable (Agarwal et al.), so summaries of disjoint streams, e.g.
+    per day, combine into a summary of the union with the same guarantees.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        counters: Optional[Mapping[str, Tuple[int, int]]] = None,
+        total: int = 0,
+    ):
+        """
+        :param capacity: The maximum number of counted items.
+        :param counters: The count and error of the counted items.
+        :param total: The total weight of the stream.
+        """
+        self.capacity = capacity
+        self.counters: Dict[str, Tuple[int, int]] = dict(counters or {})
+        self.total = total
+
+    @property
+    def floor(self) -> int:
+        """The maximum count of any item which is not counted."""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    @classmethod
+    def from_counts(cls, capacity: int, counts: Mapping[str, int]) -> "SpaceSaving":
+        """The summary of exactly counted items, e.g. of a single report: the heaviest items are kept without error."""
+        heaviest = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return cls(
+            capacity,
+            {item: (count, 0) for item, count in heaviest[:capacity]},
+            sum(counts.values()),
+        )
+
+    def add(self, item: str, weight: int = 1) -> None:
+        self.total += weight
+        if item in self.counters:
+            count, error = self.counters[item]
+            self.counters[item] = (count + weight, error)
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = (weight, 0)
+        else:
+            # The item takes over the counter of the lightest item, which it may have accounted for
+            lightest = min(self.counters, key=lambda key: self.counters[key][0])
+            floor, _ = self.counters.pop(lightest)
+            self.counters[item] = (floor + weight, floor)
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """The summary of both streams, an item missing from either summary is assumed to have its ``floor`` there."""
+        floor, other_floor = self.floor, other.floor
+        counters: Dict[str, Tuple[int, int]] = {}
+        for item in self.counters.keys() | other.counters.keys():
+            count, error = self.counters.get(item, (floor, floor))
+            other_count, other_error = other.counters.get(
+                item, (other_floor, other_floor)
+            )
+            counters[item] = (count + other_count, error + other_error)
+        heaviest = sorted(counters.items(), key=lambda item: item[1][0], reverse=True)
+        return SpaceSaving(
+            self.capacity, dict(heaviest[: self.capacity]), self.total + other.total
+        )
+
+    def top(self, n: int) -> List[Tuple[str, int, int]]:
+        """The (at most) ``n`` heaviest items with their count and error, heaviest first."""
+        heaviest = sorted(
+            self.counters.items(), key=lambda item: (-item[1][0], item[0])
+        )
+        return [(item, count, error) for item, (count, error) in heaviest[:n]]
+
+    def to_json(self) -> List[List]:
+        """The counters as ``[item, count, error]``, see ``from_json``."""
+        return [[item, count, error] for item, (count, error) in self.counters.items()]
+
+    @classmethod
+    def from_json(
+        cls, capacity: int, counters: Iterable[Sequence], total: int
+    ) -> "SpaceSaving":
+        return cls(
+            capacity, {item: (count, error) for item, count, error in counters}, total
+        )
@@ -1,9 +1,23 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import (
+    Any,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from app.db.base_class import Base
+from app.db.utils import insert_or_ignore
 from app.schemas.resource_created import ResourceCreated
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 ModelType = TypeVar("ModelType", bound=Base)
@@ -11,6 +25,15 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+def _new_db_obj(
+    model: Type[ModelType], obj_in: BaseModel
+) -> Tuple[ResourceCreated, ModelType]:
+    resource_created = ResourceCreated()
+    obj_in_data = obj_in.dict()
+    obj_in_data[model.primary_key_name()] = resource_created.identifier
+    return resource_created, model(**obj_in_data)  # type: ignore
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         """
@@ -21,12 +44,78 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         self.model = model
 
-    def create(self, db: Session, *, obj_in: CreateSchemaType) -> ResourceCreated:
-        resource_created = ResourceCreated()
-        obj_in_data = obj_in.dict()
-        obj_in_data[self.model.primary_key_name()] = resource_created.identifier
+    def create(
+        self, db: Session, *, obj_in: CreateSchemaType, commit: bool = True
+    ) -> ResourceCreated:
+        resource_created, db_obj = _new_db_obj(self.model, obj_in)
+        db.add(db_obj)
+        if commit:
+            db.commit()
+        else:
+            db.flush()
+        return resource_created
 
-        db_obj = self.model(**obj_in_data)  # type: ignore
+
+class AsyncCRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    def __init__(self, model: Type[ModelType]):
+        """
+        CRUD object with default methods to Create, Read, Update, Delete (CRUD) on an `AsyncSession`.
+        **Parameters**
+        * `model`: A SQLAlchemy model class
+        """
+        self.model = model
+
+    async def create(
+        self, db: AsyncSession, *, obj_in: CreateSchemaType, commit: bool = True
+    ) -> ResourceCreated:
+        resource_created, db_obj = _new_db_obj(self.model, obj_in)
         db.add(db_obj)
-        db.commit()
+        if commit:
+            await db.commit()
+        else:
+            await db.flush()
         return resource_created
+
+    async def create_or_get(
+        self, db: AsyncSession, *, obj_in: CreateSchemaType, unique_on: Sequence[str]
+    ) -> Tuple[ResourceCreated, bool]:
+        """Creates the object, unless an object with the same values for ``unique_on`` already exists.
+
+        A conflict is skipped by ``INSERT ... ON CONFLICT DO NOTHING``, so it neither aborts the transaction nor has to
+        be recognised by its error message. Postgres tells whether the row was inserted by ``RETURNING``, SQLite by the
+        row count, only a conflict costs a second statement to look up the existing identifier.
+
+        :param db: The active database session, the caller commits.
+        :param obj_in: The object to create.
+        :param unique_on: The attributes of the unique constraint to look up a conflicting object by.
+        :return: The new or existing resource and whether it was created.
+        """
+        resource_created = ResourceCreated()
+        data = obj_in.dict()
+        data[self.model.primary_key_name()] = resource_created.identifier
+        columns = {
+            attribute.key: attribute.columns[0]
+            for attribute in self.model.__mapper__.column_attrs  # type: ignore
+        }
+        # Only a conflict on ``unique_on`` is skipped, e.g. a conflicting content hash still fails
+        statement = insert_or_ignore(
+            db.bind.dialect.name,
+            self.model.__table__,
+            [columns[key].name for key in unique_on],
+        ).values({columns[key]: value for key, value in data.items()})
+        primary_key = columns[self.model.primary_key_name()]
+        if db.bind.dialect.implicit_returning:
+            result = await db.execute(statement.returning(primary_key))
+            created = result.first() is not None
+        else:
+            result = await db.execute(statement)
+            created = result.rowcount == 1
+        if created:
+            return resource_created, True
+
+        existing = await db.execute(
+            select(primary_key).filter(
+                *(columns[key] == data[key] for key in unique_on)
+            )
+        )
+        return ResourceCreated(identifier=existing.scalar_one()), False
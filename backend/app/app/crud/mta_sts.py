@@ -1,66 +1,661 @@
-from typing import Union
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+import logging
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Collection,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
-from app.core.exceptions import ResourceAlreadyExists
-from app.models.mta_sts import organisations, reports
-from app.schemas.mta_sts_report import MtaStsReport
+from app.core import metrics, mta_sts_columnar, mta_sts_export
+from app.core.cache import LRUCache, put_after_commit
+from app.core.config import settings
+from app.core.exceptions import (
+    InternalServerError,
+    InvalidCursor,
+    JsonError,
+    ResourceAlreadyExists,
+    ResourceNotFound,
+    TLSReportingExceptionBase,
+)
+from app.core.mta_sts_stream import (
+    ReportEvent,
+    StreamedFailureDetails,
+    StreamedPolicy,
+    events_from_report,
+)
+from app.db.partitions import month_of, months_between
+from app.models.mta_sts import (
+    daily_failure_sketches,
+    daily_rollups,
+    daily_sending_mta_ip_sketches,
+    failure_detail_partitions,
+    failure_details,
+    organisations,
+    policies,
+    reports,
+)
+from app.models.mta_sts.rollup import ReportCounts
+from app.models.mta_sts.sketch import SketchDimension
+from app.schemas.mta_sts_report import MtaStsReport, MtaStsReportHeader
+from app.schemas.mta_sts_report.mta_sts_datetime import encode_datetime
 from app.schemas.mta_sts_report.report import ReportCreate
+from app.schemas.mta_sts_report_page import MtaStsReportListItem, MtaStsReportPage
+from app.schemas.mta_sts_statistics import (
+    DistinctSendingMtaIps,
+    MtaStsStatistics,
+    TopFailures,
+)
 from app.schemas.resource_created import ResourceCreated
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
-
-
-def _prepare_resource_already_exists_or_keep_original(
-    db: Session,
-    original_exception: IntegrityError,
-    external_id: str,
-    organisation_id: str,
-) -> Union[ResourceAlreadyExists, IntegrityError]:
-    if (
-        len(original_exception.args) == 1
-        and original_exception.args[0]
-        == "(sqlite3.IntegrityError) UNIQUE constraint failed: Reports.ExternalID, Reports.OrganisationID"
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+class SerializedReport(NamedTuple):
+    etag: str
+    body: bytes
+
+
+# Maps the content hash of recently stored uploads to the identifier of their report
+content_hashes: LRUCache[str, str] = LRUCache(settings.MTA_STS_CONTENT_HASH_CACHE_SIZE)
+# Maps the identifier of recently read reports to their JSON, reports never change once stored
+serialized_reports: LRUCache[str, SerializedReport] = LRUCache(
+    settings.MTA_STS_REPORT_CACHE_SIZE, settings.MTA_STS_REPORT_CACHE_TTL
+)
+
+
+def _to_naive_utc(value: datetime.datetime) -> datetime.datetime:
+    """Datetimes are stored in UTC without time zone, as SQLite would silently drop the offset."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _encode_cursor(start_datetime: datetime.datetime, report_id: str) -> str:
+    cursor = json.dumps([start_datetime.isoformat(), report_id]).encode()
+    return base64.urlsafe_b64encode(cursor).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime.datetime, str]:
+    try:
+        start_datetime, report_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.datetime.fromisoformat(start_datetime), str(report_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor(e)
+
+
+def _without_none(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def _failure_detail(row: Row) -> Dict[str, Any]:
+    return _without_none(
+        {
+            "result-type": row.ResultType,
+            "sending-mta-ip": row.SendingMtaIp,
+            "receiving-mx-hostname": row.ReceivingMxHostname,
+            "receiving-mx-helo": row.ReceivingMxHelo,
+            "receiving-ip": row.ReceivingIp,
+            "failed-session-count": row.FailedSessionCount,
+            "additional-information": row.AdditionalInformation,
+            "failure-reason-code": row.FailureReasonCode,
+        }
+    )
+
+
+async def find_existing_content(
+    db: AsyncSession, hashes: Collection[str]
+) -> Dict[str, str]:
+    """Looks up which raw uploads have been stored before, by their ``MtaSts.content_hash``.
+
+    Recent uploads are answered from memory, the others from the database. The read transaction is ended, so the
+    caller does not hold on to the database while decoding.
+
+    :param db: The active database session, without pending changes.
+    :param hashes: The content hashes of the uploads.
+    :return: The identifier of the existing report by content hash, for the known uploads only.
+    """
+    existing: Dict[str, str] = {}
+    missing: List[str] = []
+    for content_hash in hashes:
+        identifier = content_hashes.get(content_hash)
+        if identifier is None:
+            missing.append(content_hash)
+        else:
+            existing[content_hash] = identifier
+    if missing:
+        found = await reports.find_ids_by_content_hash(db, content_hashes=missing)
+        await db.rollback()
+        for content_hash, identifier in found.items():
+            content_hashes.put(content_hash, identifier)
+        existing.update(found)
+    return existing
+
+
+async def raise_if_existing_content(db: AsyncSession, content_hash: str) -> None:
+    """Raises ``ResourceAlreadyExists`` if the exact same upload has been stored before.
+
+    See ``find_existing_content``."""
+    existing = await find_existing_content(db, [content_hash])
+    if content_hash in existing:
+        raise ResourceAlreadyExists(LookupError(content_hash), existing[content_hash])
+
+
+async def get_mta_sts_report(db: AsyncSession, identifier: str) -> Dict[str, Any]:
+    """Loads a stored report as the JSON of ``MtaStsReport``.
+
+    Always three queries, however many policies and failure details the report has: the report, its policies and the
+    failure details of all policies.
+
+    :param db: The active database session.
+    :param identifier: The identifier of the report.
+    :return: The report by alias, without the fields that are not set.
+    """
+    try:
+        report, organisation_name = await reports.get_with_organisation_name(
+            db, report_id=identifier
+        )
+    except NoResultFound as e:
+        raise ResourceNotFound(e)
+
+    containers: Dict[str, Dict[str, Any]] = {}
+    for policy in await policies.get_by_report(db, report_id=identifier):
+        containers[policy.policy_id] = {
+            "policy": _without_none(
+                {
+                    "policy-type": policy.policy_type.value,
+                    "policy-string": policy.policy_string,
+                    "policy-domain": policy.policy_domain,
+                    "mx-host": policy.mx_host,
+                }
+            ),
+            "summary": {
+                "total-successful-session-count": policy.total_successful_session_count,
+                "total-failure-session-count": policy.total_failure_session_count,
+            },
+            "failure-details": [],
+        }
+    for row in await failure_details.get_by_report(
+        db, report_id=identifier, start_month=month_of(report.start_datetime)
     ):
-        db.rollback()
-        existing_identifier = reports.get_id(
+        containers[row.PolicyID]["failure-details"].append(_failure_detail(row))
+
+    return {
+        "organization-name": organisation_name,
+        "date-range": {
+            "start-datetime": encode_datetime(report.start_datetime),
+            "end-datetime": encode_datetime(report.end_datetime),
+        },
+        "contact-info": report.contact_info,
+        "report-id": report.external_id,
+        "policies": list(containers.values()),
+    }
+
+
+async def list_mta_sts_reports(
+    db: AsyncSession,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    organisation_name: Optional[str] = None,
+    policy_domain: Optional[str] = None,
+    start_datetime: Optional[datetime.datetime] = None,
+    end_datetime: Optional[datetime.datetime] = None,
+) -> MtaStsReportPage:
+    """Lists the stored reports page by page, most recent first.
+
+    :param db: The active database session.
+    :param limit: The maximum number of reports of the page.
+    :param cursor: The ``next_cursor`` of the previous page, if any.
+    :param organisation_name: Only reports of this organisation.
+    :param policy_domain: Only reports with a policy for this domain.
+    :param start_datetime: Only reports starting at or after this time.
+    :param end_datetime: Only reports ending at or before this time.
+    :return: The page and the cursor of the next page, if there is one.
+    """
+    rows = await reports.get_page(
+        db,
+        # One more than requested tells whether there is a next page
+        limit=limit + 1,
+        before=None if cursor is None else _decode_cursor(cursor),
+        organisation_name=organisation_name,
+        policy_domain=policy_domain,
+        start_datetime=None
+        if start_datetime is None
+        else _to_naive_utc(start_datetime),
+        end_datetime=None if end_datetime is None else _to_naive_utc(end_datetime),
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1].Report
+        next_cursor = _encode_cursor(last.start_datetime, last.report_id)
+    return MtaStsReportPage(
+        reports=[
+            MtaStsReportListItem(
+                **{
+                    "identifier": report.report_id,
+                    "organization-name": name,
+                    "date-range": {
+                        "start-datetime": encode_datetime(report.start_datetime),
+                        "end-datetime": encode_datetime(report.end_datetime),
+                    },
+                    "contact-info": report.contact_info,
+                    "report-id": report.external_id,
+                }
+            )
+            for report, name in rows
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+async def get_mta_sts_statistics(
+    db: AsyncSession,
+    *,
+    start_day: Optional[datetime.date] = None,
+    end_day: Optional[datetime.date] = None,
+    organisation_name: Optional[str] = None,
+    policy_domain: Optional[str] = None,
+) -> MtaStsStatistics:
+    """The session counts by day, policy domain and organisation, see ``CRUDDailyRollup.get_days``."""
+    return MtaStsStatistics(
+        days=await daily_rollups.get_days(
             db,
-            external_id=external_id,
-            organisation_id=organisation_id,
+            start_day=start_day,
+            end_day=end_day,
+            organisation_name=organisation_name,
+            policy_domain=policy_domain,
         )
-        return ResourceAlreadyExists(original_exception, existing_identifier)
-    return original_exception
+    )
+
+
+async def get_top_failures(
+    db: AsyncSession,
+    *,
+    policy_domain: str,
+    dimension: SketchDimension,
+    limit: int,
+    start_day: Optional[datetime.date] = None,
+    end_day: Optional[datetime.date] = None,
+) -> TopFailures:
+    """The values of the failure details with the most failed sessions, estimated from the daily sketches."""
+    sketch = await daily_failure_sketches.get_merged(
+        db,
+        policy_domain=policy_domain,
+        dimension=dimension,
+        start_day=start_day,
+        end_day=end_day,
+    )
+    top = sketch.top(limit + 1)
+    # Bounded by the next counted value as well, if fewer values are listed than counted
+    unlisted = max([sketch.floor] + [count for _, count, _ in top[limit:]])
+    return TopFailures(
+        **{
+            "policy-domain": policy_domain,
+            "dimension": dimension.value,
+            "total-failed-session-count": sketch.total,
+            "unlisted-failed-session-count": unlisted,
+            "values": [
+                {"value": value, "failed-session-count": count, "error": error}
+                for value, count, error in top[:limit]
+            ],
+        }
+    )
+
+
+async def get_distinct_sending_mta_ips(
+    db: AsyncSession,
+    *,
+    policy_domain: Optional[str] = None,
+    start_day: Optional[datetime.date] = None,
+    end_day: Optional[datetime.date] = None,
+) -> DistinctSendingMtaIps:
+    """The number of distinct sending MTA IPs of the failure details, estimated from the daily sketches."""
+    sketch = await daily_sending_mta_ip_sketches.get_merged(
+        db, policy_domain=policy_domain, start_day=start_day, end_day=end_day
+    )
+    return DistinctSendingMtaIps(
+        **{
+            "policy-domain": policy_domain,
+            "distinct-sending-mta-ip-count": sketch.estimate(),
+            "relative-error": sketch.relative_error,
+        }
+    )
+
+
+def _columnar_records(rows: Sequence[Row]) -> List[Tuple[Any, ...]]:
+    """The rows of the export statement in ``mta_sts_columnar.COLUMNS`` order."""
+    return [(*row[:5], row[5].value, *row[6:]) for row in rows]
+
+
+def _export_records(rows: Sequence[Row]) -> List[Tuple[Any, ...]]:
+    """The rows of the export statement in ``mta_sts_export.FIELDS`` order, with JSON compatible values."""
+    records = []
+    report_id = start = end = None
+    for row in rows:
+        # The rows of a report are consecutive, so its datetimes are formatted once
+        if row[0] != report_id:
+            report_id = row[0]
+            start = encode_datetime(row[3])
+            end = encode_datetime(row[4])
+        records.append((*row[:3], start, end, row[5].value, *row[6:]))
+    return records
+
+
+async def export_failure_details(
+    connection: AsyncConnection,
+    *,
+    export_format: mta_sts_export.ExportFormat,
+    compress: bool = False,
+    start_datetime: Optional[datetime.datetime] = None,
+    end_datetime: Optional[datetime.datetime] = None,
+    organisation_name: Optional[str] = None,
+    policy_domain: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """Exports the failure details of the stored reports, see ``mta_sts_export.FIELDS``.
+
+    The columnar formats include the summary of the policies as well, and the policies without failure details, see
+    ``mta_sts_columnar.COLUMNS``.
+
+    The rows are fetched through a server-side cursor and encoded batch by batch, so the memory used does not depend
+    on the number of rows exported.
+
+    :param connection: The connection to read from, see ``read_only_connection``.
+    :param export_format: The format of the export.
+    :param compress: Whether to gzip the export.
+    :param start_datetime: Only reports starting at or after this time.
+    :param end_datetime: Only reports ending at or before this time.
+    :param organisation_name: Only reports of the organisation with this name.
+    :param policy_domain: Only failure details of policies for this domain.
+    :return: The chunks of the export.
+    """
+    columnar = export_format in mta_sts_export.COLUMNAR_FORMATS
+    if start_datetime is not None:
+        start_datetime = _to_naive_utc(start_datetime)
+    if end_datetime is not None:
+        end_datetime = _to_naive_utc(end_datetime)
+    # The reports start before they end
+    months = await failure_detail_partitions.get_months(
+        connection,
+        start=None if start_datetime is None else start_datetime.date(),
+        end=None
+        if end_datetime is None
+        else end_datetime.date() + datetime.timedelta(days=1),
+    )
+    partitioned = set(months)
+    if columnar:
+        # The policies of the months without failure details are exported as well
+        first, last = await reports.get_start_range(
+            connection, start_datetime=start_datetime, end_datetime=end_datetime
+        )
+        if first is not None and last is not None:
+            months = months_between(first, last)
+    records = _columnar_records if columnar else _export_records
+
+    async def batches() -> AsyncIterator[List[Tuple[Any, ...]]]:
+        # A month at a time, the months in order keep the reports ordered by their start
+        for month in months:
+            result = await connection.stream(
+                failure_details.get_export_statement(
+                    start_month=month,
+                    partition=failure_detail_partitions.table(month)
+                    if month in partitioned
+                    else None,
+                    start_datetime=start_datetime,
+                    end_datetime=end_datetime,
+                    organisation_name=organisation_name,
+                    policy_domain=policy_domain,
+                    with_policy_summaries=columnar,
+                )
+            )
+            async for rows in result.partitions(settings.MTA_STS_EXPORT_BATCH_SIZE):
+                yield records(rows)
+
+    if export_format is mta_sts_export.ExportFormat.ARROW:
+        chunks = mta_sts_columnar.encode_arrow(batches())
+    elif export_format is mta_sts_export.ExportFormat.PARQUET:
+        chunks = mta_sts_columnar.encode_parquet(batches())
+    else:
+        chunks = mta_sts_export.encode(batches(), export_format)
+    if compress:
+        chunks = mta_sts_export.compress(chunks)
+    async for chunk in chunks:
+        yield chunk
+
+
+async def get_serialized_mta_sts_report(
+    db: AsyncSession, identifier: str
+) -> SerializedReport:
+    """The stored report as JSON with a strong entity tag, recently read reports are served from memory.
+
+    :param db: The active database session, not used if the report is cached.
+    :param identifier: The identifier of the report.
+    :return: The entity tag (a SHA-256 of the body) and the body.
+    """
+    serialized = serialized_reports.get(identifier)
+    if serialized is None:
+        body = json.dumps(
+            await get_mta_sts_report(db, identifier),
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode()
+        serialized = SerializedReport(f'"{hashlib.sha256(body).hexdigest()}"', body)
+        serialized_reports.put(identifier, serialized)
+    return serialized
 
 
 async def create_mta_sts_report(
-    db: Session, mta_sts_report: MtaStsReport
+    db: AsyncSession,
+    mta_sts_report: MtaStsReport,
+    commit: bool = True,
+    content_hash: Optional[str] = None,
 ) -> ResourceCreated:
     """Creates a new MTA-STS report.
 
     :param db: The active database session.
     :param mta_sts_report: The parsed report.
+    :param commit: Whether to commit, otherwise the caller owns the transaction.
+    :param content_hash: The ``MtaSts.content_hash`` of the raw upload, if known.
     :return: Information about the newly created resource.
     """
+    return await create_mta_sts_report_from_events(
+        db, events_from_report(mta_sts_report), commit=commit, content_hash=content_hash
+    )
 
-    organisation_identifier = organisations.upsert(
-        db, name=mta_sts_report.organization_name
-    ).identifier
 
-    try:
-        report_identifier = reports.create(
+async def _iter_events(
+    events: Union[Iterable[ReportEvent], AsyncIterable[ReportEvent]]
+) -> AsyncIterator[ReportEvent]:
+    if isinstance(events, AsyncIterable):
+        async for event in events:
+            yield event
+    else:
+        for event in events:
+            yield event
+
+
+async def create_mta_sts_report_from_events(
+    db: AsyncSession,
+    events: Union[Iterable[ReportEvent], AsyncIterable[ReportEvent]],
+    commit: bool = True,
+    content_hash: Optional[str] = None,
+) -> ResourceCreated:
+    """Creates a new MTA-STS report from a (streamed) sequence of report events.
+
+    The report is inserted as soon as the header is known, so a duplicate is detected before the policies are decoded,
+    while the policies and their failure details are handled batch by batch. The daily rollups are updated in the same
+    transaction. Nothing is committed before the last event has been consumed. The seconds of each stage are recorded
+    once the report is stored, see ``metrics.ingest_stage_seconds``.
+
+    :param db: The active database session.
+    :param events: The header followed by the policies and failure details, see ``MtaStsReportStream`` and
+        ``MtaSts.stream``.
+    :param commit: Whether to commit, otherwise the caller owns the transaction.
+    :param content_hash: The ``MtaSts.content_hash`` of the raw upload, if known.
+    :return: Information about the newly created resource.
+    """
+    event_iterator = _iter_events(events)
+    header: Optional[ReportEvent] = None
+    async for header in event_iterator:
+        break
+    if not isinstance(header, MtaStsReportHeader):
+        raise JsonError(ValueError("The report header must be the first event"))
+
+    stages = metrics.Stages(metrics.ingest_stage_seconds)
+    with stages.time("organisation"):
+        organisation_identifier, _ = await organisations.get_or_create_id(
+            db, name=header.organization_name
+        )
+
+    with stages.time("report"):
+        report_identifier, created = await reports.create_or_get(
             db,
             obj_in=ReportCreate(
-                start_datetime=mta_sts_report.date_range.start_datetime,
-                end_datetime=mta_sts_report.date_range.end_datetime,
-                contact_info=mta_sts_report.contact_info,
-                external_id=mta_sts_report.report_id,
+                start_datetime=_to_naive_utc(header.date_range.start_datetime),
+                end_datetime=_to_naive_utc(header.date_range.end_datetime),
+                contact_info=header.contact_info,
+                external_id=header.report_id,
                 organisation_id=organisation_identifier,
+                content_hash=content_hash,
             ),
+            unique_on=("external_id", "organisation_id"),
         )
-    except IntegrityError as e:
-        raise _prepare_resource_already_exists_or_keep_original(
-            db, e, mta_sts_report.report_id, organisation_identifier
+    if not created:
+        raise ResourceAlreadyExists(
+            LookupError(header.report_id), report_identifier.identifier
         )
 
-    for policy in mta_sts_report.policies:
-        print(policy)
+    start_month = month_of(_to_naive_utc(header.date_range.start_datetime))
+    policy_identifiers: Dict[int, str] = {}
+    policy_domains: Dict[int, str] = {}
+    # Inserted together once their failure details refer to them, or at the end of the report
+    pending_policies: List[Dict[str, Any]] = []
+    counts = ReportCounts()
+    failure_detail_count = 0
+    async for event in event_iterator:
+        if isinstance(event, StreamedPolicy):
+            row = policies.row(
+                report_identifier.identifier, event.policy, event.summary
+            )
+            pending_policies.append(row)
+            policy_identifiers[event.policy_index] = row["PolicyID"]
+            policy_domains[event.policy_index] = event.policy.policy_domain
+            counts.add_policy(
+                event.policy.policy_domain,
+                event.summary.total_successful_session_count,
+                event.summary.total_failure_session_count,
+            )
+        elif isinstance(event, StreamedFailureDetails):
+            if pending_policies:
+                with stages.time("policies"):
+                    await policies.create_many(db, rows=pending_policies)
+                pending_policies = []
+            with stages.time("failure_details"):
+                await failure_details.create_many(
+                    db,
+                    report_id=report_identifier.identifier,
+                    policy_id=policy_identifiers[event.policy_index],
+                    start_month=start_month,
+                    failure_details=event.failure_details,
+                )
+            failure_detail_count += len(event.failure_details)
+            for failure_detail in event.failure_details:
+                counts.add_failure(
+                    policy_domains[event.policy_index],
+                    failure_detail.result_type,
+                    str(failure_detail.sending_mta_ip),
+                    failure_detail.failed_session_count,
+                )
+    with stages.time("policies"):
+        await policies.create_many(db, rows=pending_policies)
+    day = _to_naive_utc(header.date_range.start_datetime).date()
+    with stages.time("rollups"):
+        await daily_rollups.add(
+            db, day=day, organisation_id=organisation_identifier, counts=counts
+        )
+        await daily_failure_sketches.add(db, day=day, counts=counts)
+        await daily_sending_mta_ip_sketches.add(db, day=day, counts=counts)
 
+    if content_hash:
+        put_after_commit(
+            db.sync_session, content_hashes, content_hash, report_identifier.identifier
+        )
+    if commit:
+        with metrics.ingest_stage_seconds.time("commit"):
+            await db.commit()
+    stages.observe()
+    metrics.ingest_failure_details.observe(failure_detail_count)
     return report_identifier
+
+
+async def create_mta_sts_reports(
+    db: AsyncSession,
+    mta_sts_reports: Sequence[MtaStsReport],
+    hashes: Optional[Sequence[Optional[str]]] = None,
+) -> List[Union[ResourceCreated, TLSReportingExceptionBase]]:
+    """Creates a batch of MTA-STS reports in a single transaction.
+
+    Reports that already exist, also within the batch itself or inserted by a concurrent request, are reported without
+    aborting the others. Should the batch fail otherwise, e.g. on another constraint, it is retried with a savepoint
+    per report, so only the failing reports are rolled back and reported.
+
+    :param db: The active database session.
+    :param mta_sts_reports: The parsed reports.
+    :param hashes: The ``MtaSts.content_hash`` of each raw upload, if known.
+    :return: The created resource or the error, in the same order as the reports.
+    """
+    if hashes is None:
+        hashes = [None] * len(mta_sts_reports)
+    results: List[Union[ResourceCreated, TLSReportingExceptionBase]] = []
+    try:
+        for mta_sts_report, content_hash in zip(mta_sts_reports, hashes):
+            try:
+                results.append(
+                    await create_mta_sts_report_from_events(
+                        db,
+                        events_from_report(mta_sts_report),
+                        commit=False,
+                        content_hash=content_hash,
+                    )
+                )
+            except ResourceAlreadyExists as e:
+                results.append(e)
+        with metrics.ingest_stage_seconds.time("commit"):
+            await db.commit()
+        return results
+    except Exception:
+        await db.rollback()
+
+    results = []
+    for mta_sts_report, content_hash in zip(mta_sts_reports, hashes):
+        try:
+            async with db.begin_nested():
+                results.append(
+                    await create_mta_sts_report(
+                        db, mta_sts_report, commit=False, content_hash=content_hash
+                    )
+                )
+        except TLSReportingExceptionBase as e:
+            results.append(e)
+        except Exception as e:
+            logger.exception("Failed to store report %s", mta_sts_report.report_id)
+            results.append(InternalServerError(e))
+    with metrics.ingest_stage_seconds.time("commit"):
+        await db.commit()
+    return results
@@ -0,0 +1,249 @@
+"""Retention of the raw failure details: once expired, only the daily rollups and sketches derived from them remain,
+next to the reports, their policies and the summaries of the policies."""
+import asyncio
+import datetime
+import logging
+import time
+from collections import defaultdict
+from typing import Collection, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.crud.mta_sts import serialized_reports
+from app.db.partitions import month_of, next_month
+from app.db.session import AsyncSessionLocal, async_engine
+from app.models.mta_sts import (
+    daily_failure_sketches,
+    daily_rollups,
+    daily_sending_mta_ip_sketches,
+    failure_detail_partitions,
+    failure_details,
+    reports,
+)
+from app.models.mta_sts.report import purged_days
+from app.models.mta_sts.rollup import RebuildableAggregate
+
+logger = logging.getLogger(__name__)
+
+# The bounds of the number of failure details deleted per transaction, see ``_delete_failure_details``
+MIN_CHUNK_SIZE = 100
+INITIAL_CHUNK_SIZE = 1000
+
+# Recomputed from the failure details of a day before they are purged, see ``_roll_up``
+AGGREGATES: Tuple[RebuildableAggregate, ...] = (
+    daily_rollups,
+    daily_failure_sketches,
+    daily_sending_mta_ip_sketches,
+)
+
+
+class RetentionPolicy(NamedTuple):
+    # The failure details of reports starting before this time (naive UTC) are expired
+    before: datetime.datetime
+    # Only reports of these organisations, of all organisations by default
+    organisation_names: Optional[Collection[str]] = None
+    excluded_organisation_names: Collection[str] = ()
+
+
+class PurgeResult(NamedTuple):
+    reports: int
+    # Not counting the failure details of the dropped partitions
+    failure_details: int
+    partitions: int = 0
+
+
+def retention_policies(now: datetime.datetime) -> List[RetentionPolicy]:
+    """The retention policies in effect, see ``MTA_STS_RETENTION_DAYS`` and ``MTA_STS_RETENTION_DAYS_BY_ORGANISATION``.
+
+    :param now: The current time (naive UTC).
+    """
+    overrides = settings.MTA_STS_RETENTION_DAYS_BY_ORGANISATION
+    policies = [
+        RetentionPolicy(now - datetime.timedelta(days=days), organisation_names=[name])
+        for name, days in overrides.items()
+        if days is not None
+    ]
+    if settings.MTA_STS_RETENTION_DAYS is not None:
+        policies.append(
+            RetentionPolicy(
+                now - datetime.timedelta(days=settings.MTA_STS_RETENTION_DAYS),
+                excluded_organisation_names=list(overrides),
+            )
+        )
+    return policies
+
+
+async def _roll_up(days: Set[datetime.date]) -> None:
+    """Recomputes the rollups and sketches of the days from their failure details before the first of them is purged,
+    so reports stored before the rollups existed are accounted for as well."""
+    for day in sorted(days):
+        start = datetime.datetime.combine(day, datetime.time())
+        end = start + datetime.timedelta(days=1)
+        async with AsyncSessionLocal() as db:
+            if (await db.execute(purged_days(start, end))).first() is not None:
+                # Rolled up when the first report of the day was purged
+                continue
+            for aggregates in AGGREGATES:
+                await aggregates.rebuild(
+                    db, start_day=day, end_day=day + datetime.timedelta(days=1)
+                )
+            await db.commit()
+
+
+async def _drop_expired_partitions(
+    policies: List[RetentionPolicy], now: datetime.datetime
+) -> PurgeResult:
+    """Drops the partitions of the months in which the failure details of every report expired, at once rather than
+    chunk by chunk, after rolling up the days of the month.
+
+    Only if every organisation is subject to a retention policy, see ``retention_policies``.
+    """
+    overrides = settings.MTA_STS_RETENTION_DAYS_BY_ORGANISATION
+    if settings.MTA_STS_RETENTION_DAYS is None or None in overrides.values():
+        return PurgeResult(0, 0)
+    before = min(policy.before for policy in policies)
+    async with AsyncSessionLocal() as db:
+        months = await failure_detail_partitions.get_months(db, end=before.date())
+        await db.rollback()
+    purged_reports = dropped = 0
+    for month in months:
+        start = datetime.datetime.combine(month, datetime.time())
+        end = datetime.datetime.combine(next_month(month), datetime.time())
+        if end > before:
+            continue
+        await _roll_up(
+            {month + datetime.timedelta(days=day) for day in range((end - start).days)}
+        )
+        async with AsyncSessionLocal() as db:
+            await failure_detail_partitions.drop(db, month)
+            purged_reports += await reports.mark_purged_between(
+                db, start=start, end=end, purged=now
+            )
+            await db.commit()
+        dropped += 1
+    if dropped:
+        serialized_reports.clear()
+    return PurgeResult(purged_reports, 0, dropped)
+
+
+async def _delete_failure_details(
+    report_ids: List[str], start_month: datetime.date
+) -> int:
+    """Deletes the failure details of the reports in short transactions, so ingestion waits for the write lock for at
+    most about ``MTA_STS_RETENTION_CHUNK_SECONDS``.
+
+    The number of failure details deleted per transaction adapts to the time the previous transaction took.
+    """
+    deleted = 0
+    chunk_size = INITIAL_CHUNK_SIZE
+    while True:
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            count = await failure_details.delete_chunk(
+                db, report_ids=report_ids, start_month=start_month, limit=chunk_size
+            )
+            await db.commit()
+        elapsed = time.perf_counter() - started
+        deleted += count
+        if count < chunk_size:
+            return deleted
+        if elapsed > settings.MTA_STS_RETENTION_CHUNK_SECONDS:
+            chunk_size = max(MIN_CHUNK_SIZE, chunk_size // 2)
+        elif elapsed < settings.MTA_STS_RETENTION_CHUNK_SECONDS / 2:
+            chunk_size = min(settings.MTA_STS_RETENTION_MAX_CHUNK_SIZE, chunk_size * 2)
+        # Lets waiting requests take the write lock in between
+        await asyncio.sleep(settings.MTA_STS_RETENTION_PAUSE_SECONDS)
+
+
+async def _maintain_sqlite() -> None:
+    """Returns the pages freed by the deletes to the file system in short transactions, provided the database uses
+    incremental auto vacuum, and refreshes the statistics of the query planner."""
+    async with async_engine.connect() as connection:
+        auto_vacuum = (await connection.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+        await connection.commit()
+        # 2 is INCREMENTAL
+        while auto_vacuum == 2:
+            free_pages = (
+                await connection.exec_driver_sql("PRAGMA freelist_count")
+            ).scalar()
+            if not free_pages:
+                break
+            await connection.exec_driver_sql(
+                f"PRAGMA incremental_vacuum({settings.MTA_STS_RETENTION_VACUUM_PAGES})"
+            )
+            await connection.commit()
+            await asyncio.sleep(settings.MTA_STS_RETENTION_PAUSE_SECONDS)
+        # Samples the indexes rather than scanning them, so the write lock is held briefly, also for the partitions
+        await connection.exec_driver_sql("PRAGMA analysis_limit = 1000")
+        await connection.exec_driver_sql("ANALYZE")
+        await connection.commit()
+
+
+async def purge_expired_failure_details(
+    now: Optional[datetime.datetime] = None,
+) -> PurgeResult:
+    """Deletes the failure details of the reports which expired according to the retention policies.
+
+    The partitions of the months which expired as a whole are dropped. The reports of other months are handled oldest
+    first, a batch at a time: the days of the batch are rolled up, the failure details deleted chunk by chunk, after
+    which the reports are marked as purged. An interrupted run is resumed by the next.
+
+    :param now: The current time (naive UTC), for testing.
+    :return: The number of reports purged, failure details deleted and partitions dropped.
+    """
+    now = now or datetime.datetime.utcnow()
+    policies = retention_policies(now)
+    purged_reports, deleted, dropped = await _drop_expired_partitions(policies, now)
+    for policy in policies:
+        while True:
+            async with AsyncSessionLocal() as db:
+                expired = await reports.get_expired(
+                    db,
+                    before=policy.before,
+                    limit=settings.MTA_STS_RETENTION_REPORT_BATCH_SIZE,
+                    organisation_names=policy.organisation_names,
+                    excluded_organisation_names=policy.excluded_organisation_names,
+                )
+                # In the same transaction as the reports, so none of their partitions is missed
+                months = await failure_detail_partitions.get_months(
+                    db, end=policy.before.date() + datetime.timedelta(days=1)
+                )
+                await db.rollback()
+            if not expired:
+                break
+            report_ids = [report_id for report_id, _ in expired]
+            await _roll_up({start_datetime.date() for _, start_datetime in expired})
+            by_month: Dict[datetime.date, List[str]] = defaultdict(list)
+            for report_id, start_datetime in expired:
+                by_month[month_of(start_datetime)].append(report_id)
+            for month, month_report_ids in by_month.items():
+                if month in months:
+                    deleted += await _delete_failure_details(month_report_ids, month)
+            async with AsyncSessionLocal() as db:
+                await reports.mark_purged(db, report_ids=report_ids, purged=now)
+                await db.commit()
+            for report_id in report_ids:
+                serialized_reports.discard(report_id)
+            purged_reports += len(report_ids)
+
+    if purged_reports and async_engine.dialect.name == "sqlite":
+        await _maintain_sqlite()
+    return PurgeResult(purged_reports, deleted, dropped)
+
+
+async def run_periodically(interval: float) -> None:
+    """Purges the expired failure details every ``interval`` seconds, until cancelled."""
+    while True:
+        try:
+            result = await purge_expired_failure_details()
+            if result.reports:
+                logger.info(
+                    "Purged %d failure details and %d partitions of %d reports",
+                    result.failure_details,
+                    result.partitions,
+                    result.reports,
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Purging the expired failure details failed")
+        await asyncio.sleep(interval)
@@ -2,13 +2,14 @@ import inspect
 from functools import lru_cache
 
 from app.db.utils import UtcNow
-from sqlalchemy import Column, DateTime, Table
+from sqlalchemy import Column, DateTime, MetaData, Table
 from sqlalchemy.ext.declarative import as_declarative
 from sqlalchemy.orm import InstrumentedAttribute
 
 
 @as_declarative()
 class Base:
+    metadata: MetaData
     __table__: Table
 
     created: str = Column(
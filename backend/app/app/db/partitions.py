@@ -0,0 +1,145 @@
+"""Monthly partitions of a table, routed to by the month of the rows.
+
+On Postgres the partitions are native (declarative) range partitions of the parent table on its month column, see the
+migration partitioning the table. SQLite has no partitioning, so every month is a table of its own in the same
+database, with the columns and indexes of the parent table, which itself does not exist. In both cases the
+partitions are named after the parent table and their month, e.g. ``FailureDetails_2016_04``, and are queried
+directly: a query spanning months runs once per partition.
+
+Dropping the partition of a month deletes all of its rows at once, rather than row by row.
+"""
+import datetime
+import re
+from typing import Dict, List, Optional, Union
+
+from app.core.cache import LRUCache, put_after_commit
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+# The number of partitions each process remembers to exist, see ``MonthlyPartitions.create``
+KNOWN_PARTITIONS = 1024
+
+
+def month_of(value: datetime.date) -> datetime.date:
+    """The first day of the month of the date (or datetime)."""
+    return datetime.date(value.year, value.month, 1)
+
+
+def next_month(month: datetime.date) -> datetime.date:
+    if month.month == 12:
+        return datetime.date(month.year + 1, 1, 1)
+    return datetime.date(month.year, month.month + 1, 1)
+
+
+def months_between(first: datetime.date, last: datetime.date) -> List[datetime.date]:
+    """The months from the month of ``first`` up to and including the month of ``last``."""
+    months = []
+    month, last_month = month_of(first), month_of(last)
+    while month <= last_month:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def _dialect_name(db: Union[AsyncSession, AsyncConnection]) -> str:
+    if isinstance(db, AsyncConnection):
+        return db.dialect.name
+    return db.bind.dialect.name
+
+
+class MonthlyPartitions:
+    def __init__(self, parent: Table):
+        """
+        :param parent: The table being partitioned, the partitions have the same columns and indexes.
+        """
+        self.parent = parent
+        self._pattern = re.compile(rf"^{re.escape(parent.name)}_(\d{{4}})_(\d{{2}})$")
+        # The partitions are not part of the metadata of the models, their foreign keys resolve against copies of the
+        # referred tables
+        self._metadata = MetaData()
+        for foreign_key in parent.foreign_keys:
+            foreign_key.column.table.to_metadata(self._metadata)
+        self._tables: Dict[datetime.date, Table] = {}
+        self._created: LRUCache[datetime.date, bool] = LRUCache(KNOWN_PARTITIONS)
+
+    def name(self, month: datetime.date) -> str:
+        return f"{self.parent.name}_{month:%Y_%m}"
+
+    def table(self, month: datetime.date) -> Table:
+        """The partition of the month, whether or not it exists."""
+        table = self._tables.get(month)
+        if table is None:
+            name = self.name(month)
+            table = self.parent.to_metadata(self._metadata, name=name)
+            # Index names are unique per database (schema on Postgres)
+            for index in table.indexes:
+                index.name = index.name.replace(self.parent.name, name, 1)
+            self._tables[month] = table
+        return table
+
+    async def get_months(
+        self,
+        db: Union[AsyncSession, AsyncConnection],
+        *,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+    ) -> List[datetime.date]:
+        """The months of the existing partitions, oldest first.
+
+        :param db: The active database session or connection.
+        :param start: Only the months ending after this day.
+        :param end: Only the months starting before this day.
+        """
+        if _dialect_name(db) == "postgresql":
+            statement = text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = :parent"
+            ).bindparams(parent=self.parent.name)
+        else:
+            statement = text(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefix ESCAPE '\\'"
+            ).bindparams(prefix=self.parent.name.replace("_", "\\_") + "\\_%")
+        months = []
+        for (name,) in (await db.execute(statement)).all():
+            match = self._pattern.match(name)
+            if match is None:
+                continue
+            month = datetime.date(int(match[1]), int(match[2]), 1)
+            if start is not None and next_month(month) <= start:
+                continue
+            if end is not None and month >= end:
+                continue
+            months.append(month)
+        return sorted(months)
+
+    async def create(self, db: AsyncSession, month: datetime.date) -> Table:
+        """Creates the partition of the month, unless it exists, in the transaction of the session.
+
+        Every process remembers the partitions it created or found once the transaction commits, so the partition of
+        the month is only looked for once.
+
+        :return: The partition.
+        """
+        table = self.table(month)
+        if self._created.get(month) is not None:
+            return table
+        if _dialect_name(db) == "postgresql":
+            # Literals, as DDL takes no bound parameters
+            await db.execute(
+                text(
+                    f'CREATE TABLE IF NOT EXISTS "{table.name}" PARTITION OF "{self.parent.name}" '
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+                )
+            )
+        else:
+            connection = await db.connection()
+            await connection.run_sync(table.create, checkfirst=True)
+        put_after_commit(db.sync_session, self._created, month, True)
+        return table
+
+    async def drop(self, db: AsyncSession, month: datetime.date) -> None:
+        """Drops the partition of the month with all of its rows, in the transaction of the session."""
+        await db.execute(text(f'DROP TABLE IF EXISTS "{self.name(month)}"'))
+        self._created.discard(month)
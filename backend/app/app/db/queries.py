@@ -0,0 +1,123 @@
+"""Counts and times the SQL statements run on behalf of each request, and logs the slow ones.
+
+The statements of every engine are timed, see ``metrics.query_seconds``, and those taking ``SQL_SLOW_QUERY_SECONDS``
+or longer are logged with their parameters. ``QueryCountMiddleware`` adds up the statements of a request, including
+those the writer task runs for it (see app/db/writer.py), into ``metrics.request_queries`` by operation, which the
+tests use to enforce query budgets, see ``app.tests.utils.utils.assert_max_queries``.
+"""
+import contextlib
+import contextvars
+import logging
+import time
+from typing import Iterator, Optional
+
+from app.core import metrics
+from app.core.config import settings
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Key of the start times of the statements being run on a connection, in its info
+_STARTS = "query_start_times"
+# Parameters of a slow statement are logged up to this many characters, those of a bulk insert being long
+_MAX_LOGGED_PARAMETERS = 1000
+
+
+class QueryStats:
+    """The statements run in a context, see ``tracked``."""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_current: "contextvars.ContextVar[Optional[QueryStats]]" = contextvars.ContextVar(
+    "query_stats", default=None
+)
+
+
+def current() -> Optional[QueryStats]:
+    """The statistics the statements are added to in the current context, if any."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def tracked(stats: Optional[QueryStats] = None) -> Iterator[QueryStats]:
+    """Adds up the statements run by the block in the current context.
+
+    :param stats: The statistics to add to, e.g. of the request a job is run for, or new ones.
+    """
+    stats = QueryStats() if stats is None else stats
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def _parameters(parameters) -> str:
+    logged = repr(parameters)
+    if len(logged) > _MAX_LOGGED_PARAMETERS:
+        return f"{logged[:_MAX_LOGGED_PARAMETERS]}... ({len(logged)} characters)"
+    return logged
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_STARTS, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info[_STARTS].pop()
+    metrics.query_seconds.observe(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += seconds
+    threshold = settings.SQL_SLOW_QUERY_SECONDS
+    if threshold is not None and seconds >= threshold:
+        logger.warning(
+            "Slow query of %.3f seconds: %s with parameters %s",
+            seconds,
+            statement,
+            _parameters(parameters),
+        )
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # The statement failed, so it is not timed
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_STARTS):
+        connection.info[_STARTS].pop()
+
+
+class QueryCountMiddleware:
+    """Observes the number of statements of each request, and their seconds, by the operation of the endpoint.
+
+    Requests not matching an endpoint are not observed. A streamed response is observed once it has been sent.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with tracked() as stats:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                # Set by the router, the name of the endpoint is its operation ID
+                endpoint = scope.get("endpoint")
+                if endpoint is not None:
+                    metrics.request_queries.observe(stats.count, endpoint.__name__)
+                    metrics.request_query_seconds.observe(
+                        stats.seconds, endpoint.__name__
+                    )
@@ -1,10 +1,115 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
 from app.core.config import settings
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+)
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+# Always assembled by the settings, see ``Settings.assemble_db_connection``
+assert settings.SQLALCHEMY_DATABASE_URI is not None
 engine = create_engine(
     settings.SQLALCHEMY_DATABASE_URI,
     pool_pre_ping=True,
-    connect_args={"check_same_thread": False},
+    connect_args={"check_same_thread": False}
+    if settings.SQLALCHEMY_DATABASE_URI.startswith("sqlite")
+    else {},
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+assert settings.SQLALCHEMY_ASYNC_DATABASE_URI is not None
+_sqlite = settings.SQLALCHEMY_ASYNC_DATABASE_URI.startswith("sqlite")
+
+# Used by the API, so database round trips do not block the event loop
+async_engine = create_async_engine(
+    settings.SQLALCHEMY_ASYNC_DATABASE_URI,
+    pool_pre_ping=True,
+    # aiosqlite defaults to a new connection (and thread) per session
+    poolclass=AsyncAdaptedQueuePool,
+    connect_args={"timeout": settings.SQLITE_BUSY_TIMEOUT} if _sqlite else {},
+)
+AsyncSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine,
+    class_=AsyncSession,
+)
+
+if _sqlite and settings.SQLITE_PRODUCTION:
+    # In WAL mode readers do not wait for the writer, so they get connections of their own, which cannot write
+    async_read_engine = create_async_engine(
+        settings.SQLALCHEMY_ASYNC_DATABASE_URI,
+        pool_pre_ping=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        max_overflow=0,
+        connect_args={"timeout": settings.SQLITE_BUSY_TIMEOUT},
+        execution_options={"read_only": True},
+    )
+else:
+    async_read_engine = async_engine.execution_options(read_only=True)
+# For requests that only read
+AsyncReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_read_engine,
+    class_=AsyncSession,
+)
+
+
+def _sqlite_pragmas(read_only: bool) -> List[str]:
+    """The pragmas of the production profile, see ``SQLITE_PRODUCTION``. The busy timeout is set by the driver."""
+    pragmas = [
+        # Persistent, readers and the writer no longer block each other
+        "PRAGMA journal_mode = WAL",
+        f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}",
+        # Negative sizes are in KiB rather than pages
+        f"PRAGMA cache_size = {-settings.SQLITE_CACHE_SIZE_KIB}",
+        f"PRAGMA mmap_size = {settings.SQLITE_MMAP_SIZE}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    return pragmas
+
+
+def _configure_sqlite(engine: AsyncEngine, read_only: bool) -> None:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        if settings.SQLITE_PRODUCTION:
+            cursor = dbapi_connection.cursor()
+            for pragma in _sqlite_pragmas(read_only):
+                cursor.execute(pragma)
+            cursor.close()
+
+    # SQLite fails at once with "database is locked" when a read transaction is upgraded to a write transaction while
+    # another connection is writing. Taking the write lock when the transaction begins makes concurrent requests
+    # wait for each other (up to the busy timeout) instead.
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin_immediate(connection):
+        if connection.get_execution_options().get("read_only"):
+            # Never upgraded to a write transaction, so there is no need to hold the write lock
+            connection.exec_driver_sql("BEGIN")
+        else:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+if _sqlite:
+    _configure_sqlite(async_engine, read_only=False)
+    if settings.SQLITE_PRODUCTION:
+        _configure_sqlite(async_read_engine, read_only=True)
+
+
+@asynccontextmanager
+async def read_only_connection() -> AsyncIterator[AsyncConnection]:
+    """A connection for long running reads, such as exports, that does not take the SQLite write lock."""
+    async with async_read_engine.connect() as connection:
+        yield connection
@@ -1,5 +1,11 @@
+from typing import Any, Dict, Sequence
+
+from app.core.config import settings
+from sqlalchemy import Table, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.sql import expression
+from sqlalchemy.sql.dml import Insert
 from sqlalchemy.types import DateTime
 
 
@@ -15,3 +21,102 @@ def pg_utcnow(element, compiler, **kw):
 @compiles(UtcNow, "sqlite")
 def sqlite_utcnow(element, compiler, **kw):
     return "CURRENT_TIMESTAMP"
+
+
+def _dialect_insert(dialect_name: str, table: Table) -> Insert:
+    # Imported on first use, as only the dialect of the configured database is needed
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT is not supported for {dialect_name}")
+    return dialect_insert(table)
+
+
+def insert_or_ignore(
+    dialect_name: str, table: Table, index_elements: Sequence[str]
+) -> Insert:
+    """``INSERT ... ON CONFLICT DO NOTHING`` for the given dialect, a conflicting row is skipped rather than failing.
+
+    :param dialect_name: The name of the dialect of the database.
+    :param table: The table to insert into.
+    :param index_elements: The columns of the unique constraint (or primary key) of the table, a conflict on any other
+        constraint still fails.
+    """
+    return _dialect_insert(dialect_name, table).on_conflict_do_nothing(
+        index_elements=[table.c[column] for column in index_elements]
+    )
+
+
+def upsert_add(
+    dialect_name: str,
+    table: Table,
+    index_elements: Sequence[str],
+    add_columns: Sequence[str],
+) -> Insert:
+    """``INSERT ... ON CONFLICT DO UPDATE`` for the given dialect, adding the inserted counts to the conflicting row.
+
+    :param dialect_name: The name of the dialect of the database.
+    :param table: The table to insert into.
+    :param index_elements: The columns of the unique constraint (or primary key) of the table.
+    :param add_columns: The columns to add the inserted value to on a conflict.
+    """
+    statement = _dialect_insert(dialect_name, table)
+    set_ = {
+        column: table.c[column] + statement.excluded[column] for column in add_columns
+    }
+    if "Updated" in table.c:
+        set_["Updated"] = UtcNow()
+    return statement.on_conflict_do_update(
+        index_elements=[table.c[column] for column in index_elements], set_=set_
+    )
+
+
+async def bulk_insert(
+    db: AsyncSession, table: Table, rows: Sequence[Dict[str, Any]]
+) -> None:
+    """Inserts the rows, all having the same columns, in the transaction of the session, bypassing the ORM unit of work.
+
+    On Postgres (asyncpg) the rows are streamed with ``COPY ... FROM STDIN`` in the binary format, unless
+    ``POSTGRES_BULK_COPY`` is off, other databases use a single ``executemany``. Columns left out get their server
+    defaults either way.
+
+    :param db: The active database session.
+    :param table: The table to insert into.
+    :param rows: The values of the rows by column name.
+    """
+    if not rows:
+        return
+    connection = await db.connection()
+    if (
+        connection.dialect.name != "postgresql"
+        or connection.dialect.driver != "asyncpg"
+        or not settings.POSTGRES_BULK_COPY
+    ):
+        await db.execute(insert(table), rows)
+        return
+    columns = [table.c[name] for name in rows[0]]
+    # COPY bypasses SQLAlchemy, so values such as enums and JSON are converted as they would be when bound
+    processors = [
+        column.type.dialect_impl(connection.dialect).bind_processor(connection.dialect)
+        for column in columns
+    ]
+    records = [
+        tuple(
+            value if processor is None else processor(value)
+            for processor, value in zip(processors, row.values())
+        )
+        for row in rows
+    ]
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    if not driver_connection.is_in_transaction():
+        # The driver begins the transaction of the session with its first statement
+        await connection.exec_driver_sql("SELECT 1")
+    await driver_connection.copy_records_to_table(
+        table.name,
+        records=records,
+        columns=[column.name for column in columns],
+        schema_name=table.schema,
+    )
@@ -0,0 +1,183 @@
+"""The single writer of the uploaded reports in the SQLite production profile, see ``SQLITE_PRODUCTION``, and with
+group commit, see ``MTA_STS_GROUP_COMMIT``.
+
+SQLite allows one writer at a time. Rather than having every upload wait for the write lock (and time out on it under
+load), the uploads queue their writes for a dedicated task, which runs them one after the other. With group commit the
+task also commits the reports of concurrent uploads together, each in a savepoint of its own, so a duplicate or an
+invalid report fails alone. Otherwise the writes run in the request as before.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional, Tuple, TypeVar
+
+from app.core import metrics
+from app.core.config import settings
+from app.db import queries
+from app.db.session import AsyncSessionLocal, async_engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+Job = Callable[[AsyncSession], Awaitable[T]]
+
+
+class _Write(NamedTuple):
+    job: Job
+    future: asyncio.Future
+    # Whether the job leaves the commit to the writer, see run_grouped
+    grouped: bool
+    # The statements of the job are added to those of the request it is run for
+    query_stats: Optional[queries.QueryStats]
+
+
+_queue: "Optional[asyncio.Queue[_Write]]" = None
+_task: Optional[asyncio.Task] = None
+
+
+def enabled() -> bool:
+    return settings.MTA_STS_GROUP_COMMIT or (
+        settings.SQLITE_PRODUCTION and async_engine.dialect.name == "sqlite"
+    )
+
+
+def _resolve(future: asyncio.Future, result=None, error: Exception = None) -> None:
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+async def _run(write: _Write) -> None:
+    try:
+        with queries.tracked(write.query_stats):
+            async with AsyncSessionLocal() as db:
+                result = await write.job(db)
+                if write.grouped:
+                    with metrics.ingest_stage_seconds.time("commit"):
+                        await db.commit()
+    except Exception as e:
+        _resolve(write.future, error=e)
+    else:
+        _resolve(write.future, result)
+
+
+async def _gather(
+    queue: "asyncio.Queue[_Write]", first: _Write
+) -> Tuple[List[_Write], Optional[_Write]]:
+    """Collects the grouped writes queued within the delay of the first.
+
+    :return: The group, and the write which ended it, if it is not to be grouped.
+    """
+    group = [first]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.MTA_STS_GROUP_COMMIT_DELAY
+    while len(group) < settings.MTA_STS_GROUP_COMMIT_MAX_REPORTS:
+        timeout = deadline - loop.time()
+        try:
+            if timeout <= 0:
+                write = queue.get_nowait()
+            else:
+                write = await asyncio.wait_for(queue.get(), timeout)
+        except (asyncio.QueueEmpty, asyncio.TimeoutError):
+            break
+        if not write.grouped:
+            return group, write
+        if not write.future.cancelled():
+            group.append(write)
+    return group, None
+
+
+async def _commit(group: List[_Write]) -> None:
+    """Runs the group in a transaction, each write in a savepoint, and commits once."""
+    results: List[Tuple[_Write, Any, Optional[Exception]]] = []
+    try:
+        async with AsyncSessionLocal() as db:
+            for write in group:
+                try:
+                    with queries.tracked(write.query_stats):
+                        async with db.begin_nested():
+                            results.append((write, await write.job(db), None))
+                except Exception as e:
+                    results.append((write, None, e))
+            with metrics.ingest_stage_seconds.time("commit"):
+                await db.commit()
+    except Exception as e:
+        # Nothing was committed
+        for write in group:
+            _resolve(write.future, error=e)
+        return
+    for write, result, error in results:
+        _resolve(write.future, result, error)
+
+
+async def _write(queue: "asyncio.Queue[_Write]") -> None:
+    held: Optional[_Write] = None
+    while True:
+        if held is not None:
+            write, held = held, None
+        else:
+            write = await queue.get()
+        if write.future.cancelled():
+            continue
+        if write.grouped and settings.MTA_STS_GROUP_COMMIT:
+            group, held = await _gather(queue, write)
+            if len(group) > 1:
+                await _commit(group)
+                continue
+        await _run(write)
+
+
+def start() -> None:
+    """Starts the writer task, if the production profile or group commit is enabled."""
+    global _queue, _task
+    if enabled() and _task is None:
+        _queue = asyncio.Queue()
+        _task = asyncio.create_task(_write(_queue))
+
+
+async def stop() -> None:
+    global _queue, _task
+    if _task is not None:
+        assert _queue is not None
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        while not _queue.empty():
+            _queue.get_nowait().future.cancel()
+        _queue = _task = None
+
+
+async def _submit(job: Job, grouped: bool) -> T:
+    if _task is None:
+        async with AsyncSessionLocal() as db:
+            result = await job(db)
+            if grouped:
+                with metrics.ingest_stage_seconds.time("commit"):
+                    await db.commit()
+            return result
+    assert _queue is not None
+    future = asyncio.get_running_loop().create_future()
+    await _queue.put(_Write(job, future, grouped, queries.current()))
+    return await future
+
+
+async def run(job: Job) -> T:
+    """Runs the job by the writer task, or in a session of its own when there is no writer.
+
+    :param job: Writes in the given session and commits, e.g. ``mta_sts.create_mta_sts_report``. Whatever it did not
+        commit is rolled back should it raise.
+    :return: The result of the job, its errors are raised as if it ran inline.
+    """
+    return await _submit(job, grouped=False)
+
+
+async def run_grouped(job: Job) -> T:
+    """As ``run``, but the job does not commit. The writer commits it, with group commit together with other jobs.
+
+    :param job: Writes in the given session without committing. Should it raise, only its own writes are rolled back.
+    :return: The result of the job once committed, its errors are raised as if it ran inline.
+    """
+    return await _submit(job, grouped=True)
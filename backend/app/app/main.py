@@ -1,8 +1,17 @@
+import asyncio
 import os
 import sys
 
+from app.core import decode_executor, metrics
 from app.core.config import settings
 from app.core.exceptions import InternalServerError, TLSReportingExceptionBase
+from app.crud import retention
+from app.db import writer
+from app.db.queries import QueryCountMiddleware
+from app.db.session import AsyncSessionLocal
+from app.models.mta_sts import organisations
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.requests import Request as StarletteRequest
@@ -18,14 +27,64 @@ from api.api_v1.api import api_v1_router
 from fastapi import FastAPI
 
 app = FastAPI(
-    title=settings.APPLICATION_NAME, description=settings.APPLICATION_DESCRIPTION
+    title=settings.APPLICATION_NAME,
+    description=settings.APPLICATION_DESCRIPTION,
+    routes=api_v1_router.routes,
 )
+app.add_middleware(QueryCountMiddleware)
 
-app.include_router(api_v1_router)
+
+@app.on_event("startup")
+async def warm_caches():
+    async with AsyncSessionLocal() as db:
+        await organisations.warm(db)
+
+
+@app.on_event("startup")
+def start_writer():
+    writer.start()
+
+
+@app.on_event("startup")
+async def schedule_retention():
+    if settings.MTA_STS_RETENTION_INTERVAL is not None:
+        app.state.retention = asyncio.create_task(
+            retention.run_periodically(settings.MTA_STS_RETENTION_INTERVAL)
+        )
+
+
+@app.on_event("shutdown")
+def shutdown_decode_executor():
+    decode_executor.shutdown()
+
+
+@app.on_event("shutdown")
+async def stop_writer():
+    await writer.stop()
+
+
+@app.on_event("shutdown")
+async def cancel_retention():
+    task = getattr(app.state, "retention", None)
+    if task is not None:
+        task.cancel()
 
 
 @app.exception_handler(StarletteHTTPException)
 def http_exception_handler(request: StarletteRequest, exc: StarletteHTTPException):
     if not isinstance(exc, TLSReportingExceptionBase):
         exc = InternalServerError(exc)
-    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+    metrics.count_error(exc)
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None),
+    )
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(
+    request: StarletteRequest, exc: RequestValidationError
+):
+    metrics.count_request_validation_error()
+    return await request_validation_exception_handler(request, exc)
@@ -1,2 +1,6 @@
+from .failure_detail import failure_detail_partitions, failure_details
 from .organisations import organisations
+from .policy import policies
 from .report import reports
+from .rollup import daily_rollups
+from .sketch import daily_failure_sketches, daily_sending_mta_ip_sketches
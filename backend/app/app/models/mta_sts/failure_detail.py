@@ -0,0 +1,281 @@
+import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.crud.base import AsyncCRUDBase
+from app.db.base_class import Base
+from app.db.partitions import MonthlyPartitions, next_month
+from app.db.utils import bulk_insert
+from app.models.mta_sts.organisations import Organisation
+from app.models.mta_sts.policy import Policy
+from app.models.mta_sts.report import Report
+from app.schemas.mta_sts_report import mta_sts_policy
+from sqlalchemy import (
+    VARCHAR,
+    Column,
+    Date,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    Text,
+    delete,
+    null,
+    select,
+)
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+
+def _optional_str(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+class FailureDetail(Base):
+    """Partitioned by the month the report starts in, see ``failure_detail_partitions``: on SQLite this table does not
+    exist, only its partitions."""
+
+    __tablename__ = "FailureDetails"
+    __table_args__ = (
+        Index("IX_FailureDetails_ReportID", "ReportID"),
+        Index("IX_FailureDetails_ResultType", "ResultType"),
+    )
+    failure_detail_id: int = Column(
+        "FailureDetailID", Integer, primary_key=True, autoincrement=True
+    )
+    result_type: str = Column("ResultType", VARCHAR(64), nullable=False)
+    # RFC5952 text representation, at most 45 characters for IPv4-mapped IPv6 addresses
+    sending_mta_ip: str = Column("SendingMtaIp", VARCHAR(45), nullable=False)
+    receiving_mx_hostname: str = Column(
+        "ReceivingMxHostname", VARCHAR(255), nullable=True
+    )
+    receiving_mx_helo: str = Column("ReceivingMxHelo", VARCHAR(255), nullable=True)
+    receiving_ip: str = Column("ReceivingIp", VARCHAR(45), nullable=True)
+    failed_session_count: int = Column("FailedSessionCount", Integer, nullable=False)
+    additional_information: str = Column("AdditionalInformation", Text, nullable=True)
+    failure_reason_code: str = Column("FailureReasonCode", Text, nullable=True)
+    # The first day of the month the report starts in, the partition key
+    start_month: datetime.date = Column("StartMonth", Date, nullable=False)
+
+    policy_id = Column(
+        "PolicyID",
+        String(length=25),
+        ForeignKey("Policies.PolicyID"),
+        nullable=False,
+    )
+    report_id = Column(
+        "ReportID",
+        String(length=25),
+        ForeignKey("Reports.ReportID"),
+        nullable=False,
+    )
+
+
+class CRUDFailureDetail(
+    AsyncCRUDBase[
+        FailureDetail, mta_sts_policy.FailureDetail, mta_sts_policy.FailureDetail
+    ]
+):
+    @staticmethod
+    def rows(
+        report_id: str,
+        policy_id: str,
+        start_month: datetime.date,
+        failure_details: Sequence[mta_sts_policy.FailureDetail],
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                "ReportID": report_id,
+                "PolicyID": policy_id,
+                "StartMonth": start_month,
+                "ResultType": failure_detail.result_type,
+                "SendingMtaIp": str(failure_detail.sending_mta_ip),
+                "ReceivingMxHostname": failure_detail.receiving_mx_hostname,
+                "ReceivingMxHelo": failure_detail.receiving_mx_helo,
+                "ReceivingIp": _optional_str(failure_detail.receiving_ip),
+                "FailedSessionCount": failure_detail.failed_session_count,
+                "AdditionalInformation": _optional_str(
+                    failure_detail.additional_information
+                ),
+                "FailureReasonCode": failure_detail.failure_reason_code,
+            }
+            for failure_detail in failure_details
+        ]
+
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        report_id: str,
+        policy_id: str,
+        start_month: datetime.date,
+        failure_details: Sequence[mta_sts_policy.FailureDetail],
+    ) -> None:
+        """Inserts the failure details into the partition of the month at once, see ``bulk_insert``. The partition is
+        created if need be."""
+        if not failure_details:
+            return
+        table = await failure_detail_partitions.create(db, start_month)
+        await bulk_insert(
+            db, table, self.rows(report_id, policy_id, start_month, failure_details)
+        )
+
+    async def get_by_report(
+        self, db: AsyncSession, *, report_id: str, start_month: datetime.date
+    ) -> List[Row]:
+        """The failure details of all policies of the report as plain rows, as there might be many of them.
+
+        :param db: The active database session.
+        :param report_id: The identifier of the report.
+        :param start_month: The first day of the month the report starts in.
+        """
+        if start_month not in await failure_detail_partitions.get_months(
+            db, start=start_month, end=next_month(start_month)
+        ):
+            return []
+        table = failure_detail_partitions.table(start_month)
+        result = await db.execute(
+            select(table)
+            .where(table.c.ReportID == report_id)
+            .order_by(table.c.FailureDetailID)
+        )
+        return result.all()
+
+    async def delete_chunk(
+        self,
+        db: AsyncSession,
+        *,
+        report_ids: Sequence[str],
+        start_month: datetime.date,
+        limit: int,
+    ) -> int:
+        """Deletes at most ``limit`` failure details of the reports, so the transaction stays short.
+
+        :param db: The active database session.
+        :param report_ids: The identifiers of the reports, all starting in the same month.
+        :param start_month: The first day of the month the reports start in, its partition must exist.
+        :param limit: The maximum number of failure details deleted.
+        :return: The number of failure details deleted, fewer than ``limit`` once all of them are.
+        """
+        table = failure_detail_partitions.table(start_month)
+        result = await db.execute(
+            delete(table).where(
+                table.c.FailureDetailID.in_(
+                    select(table.c.FailureDetailID)
+                    .where(table.c.ReportID.in_(report_ids))
+                    .limit(limit)
+                )
+            )
+        )
+        return result.rowcount
+
+    @staticmethod
+    def get_export_statement(
+        *,
+        start_month: datetime.date,
+        partition: Optional[Table],
+        start_datetime: Optional[datetime.datetime] = None,
+        end_datetime: Optional[datetime.datetime] = None,
+        organisation_name: Optional[str] = None,
+        policy_domain: Optional[str] = None,
+        with_policy_summaries: bool = False,
+    ) -> Select:
+        """The failure details of the reports starting in a month with the context of their policy, report and
+        organisation, labelled as exported.
+
+        Ordered by the start of the report, so the reports are found by the index on StartDatetime and their failure
+        details by the index on ReportID, without sorting.
+
+        :param start_month: The first day of the month the reports start in.
+        :param partition: The partition of the month, None if it does not exist, in which case only the policies are
+            selected (``with_policy_summaries``).
+        :param start_datetime: Only reports starting at or after this time (naive UTC).
+        :param end_datetime: Only reports ending at or before this time (naive UTC).
+        :param organisation_name: Only reports of the organisation with this name.
+        :param policy_domain: Only failure details of policies for this domain.
+        :param with_policy_summaries: Whether to include the summary of the policies after the policy, and the
+            policies without failure details (with NULL failure detail columns).
+        """
+        # The columns of the tables, as the ORM attributes are annotated with their Python types
+        labelled_columns = [
+            (Report, "ReportID", "identifier"),
+            (Report, "ExternalID", "report-id"),
+            (Organisation, "Name", "organization-name"),
+            (Report, "StartDatetime", "start-datetime"),
+            (Report, "EndDatetime", "end-datetime"),
+            (Policy, "PolicyType", "policy-type"),
+            (Policy, "PolicyDomain", "policy-domain"),
+            (Policy, "MxHost", "mx-host"),
+        ]
+        if with_policy_summaries:
+            labelled_columns += [
+                (
+                    Policy,
+                    "TotalSuccessfulSessionCount",
+                    "total-successful-session-count",
+                ),
+                (Policy, "TotalFailureSessionCount", "total-failure-session-count"),
+            ]
+        columns = [
+            model.__table__.c[column].label(label)
+            for model, column, label in labelled_columns
+        ]
+        failure_detail_columns = {
+            "result-type": "ResultType",
+            "sending-mta-ip": "SendingMtaIp",
+            "receiving-mx-hostname": "ReceivingMxHostname",
+            "receiving-mx-helo": "ReceivingMxHelo",
+            "receiving-ip": "ReceivingIp",
+            "failed-session-count": "FailedSessionCount",
+            "additional-information": "AdditionalInformation",
+            "failure-reason-code": "FailureReasonCode",
+        }
+        columns += [
+            (null() if partition is None else partition.c[column]).label(label)
+            for label, column in failure_detail_columns.items()
+        ]
+        statement = (
+            select(*columns)
+            .select_from(Report)
+            .join(Organisation, Report.organisation_id == Organisation.organisation_id)
+            .where(
+                Report.start_datetime
+                >= datetime.datetime.combine(start_month, datetime.time()),
+                Report.start_datetime
+                < datetime.datetime.combine(next_month(start_month), datetime.time()),
+            )
+        )
+        order_by: Tuple[Any, ...]
+        if partition is None:
+            statement = statement.join(Policy, Policy.report_id == Report.report_id)
+            order_by = (Report.start_datetime, Report.report_id, Policy.policy_id)
+        elif with_policy_summaries:
+            statement = statement.join(
+                Policy, Policy.report_id == Report.report_id
+            ).outerjoin(
+                partition,
+                (partition.c.ReportID == Report.report_id)
+                & (partition.c.PolicyID == Policy.policy_id),
+            )
+            order_by = (Report.start_datetime, Report.report_id, Policy.policy_id)
+        else:
+            statement = statement.join(
+                partition, partition.c.ReportID == Report.report_id
+            ).join(Policy, partition.c.PolicyID == Policy.policy_id)
+            order_by = (Report.start_datetime, Report.report_id)
+        if start_datetime is not None:
+            statement = statement.where(Report.start_datetime >= start_datetime)
+        if end_datetime is not None:
+            statement = statement.where(Report.end_datetime <= end_datetime)
+        if organisation_name is not None:
+            statement = statement.where(Organisation.name == organisation_name)
+        if policy_domain is not None:
+            statement = statement.where(Policy.policy_domain == policy_domain)
+        if partition is None:
+            return statement.order_by(*order_by)
+        return statement.order_by(*order_by, partition.c.FailureDetailID)
+
+
+failure_detail_partitions = MonthlyPartitions(FailureDetail.__table__)
+failure_details = CRUDFailureDetail(FailureDetail)
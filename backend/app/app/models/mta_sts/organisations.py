@@ -1,13 +1,15 @@
-from app.crud.base import CRUDBase
+from typing import Tuple
+
+from app.core.cache import LRUCache, put_after_commit
+from app.core.config import settings
+from app.crud.base import AsyncCRUDBase
 from app.db.base_class import Base
 from app.schemas.mta_sts_report.organization import (
     OrganisationCreate,
     OrganisationUpdate,
 )
-from app.schemas.resource_created import ResourceCreated
-from sqlalchemy import VARCHAR, Column, String
-from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import Session
+from sqlalchemy import VARCHAR, Column, String, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 class Organisation(Base):
@@ -16,16 +18,48 @@ class Organisation(Base):
     name: str = Column("Name", VARCHAR(255), index=True, nullable=False, unique=True)
 
 
-class CRUDOrganisation(CRUDBase[Organisation, OrganisationCreate, OrganisationUpdate]):
-    def get_by_name(self, db: Session, *, name: str) -> Organisation:
-        return db.query(self.model).filter(Organisation.name == name).one()
+class CRUDOrganisation(
+    AsyncCRUDBase[Organisation, OrganisationCreate, OrganisationUpdate]
+):
+    def __init__(self, model, cache_size: int):
+        super().__init__(model)
+        # Maps the name of an organisation to its identifier
+        self.identifiers: LRUCache[str, str] = LRUCache(cache_size)
+
+    async def get_by_name(self, db: AsyncSession, *, name: str) -> Organisation:
+        result = await db.execute(select(self.model).filter(Organisation.name == name))
+        return result.scalars().one()
+
+    async def warm(self, db: AsyncSession) -> None:
+        """Loads the identifiers of (up to the cache size) organisations into the cache."""
+        result = await db.execute(
+            select(Organisation.name, Organisation.organisation_id).limit(
+                self.identifiers.maxsize
+            )
+        )
+        for name, identifier in result.all():
+            self.identifiers.put(name, identifier)
+        await db.rollback()
+
+    async def get_or_create_id(
+        self, db: AsyncSession, *, name: str
+    ) -> Tuple[str, bool]:
+        """The identifier of the organisation, creating it in the current transaction if it does not exist yet.
 
-    def upsert(self, db: Session, *, name: str) -> ResourceCreated:
-        try:
-            org = self.get_by_name(db, name=name)
-            return ResourceCreated(identifier=org.organisation_id)
-        except NoResultFound:
-            return self.create(db, obj_in=OrganisationCreate(name=name))
+        :param db: The active database session, the caller commits.
+        :param name: The name of the organisation.
+        :return: The identifier and whether the organisation was created.
+        """
+        identifier = self.identifiers.get(name)
+        if identifier is not None:
+            return identifier, False
+        organisation, created = await self.create_or_get(
+            db, obj_in=OrganisationCreate(name=name), unique_on=("name",)
+        )
+        put_after_commit(
+            db.sync_session, self.identifiers, name, organisation.identifier
+        )
+        return organisation.identifier, created
 
 
-organisations = CRUDOrganisation(Organisation)
+organisations = CRUDOrganisation(Organisation, settings.ORGANISATION_CACHE_SIZE)
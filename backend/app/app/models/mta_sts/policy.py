@@ -1,37 +1,97 @@
-import datetime
-from typing import List, Text
+from typing import Any, Dict, List, Sequence
 
-from app.crud.base import CRUDBase
+from app.crud.base import AsyncCRUDBase
 from app.db.base_class import Base
-from app.schemas.mta_sts_report.mta_sts_policy import PolicyTypes
-from app.schemas.mta_sts_report.organization import (
-    OrganisationCreate,
-    OrganisationUpdate,
+from app.db.utils import bulk_insert
+from app.schemas.mta_sts_report import mta_sts_policy
+from app.schemas.mta_sts_report.mta_sts_policy import PolicyContainer, PolicyTypes
+from app.schemas.resource_created import ResourceCreated
+from sqlalchemy import (
+    JSON,
+    VARCHAR,
+    Column,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    select,
 )
-from pydantic import EmailStr
-from sqlalchemy import ARRAY, VARCHAR, Column, DateTime, Enum, ForeignKey, String
-from sqlalchemy.orm import Session, relationship
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 class Policy(Base):
     __tablename__ = "Policies"
+    __table_args__ = (
+        Index("IX_Policies_ReportID", "ReportID"),
+        Index("IX_Policies_PolicyDomain_ReportID", "PolicyDomain", "ReportID"),
+    )
     policy_id: str = Column("PolicyID", String(length=25), primary_key=True)
-    policy_type: PolicyTypes = Column("PolicyType", Enum(PolicyTypes), nullable=False)
-    policy_string: List[str] = Column("PolicyString", ARRAY(str), nullable=False)
+    policy_type: PolicyTypes = Column(
+        "PolicyType",
+        Enum(
+            PolicyTypes,
+            name="PolicyType",
+            native_enum=False,
+            length=16,
+            values_callable=lambda policy_types: [
+                member.value for member in policy_types
+            ],
+        ),
+        nullable=False,
+    )
+    # JSON rather than ARRAY, as arrays are specific to Postgres
+    policy_string: List[str] = Column("PolicyString", JSON, nullable=False)
     policy_domain: str = Column("PolicyDomain", VARCHAR(255), nullable=False)
     mx_host: str = Column("MxHost", VARCHAR(450), nullable=True)
+    # The summary of the policy
+    total_successful_session_count: int = Column(
+        "TotalSuccessfulSessionCount", Integer, nullable=False
+    )
+    total_failure_session_count: int = Column(
+        "TotalFailureSessionCount", Integer, nullable=False
+    )
 
     report_id = Column(
         "ReportID",
         String(length=25),
-        ForeignKey("Policies.PolicyID"),
+        ForeignKey("Reports.ReportID"),
         nullable=False,
     )
-    organisation = relationship("Organisation")
 
 
-class CRUDPolicy(CRUDBase[Policy, OrganisationCreate, OrganisationUpdate]):
-    pass
+class CRUDPolicy(AsyncCRUDBase[Policy, PolicyContainer, PolicyContainer]):
+    @staticmethod
+    def row(
+        report_id: str,
+        policy: mta_sts_policy.Policy,
+        summary: mta_sts_policy.Summary,
+    ) -> Dict[str, Any]:
+        """The values of a new policy and its summary, identified by a new ``PolicyID``."""
+        return {
+            "PolicyID": ResourceCreated().identifier,
+            "ReportID": report_id,
+            "PolicyType": policy.policy_type,
+            "PolicyString": policy.policy_string,
+            "PolicyDomain": policy.policy_domain,
+            "MxHost": policy.mx_host,
+            "TotalSuccessfulSessionCount": summary.total_successful_session_count,
+            "TotalFailureSessionCount": summary.total_failure_session_count,
+        }
+
+    async def create_many(
+        self, db: AsyncSession, *, rows: Sequence[Dict[str, Any]]
+    ) -> None:
+        """Inserts the policies (see ``row``) at once, without going through the ORM unit of work."""
+        await bulk_insert(db, self.model.__table__, rows)
+
+    async def get_by_report(self, db: AsyncSession, *, report_id: str) -> List[Policy]:
+        result = await db.execute(
+            select(Policy)
+            .filter(Policy.report_id == report_id)
+            .order_by(Policy.policy_id)
+        )
+        return result.scalars().all()
 
 
 policies = CRUDPolicy(Policy)
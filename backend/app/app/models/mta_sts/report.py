@@ -1,18 +1,61 @@
 import datetime
+from typing import Collection, Dict, List, Optional, Tuple, Union
 
-from app.crud.base import CRUDBase
+from app.crud.base import AsyncCRUDBase
 from app.db.base_class import Base
+from app.models.mta_sts.organisations import Organisation
+from app.models.mta_sts.policy import Policy
 from app.schemas.mta_sts_report.organization import (
     OrganisationCreate,
     OrganisationUpdate,
 )
 from pydantic import EmailStr
-from sqlalchemy import VARCHAR, Column, DateTime, ForeignKey, String
-from sqlalchemy.orm import Session, relationship
+from sqlalchemy import (
+    CHAR,
+    VARCHAR,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    String,
+    desc,
+    exists,
+    func,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import Select
 
 
 class Report(Base):
     __tablename__ = "Reports"
+    __table_args__ = (
+        Index(
+            "UX_Reports_ExternalID_OrganisationID",
+            "ExternalID",
+            "OrganisationID",
+            unique=True,
+        ),
+        Index("UX_Reports_ContentHash", "ContentHash", unique=True),
+        # Keyset pagination on (StartDatetime, ReportID), optionally per organisation
+        Index("IX_Reports_StartDatetime_ReportID", "StartDatetime", "ReportID"),
+        Index(
+            "IX_Reports_OrganisationID_StartDatetime_ReportID",
+            "OrganisationID",
+            "StartDatetime",
+            "ReportID",
+        ),
+        # Finds the reports whose failure details are yet to expire, see ``get_expired``
+        Index(
+            "IX_Reports_FailureDetailsPurged_StartDatetime",
+            "FailureDetailsPurged",
+            "StartDatetime",
+        ),
+    )
     report_id: str = Column("ReportID", String(length=25), primary_key=True)
     start_datetime: datetime.datetime = Column(
         "StartDatetime", DateTime, nullable=False
@@ -27,6 +70,10 @@ class Report(Base):
     external_id: str = Column(
         "ExternalID", VARCHAR(255), nullable=False, doc="Original report-id"
     )
+    # Hex encoded SHA-256 of the raw upload, unknown for reports stored before it was recorded
+    content_hash = Column("ContentHash", CHAR(64), nullable=True)
+    # When the failure details were deleted by the retention job, only their daily rollups and sketches remain
+    failure_details_purged = Column("FailureDetailsPurged", DateTime, nullable=True)
 
     organisation_id = Column(
         "OrganisationID",
@@ -37,18 +84,209 @@ class Report(Base):
     organisation = relationship("Organisation")
 
 
-class CRUDReport(CRUDBase[Report, OrganisationCreate, OrganisationUpdate]):
-    def get_id(self, db: Session, *, external_id: str, organisation_id: str) -> str:
-        result = (
-            db.query(self.model)
-            .filter(
+class CRUDReport(AsyncCRUDBase[Report, OrganisationCreate, OrganisationUpdate]):
+    async def get_id(
+        self, db: AsyncSession, *, external_id: str, organisation_id: str
+    ) -> str:
+        result = await db.execute(
+            select(Report.report_id).filter(
                 Report.external_id == external_id,
                 Report.organisation_id == organisation_id,
             )
-            .with_entities(Report.report_id)
-            .one()
         )
-        return result[0]
+        return result.scalar_one()
+
+    async def get_with_organisation_name(
+        self, db: AsyncSession, *, report_id: str
+    ) -> Row:
+        """The report joined with the name of its organisation, raises ``NoResultFound`` if it does not exist."""
+        result = await db.execute(
+            select(Report, Organisation.name)
+            .join(Organisation, Report.organisation_id == Organisation.organisation_id)
+            .filter(Report.report_id == report_id)
+        )
+        return result.one()
+
+    async def get_page(
+        self,
+        db: AsyncSession,
+        *,
+        limit: int,
+        before: Optional[Tuple[datetime.datetime, str]] = None,
+        organisation_name: Optional[str] = None,
+        policy_domain: Optional[str] = None,
+        start_datetime: Optional[datetime.datetime] = None,
+        end_datetime: Optional[datetime.datetime] = None,
+    ) -> List[Row]:
+        """A page of reports joined with the name of their organisation, most recent first.
+
+        The page seeks past the (StartDatetime, ReportID) of the last report of the previous page rather than using
+        OFFSET, so every page is a range scan of the index, however deep the page is.
+
+        :param db: The active database session.
+        :param limit: The maximum number of reports.
+        :param before: The (StartDatetime, ReportID) of the last report of the previous page, if any.
+        :param organisation_name: Only reports of this organisation.
+        :param policy_domain: Only reports with a policy for this domain.
+        :param start_datetime: Only reports starting at or after this time (naive UTC).
+        :param end_datetime: Only reports ending at or before this time (naive UTC).
+        :return: The report and the name of its organisation.
+        """
+        statement = select(Report, Organisation.name).join(
+            Organisation, Report.organisation_id == Organisation.organisation_id
+        )
+        if before is not None:
+            statement = statement.filter(
+                tuple_(Report.start_datetime, Report.report_id) < tuple_(*before)
+            )
+        if organisation_name is not None:
+            statement = statement.filter(Organisation.name == organisation_name)
+        if policy_domain is not None:
+            statement = statement.filter(
+                exists().where(
+                    Policy.report_id == Report.report_id,
+                    Policy.policy_domain == policy_domain,
+                )
+            )
+        if start_datetime is not None:
+            statement = statement.filter(Report.start_datetime >= start_datetime)
+        if end_datetime is not None:
+            statement = statement.filter(Report.end_datetime <= end_datetime)
+        result = await db.execute(
+            statement.order_by(
+                desc(Report.start_datetime), desc(Report.report_id)
+            ).limit(limit)
+        )
+        return result.all()
+
+    async def find_ids_by_content_hash(
+        self, db: AsyncSession, *, content_hashes: Collection[str]
+    ) -> Dict[str, str]:
+        """Maps the given content hashes of stored reports to the identifier of the report."""
+        if not content_hashes:
+            return {}
+        result = await db.execute(
+            select(Report.content_hash, Report.report_id).filter(
+                Report.content_hash.in_(content_hashes)
+            )
+        )
+        return dict(result.all())
+
+    async def get_start_range(
+        self,
+        db: Union[AsyncSession, AsyncConnection],
+        *,
+        start_datetime: Optional[datetime.datetime] = None,
+        end_datetime: Optional[datetime.datetime] = None,
+    ) -> Tuple[Optional[datetime.datetime], Optional[datetime.datetime]]:
+        """The start of the first and of the last report, None if there are none.
+
+        :param db: The active database session or connection.
+        :param start_datetime: Only reports starting at or after this time (naive UTC).
+        :param end_datetime: Only reports ending at or before this time (naive UTC).
+        """
+        statement = select(
+            func.min(Report.start_datetime), func.max(Report.start_datetime)
+        )
+        if start_datetime is not None:
+            statement = statement.filter(Report.start_datetime >= start_datetime)
+        if end_datetime is not None:
+            statement = statement.filter(Report.end_datetime <= end_datetime)
+        first, last = (await db.execute(statement)).one()
+        return first, last
+
+    async def get_expired(
+        self,
+        db: AsyncSession,
+        *,
+        before: datetime.datetime,
+        limit: int,
+        organisation_names: Optional[Collection[str]] = None,
+        excluded_organisation_names: Collection[str] = (),
+    ) -> List[Row]:
+        """The oldest reports starting before the given time whose failure details have not been purged yet.
+
+        :param db: The active database session.
+        :param before: The start (naive UTC) the reports are expired before.
+        :param limit: The maximum number of reports.
+        :param organisation_names: Only reports of these organisations, of all organisations by default.
+        :param excluded_organisation_names: No reports of these organisations.
+        :return: The identifier and start of the reports, oldest first.
+        """
+        statement = select(Report.report_id, Report.start_datetime).filter(
+            Report.failure_details_purged.is_(None), Report.start_datetime < before
+        )
+        if organisation_names is not None or excluded_organisation_names:
+            statement = statement.join(
+                Organisation, Report.organisation_id == Organisation.organisation_id
+            )
+        if organisation_names is not None:
+            statement = statement.filter(
+                Organisation.name.in_(organisation_names)  # type: ignore
+            )
+        if excluded_organisation_names:
+            statement = statement.filter(
+                Organisation.name.notin_(excluded_organisation_names)  # type: ignore
+            )
+        result = await db.execute(
+            statement.order_by(Report.start_datetime, Report.report_id).limit(limit)
+        )
+        return result.all()
+
+    async def mark_purged(
+        self,
+        db: AsyncSession,
+        *,
+        report_ids: Collection[str],
+        purged: datetime.datetime,
+    ) -> None:
+        await db.execute(
+            update(Report)
+            .filter(Report.report_id.in_(report_ids))  # type: ignore
+            .values(failure_details_purged=purged)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def mark_purged_between(
+        self,
+        db: AsyncSession,
+        *,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        purged: datetime.datetime,
+    ) -> int:
+        """Marks the reports starting in [start, end) purged, unless they are.
+
+        :return: The number of reports marked.
+        """
+        result = await db.execute(
+            update(Report)
+            .filter(
+                Report.failure_details_purged.is_(None),
+                Report.start_datetime >= start,
+                Report.start_datetime < end,
+            )
+            .values(failure_details_purged=purged)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+
+def purged_days(start: datetime.datetime, end: datetime.datetime) -> Select:
+    """The days (as ``func.date``) in [start, end) with reports whose failure details were purged.
+
+    The failure details of these days are incomplete, so the rollups and sketches derived from them must not be
+    recomputed.
+    """
+    return (
+        select(func.date(Report.start_datetime))
+        .filter(
+            Report.failure_details_purged.isnot(None),
+            Report.start_datetime >= start,
+            Report.start_datetime < end,
+        )
+        .distinct()
+    )
 
 
 reports = CRUDReport(Report)
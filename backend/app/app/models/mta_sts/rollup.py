@@ -0,0 +1,312 @@
+import datetime
+from collections import defaultdict
+from typing import Dict, List, Optional, Protocol, Tuple, Type, Union
+
+from app.crud.base import AsyncCRUDBase
+from app.db.base_class import Base
+from app.db.utils import upsert_add
+from app.models.mta_sts.failure_detail import failure_detail_partitions
+from app.models.mta_sts.organisations import Organisation
+from app.models.mta_sts.policy import Policy
+from app.models.mta_sts.report import Report, purged_days
+from app.schemas.mta_sts_statistics import DailyMtaStsStatistics
+from sqlalchemy import (
+    VARCHAR,
+    BigInteger,
+    Column,
+    Date,
+    ForeignKey,
+    String,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class DailyPolicyRollup(Base):
+    """The session counts of the policies per day (start of the report), policy domain and organisation."""
+
+    __tablename__ = "DailyPolicyRollups"
+    day: datetime.date = Column("Day", Date, primary_key=True)
+    policy_domain: str = Column("PolicyDomain", VARCHAR(255), primary_key=True)
+    organisation_id: str = Column(
+        "OrganisationID",
+        String(length=25),
+        ForeignKey("Organisations.OrganisationID"),
+        primary_key=True,
+    )
+    total_successful_session_count: int = Column(
+        "TotalSuccessfulSessionCount", BigInteger, nullable=False
+    )
+    total_failure_session_count: int = Column(
+        "TotalFailureSessionCount", BigInteger, nullable=False
+    )
+
+
+class DailyFailureRollup(Base):
+    """The failed session counts per day (start of the report), policy domain, organisation and result type."""
+
+    __tablename__ = "DailyFailureRollups"
+    day: datetime.date = Column("Day", Date, primary_key=True)
+    policy_domain: str = Column("PolicyDomain", VARCHAR(255), primary_key=True)
+    organisation_id: str = Column(
+        "OrganisationID",
+        String(length=25),
+        ForeignKey("Organisations.OrganisationID"),
+        primary_key=True,
+    )
+    result_type: str = Column("ResultType", VARCHAR(64), primary_key=True)
+    failed_session_count: int = Column("FailedSessionCount", BigInteger, nullable=False)
+
+
+class RebuildableAggregate(Protocol):
+    """The rollups and sketches, recomputed from the stored reports, see ``CRUDDailyRollup.rebuild``."""
+
+    async def rebuild(
+        self, db: AsyncSession, *, start_day: datetime.date, end_day: datetime.date
+    ) -> None:
+        ...
+
+
+class ReportCounts:
+    """The counts of a single report, accumulated while its policies and failure details are stored."""
+
+    def __init__(self):
+        # By policy domain, the successful and failed session counts
+        self.sessions: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+        # By policy domain and result type
+        self.failures: Dict[Tuple[str, str], int] = defaultdict(int)
+        # By policy domain and sending MTA IP, see ``DailyFailureSketch``
+        self.sending_mta_ips: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def add_policy(
+        self, policy_domain: str, successful_sessions: int, failed_sessions: int
+    ) -> None:
+        self.sessions[policy_domain][0] += successful_sessions
+        self.sessions[policy_domain][1] += failed_sessions
+
+    def add_failure(
+        self,
+        policy_domain: str,
+        result_type: str,
+        sending_mta_ip: str,
+        failed_sessions: int,
+    ) -> None:
+        self.failures[(policy_domain, result_type)] += failed_sessions
+        self.sending_mta_ips[(policy_domain, sending_mta_ip)] += failed_sessions
+
+
+class CRUDDailyRollup(
+    AsyncCRUDBase[DailyPolicyRollup, DailyMtaStsStatistics, DailyMtaStsStatistics]
+):
+    async def add(
+        self,
+        db: AsyncSession,
+        *,
+        day: datetime.date,
+        organisation_id: str,
+        counts: ReportCounts,
+    ) -> None:
+        """Adds the counts of a report to the rollups of its day, in the transaction storing the report."""
+        dialect_name = db.bind.dialect.name
+        if counts.sessions:
+            await db.execute(
+                upsert_add(
+                    dialect_name,
+                    DailyPolicyRollup.__table__,
+                    ["Day", "PolicyDomain", "OrganisationID"],
+                    ["TotalSuccessfulSessionCount", "TotalFailureSessionCount"],
+                ),
+                [
+                    {
+                        "Day": day,
+                        "PolicyDomain": policy_domain,
+                        "OrganisationID": organisation_id,
+                        "TotalSuccessfulSessionCount": successful,
+                        "TotalFailureSessionCount": failed,
+                    }
+                    for policy_domain, (successful, failed) in counts.sessions.items()
+                ],
+            )
+        if counts.failures:
+            await db.execute(
+                upsert_add(
+                    dialect_name,
+                    DailyFailureRollup.__table__,
+                    ["Day", "PolicyDomain", "OrganisationID", "ResultType"],
+                    ["FailedSessionCount"],
+                ),
+                [
+                    {
+                        "Day": day,
+                        "PolicyDomain": policy_domain,
+                        "OrganisationID": organisation_id,
+                        "ResultType": result_type,
+                        "FailedSessionCount": failed,
+                    }
+                    for (policy_domain, result_type), failed in counts.failures.items()
+                ],
+            )
+
+    async def get_days(
+        self,
+        db: AsyncSession,
+        *,
+        start_day: Optional[datetime.date] = None,
+        end_day: Optional[datetime.date] = None,
+        organisation_name: Optional[str] = None,
+        policy_domain: Optional[str] = None,
+    ) -> List[DailyMtaStsStatistics]:
+        """The daily statistics from the rollups alone, the raw reports are not read.
+
+        :param db: The active database session.
+        :param start_day: The first day, inclusive.
+        :param end_day: The last day, inclusive.
+        :param organisation_name: Only the statistics of the organisation with this name.
+        :param policy_domain: Only the statistics of this policy domain.
+        :return: The statistics by day, policy domain and organisation, ordered by day.
+        """
+        statistics: Dict[Tuple[datetime.date, str, str], DailyMtaStsStatistics] = {}
+        rollups: Tuple[
+            Union[Type[DailyPolicyRollup], Type[DailyFailureRollup]], ...
+        ] = (DailyPolicyRollup, DailyFailureRollup)
+        for rollup in rollups:
+            statement = select(rollup, Organisation.name).join(
+                Organisation, rollup.organisation_id == Organisation.organisation_id
+            )
+            if start_day is not None:
+                statement = statement.filter(rollup.day >= start_day)
+            if end_day is not None:
+                statement = statement.filter(rollup.day <= end_day)
+            if organisation_name is not None:
+                statement = statement.filter(Organisation.name == organisation_name)
+            if policy_domain is not None:
+                statement = statement.filter(rollup.policy_domain == policy_domain)
+            result = await db.execute(
+                statement.order_by(
+                    rollup.day, rollup.policy_domain, rollup.organisation_id
+                )
+            )
+            for row, name in result.all():
+                key = (row.day, row.policy_domain, name)
+                if rollup is DailyPolicyRollup:
+                    statistics[key] = DailyMtaStsStatistics(
+                        **{
+                            "day": row.day,
+                            "organization-name": name,
+                            "policy-domain": row.policy_domain,
+                            "total-successful-session-count": row.total_successful_session_count,
+                            "total-failure-session-count": row.total_failure_session_count,
+                        }
+                    )
+                elif key in statistics:
+                    statistics[key].failed_session_counts[
+                        row.result_type
+                    ] = row.failed_session_count
+        return list(statistics.values())
+
+    async def rebuild(
+        self, db: AsyncSession, *, start_day: datetime.date, end_day: datetime.date
+    ) -> None:
+        """Recomputes the rollups of the days in [start_day, end_day) from the stored reports, the caller commits.
+
+        Ingestion adding to the same days meanwhile is not accounted for on databases that do not serialise
+        transactions, such as Postgres: rebuild while ingestion is paused. The failure rollups of days with purged
+        failure details are not recomputed, see ``purged_days``.
+        """
+        start = datetime.datetime.combine(start_day, datetime.time())
+        end = datetime.datetime.combine(end_day, datetime.time())
+        day = func.date(Report.start_datetime)
+        # The failure details of these days are (partially) purged, their failure rollups are kept as they are
+        purged = purged_days(start, end)
+        for rollup in (DailyPolicyRollup, DailyFailureRollup):
+            statement = delete(rollup.__table__).where(
+                rollup.__table__.c.Day >= start_day,
+                rollup.__table__.c.Day < end_day,
+            )
+            if rollup is DailyFailureRollup:
+                statement = statement.where(rollup.__table__.c.Day.notin_(purged))
+            await db.execute(statement)
+
+        policies = (
+            select(
+                day,
+                Policy.policy_domain,
+                Report.organisation_id,
+                func.sum(Policy.total_successful_session_count),
+                func.sum(Policy.total_failure_session_count),
+            )
+            .join(Report, Policy.report_id == Report.report_id)
+            .filter(Report.start_datetime >= start, Report.start_datetime < end)
+            .group_by(day, Policy.policy_domain, Report.organisation_id)
+        )
+        await db.execute(
+            insert(DailyPolicyRollup.__table__).from_select(
+                [
+                    "Day",
+                    "PolicyDomain",
+                    "OrganisationID",
+                    "TotalSuccessfulSessionCount",
+                    "TotalFailureSessionCount",
+                ],
+                policies,
+            )
+        )
+
+        # The days of different months do not overlap
+        for month in await failure_detail_partitions.get_months(
+            db, start=start_day, end=end_day
+        ):
+            partition = failure_detail_partitions.table(month)
+            failures = (
+                select(
+                    day,
+                    Policy.policy_domain,
+                    Report.organisation_id,
+                    partition.c.ResultType,
+                    func.sum(partition.c.FailedSessionCount),
+                )
+                .select_from(partition)
+                .join(Policy, partition.c.PolicyID == Policy.policy_id)
+                .join(Report, partition.c.ReportID == Report.report_id)
+                .filter(
+                    Report.start_datetime >= start,
+                    Report.start_datetime < end,
+                    day.notin_(purged),
+                )
+                .group_by(
+                    day,
+                    Policy.policy_domain,
+                    Report.organisation_id,
+                    partition.c.ResultType,
+                )
+            )
+            await db.execute(
+                insert(DailyFailureRollup.__table__).from_select(
+                    [
+                        "Day",
+                        "PolicyDomain",
+                        "OrganisationID",
+                        "ResultType",
+                        "FailedSessionCount",
+                    ],
+                    failures,
+                )
+            )
+
+    async def get_day_range(
+        self, db: AsyncSession
+    ) -> Optional[Tuple[datetime.date, datetime.date]]:
+        """The first and last day any stored report starts on, None if there are no reports."""
+        result = await db.execute(
+            select(func.min(Report.start_datetime), func.max(Report.start_datetime))
+        )
+        first, last = result.one()
+        if first is None:
+            return None
+        return first.date(), last.date()
+
+
+daily_rollups = CRUDDailyRollup(DailyPolicyRollup)
@@ -0,0 +1,395 @@
+import datetime
+from collections import defaultdict
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.hyperloglog import HyperLogLog
+from app.core.space_saving import SpaceSaving
+from app.crud.base import AsyncCRUDBase
+from app.db.base_class import Base
+from app.db.utils import insert_or_ignore
+from app.models.mta_sts.failure_detail import failure_detail_partitions
+from app.models.mta_sts.policy import Policy
+from app.models.mta_sts.report import Report, purged_days
+from app.models.mta_sts.rollup import ReportCounts
+from app.schemas.mta_sts_statistics import DistinctSendingMtaIps, TopFailures
+from sqlalchemy import (
+    JSON,
+    VARCHAR,
+    BigInteger,
+    Column,
+    Date,
+    LargeBinary,
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class SketchDimension(str, Enum):
+    SENDING_MTA_IP = "sending-mta-ip"
+    RESULT_TYPE = "result-type"
+
+
+class DailyFailureSketch(Base):
+    """The heaviest values of a dimension of the failure details, weighted by their failed session count, per day
+    (start of the report) and policy domain. See ``SpaceSaving``."""
+
+    __tablename__ = "DailyFailureSketches"
+    day: datetime.date = Column("Day", Date, primary_key=True)
+    policy_domain: str = Column("PolicyDomain", VARCHAR(255), primary_key=True)
+    dimension: SketchDimension = Column("Dimension", VARCHAR(32), primary_key=True)
+    # The counters as [value, count, error], see ``SpaceSaving.to_json``
+    counters: List[List] = Column("Counters", JSON, nullable=False)
+    total_count: int = Column("TotalCount", BigInteger, nullable=False)
+
+
+class DailySendingMtaIpSketch(Base):
+    """The distinct sending MTA IPs of the failure details per day (start of the report) and policy domain. See
+    ``HyperLogLog``."""
+
+    __tablename__ = "DailySendingMtaIpSketches"
+    day: datetime.date = Column("Day", Date, primary_key=True)
+    policy_domain: str = Column("PolicyDomain", VARCHAR(255), primary_key=True)
+    # See ``HyperLogLog.to_bytes``
+    registers: bytes = Column("Registers", LargeBinary, nullable=False)
+
+
+def report_values(
+    counts: ReportCounts,
+) -> Dict[Tuple[str, SketchDimension], Dict[str, int]]:
+    """The failed session counts of a report by policy domain, dimension and value."""
+    values: Dict[Tuple[str, SketchDimension], Dict[str, int]] = defaultdict(dict)
+    for (policy_domain, result_type), failed in counts.failures.items():
+        values[(policy_domain, SketchDimension.RESULT_TYPE)][result_type] = failed
+    for (policy_domain, sending_mta_ip), failed in counts.sending_mta_ips.items():
+        values[(policy_domain, SketchDimension.SENDING_MTA_IP)][sending_mta_ip] = failed
+    return values
+
+
+class CRUDDailyFailureSketch(
+    AsyncCRUDBase[DailyFailureSketch, TopFailures, TopFailures]
+):
+    def __init__(self, model, capacity: int):
+        super().__init__(model)
+        self.capacity = capacity
+
+    async def add(
+        self, db: AsyncSession, *, day: datetime.date, counts: ReportCounts
+    ) -> None:
+        """Merges the failure details of a report into the sketches of its day, in the transaction storing the report.
+
+        The sketches are read, merged and written back: the row is created first and selected FOR UPDATE, so
+        concurrent reports of the same day and policy domain are serialised on it.
+        """
+        values = report_values(counts)
+        if not values:
+            return
+        table = DailyFailureSketch.__table__
+        await db.execute(
+            insert_or_ignore(
+                db.bind.dialect.name, table, ["Day", "PolicyDomain", "Dimension"]
+            ),
+            [
+                {
+                    "Day": day,
+                    "PolicyDomain": policy_domain,
+                    "Dimension": dimension.value,
+                    "Counters": [],
+                    "TotalCount": 0,
+                }
+                for policy_domain, dimension in values
+            ],
+        )
+        result = await db.execute(
+            select(
+                table.c.PolicyDomain,
+                table.c.Dimension,
+                table.c.Counters,
+                table.c.TotalCount,
+            )
+            .where(
+                table.c.Day == day,
+                tuple_(table.c.PolicyDomain, table.c.Dimension).in_(
+                    [
+                        (policy_domain, dimension.value)
+                        for policy_domain, dimension in values
+                    ]
+                ),
+            )
+            .with_for_update()
+        )
+        merged = []
+        for policy_domain, dimension, counters, total_count in result.all():
+            sketch = SpaceSaving.from_json(self.capacity, counters, total_count).merge(
+                SpaceSaving.from_counts(
+                    self.capacity, values[(policy_domain, SketchDimension(dimension))]
+                )
+            )
+            merged.append(
+                {
+                    "day": day,
+                    "policy_domain": policy_domain,
+                    "dimension": dimension,
+                    "counters": sketch.to_json(),
+                    "total_count": sketch.total,
+                }
+            )
+        await db.execute(
+            update(table)
+            .where(
+                table.c.Day == bindparam("day"),
+                table.c.PolicyDomain == bindparam("policy_domain"),
+                table.c.Dimension == bindparam("dimension"),
+            )
+            .values(
+                Counters=bindparam("counters"), TotalCount=bindparam("total_count")
+            ),
+            merged,
+        )
+
+    async def get_merged(
+        self,
+        db: AsyncSession,
+        *,
+        policy_domain: str,
+        dimension: SketchDimension,
+        start_day: Optional[datetime.date] = None,
+        end_day: Optional[datetime.date] = None,
+    ) -> SpaceSaving:
+        """The sketches of the days in [start_day, end_day] merged into one, the raw failure details are not read."""
+        statement = select(
+            DailyFailureSketch.counters, DailyFailureSketch.total_count
+        ).where(
+            DailyFailureSketch.policy_domain == policy_domain,
+            DailyFailureSketch.dimension == dimension.value,
+        )
+        if start_day is not None:
+            statement = statement.where(DailyFailureSketch.day >= start_day)
+        if end_day is not None:
+            statement = statement.where(DailyFailureSketch.day <= end_day)
+        sketch = SpaceSaving(self.capacity)
+        for counters, total_count in (await db.execute(statement)).all():
+            sketch = sketch.merge(
+                SpaceSaving.from_json(self.capacity, counters, total_count)
+            )
+        return sketch
+
+    async def rebuild(
+        self, db: AsyncSession, *, start_day: datetime.date, end_day: datetime.date
+    ) -> None:
+        """Recomputes the sketches of the days in [start_day, end_day) from the stored failure details, the caller
+        commits. The heaviest values of each day are counted exactly, the days with purged failure details are kept
+        as they are, see ``CRUDDailyRollup.rebuild``."""
+        start = datetime.datetime.combine(start_day, datetime.time())
+        end = datetime.datetime.combine(end_day, datetime.time())
+        day = func.date(Report.start_datetime)
+        table = DailyFailureSketch.__table__
+        purged = purged_days(start, end)
+        await db.execute(
+            delete(table).where(
+                table.c.Day >= start_day,
+                table.c.Day < end_day,
+                table.c.Day.notin_(purged),
+            )
+        )
+        months = await failure_detail_partitions.get_months(
+            db, start=start_day, end=end_day
+        )
+        for dimension, column in (
+            (SketchDimension.RESULT_TYPE, "ResultType"),
+            (SketchDimension.SENDING_MTA_IP, "SendingMtaIp"),
+        ):
+            values: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(dict)
+            for month in months:
+                partition = failure_detail_partitions.table(month)
+                result = await db.execute(
+                    select(
+                        day,
+                        Policy.policy_domain,
+                        partition.c[column],
+                        func.sum(partition.c.FailedSessionCount),
+                    )
+                    .select_from(partition)
+                    .join(Policy, partition.c.PolicyID == Policy.policy_id)
+                    .join(Report, partition.c.ReportID == Report.report_id)
+                    .filter(
+                        Report.start_datetime >= start,
+                        Report.start_datetime < end,
+                        day.notin_(purged),
+                    )
+                    .group_by(day, Policy.policy_domain, partition.c[column])
+                )
+                for value_day, policy_domain, value, failed in result.all():
+                    # A string on SQLite
+                    values[(str(value_day), policy_domain)][value] = failed
+            if values:
+                sketches = {
+                    key: SpaceSaving.from_counts(self.capacity, counts)
+                    for key, counts in values.items()
+                }
+                await db.execute(
+                    insert(table),
+                    [
+                        {
+                            "Day": datetime.date.fromisoformat(value_day),
+                            "PolicyDomain": policy_domain,
+                            "Dimension": dimension.value,
+                            "Counters": sketch.to_json(),
+                            "TotalCount": sketch.total,
+                        }
+                        for (value_day, policy_domain), sketch in sketches.items()
+                    ],
+                )
+
+
+class CRUDDailySendingMtaIpSketch(
+    AsyncCRUDBase[DailySendingMtaIpSketch, DistinctSendingMtaIps, DistinctSendingMtaIps]
+):
+    def __init__(self, model, precision: int):
+        super().__init__(model)
+        self.precision = precision
+
+    async def add(
+        self, db: AsyncSession, *, day: datetime.date, counts: ReportCounts
+    ) -> None:
+        """Adds the sending MTA IPs of a report to the sketches of its day, in the transaction storing the report.
+
+        Like ``CRUDDailyFailureSketch.add``, the rows are created first and selected FOR UPDATE.
+        """
+        sending_mta_ips: Dict[str, List[str]] = defaultdict(list)
+        for policy_domain, sending_mta_ip in counts.sending_mta_ips:
+            sending_mta_ips[policy_domain].append(sending_mta_ip)
+        if not sending_mta_ips:
+            return
+        table = DailySendingMtaIpSketch.__table__
+        empty = HyperLogLog(self.precision).to_bytes()
+        await db.execute(
+            insert_or_ignore(db.bind.dialect.name, table, ["Day", "PolicyDomain"]),
+            [
+                {"Day": day, "PolicyDomain": policy_domain, "Registers": empty}
+                for policy_domain in sending_mta_ips
+            ],
+        )
+        result = await db.execute(
+            select(table.c.PolicyDomain, table.c.Registers)
+            .where(
+                table.c.Day == day,
+                table.c.PolicyDomain.in_(list(sending_mta_ips)),
+            )
+            .with_for_update()
+        )
+        merged = []
+        for policy_domain, registers in result.all():
+            sketch = HyperLogLog.from_bytes(registers, self.precision)
+            for sending_mta_ip in sending_mta_ips[policy_domain]:
+                sketch.add(sending_mta_ip)
+            merged.append(
+                {
+                    "day": day,
+                    "policy_domain": policy_domain,
+                    "registers": sketch.to_bytes(),
+                }
+            )
+        await db.execute(
+            update(table)
+            .where(
+                table.c.Day == bindparam("day"),
+                table.c.PolicyDomain == bindparam("policy_domain"),
+            )
+            .values(Registers=bindparam("registers")),
+            merged,
+        )
+
+    async def get_merged(
+        self,
+        db: AsyncSession,
+        *,
+        policy_domain: Optional[str] = None,
+        start_day: Optional[datetime.date] = None,
+        end_day: Optional[datetime.date] = None,
+    ) -> HyperLogLog:
+        """The sketches of the days in [start_day, end_day] merged into one, the raw failure details are not read.
+
+        :param policy_domain: Only the sending MTA IPs of this policy domain, of all policy domains by default.
+        """
+        statement = select(DailySendingMtaIpSketch.registers)
+        if policy_domain is not None:
+            statement = statement.where(
+                DailySendingMtaIpSketch.policy_domain == policy_domain
+            )
+        if start_day is not None:
+            statement = statement.where(DailySendingMtaIpSketch.day >= start_day)
+        if end_day is not None:
+            statement = statement.where(DailySendingMtaIpSketch.day <= end_day)
+        sketch = HyperLogLog(self.precision)
+        for (registers,) in (await db.execute(statement)).all():
+            sketch = sketch.merge(HyperLogLog.from_bytes(registers, self.precision))
+        return sketch
+
+    async def rebuild(
+        self, db: AsyncSession, *, start_day: datetime.date, end_day: datetime.date
+    ) -> None:
+        """Recomputes the sketches of the days in [start_day, end_day) from the stored failure details, the caller
+        commits. The days with purged failure details are kept as they are, see ``CRUDDailyRollup.rebuild``."""
+        start = datetime.datetime.combine(start_day, datetime.time())
+        end = datetime.datetime.combine(end_day, datetime.time())
+        day = func.date(Report.start_datetime)
+        table = DailySendingMtaIpSketch.__table__
+        purged = purged_days(start, end)
+        await db.execute(
+            delete(table).where(
+                table.c.Day >= start_day,
+                table.c.Day < end_day,
+                table.c.Day.notin_(purged),
+            )
+        )
+        sketches: Dict[Tuple[str, str], HyperLogLog] = {}
+        for month in await failure_detail_partitions.get_months(
+            db, start=start_day, end=end_day
+        ):
+            partition = failure_detail_partitions.table(month)
+            result = await db.stream(
+                select(day, Policy.policy_domain, partition.c.SendingMtaIp)
+                .select_from(partition)
+                .join(Policy, partition.c.PolicyID == Policy.policy_id)
+                .join(Report, partition.c.ReportID == Report.report_id)
+                .filter(
+                    Report.start_datetime >= start,
+                    Report.start_datetime < end,
+                    day.notin_(purged),
+                )
+                .distinct()
+            )
+            async for value_day, policy_domain, sending_mta_ip in result:
+                # A string on SQLite
+                key = (str(value_day), policy_domain)
+                if key not in sketches:
+                    sketches[key] = HyperLogLog(self.precision)
+                sketches[key].add(sending_mta_ip)
+        if sketches:
+            await db.execute(
+                insert(table),
+                [
+                    {
+                        "Day": datetime.date.fromisoformat(value_day),
+                        "PolicyDomain": policy_domain,
+                        "Registers": sketch.to_bytes(),
+                    }
+                    for (value_day, policy_domain), sketch in sketches.items()
+                ],
+            )
+
+
+daily_failure_sketches = CRUDDailyFailureSketch(
+    DailyFailureSketch, settings.MTA_STS_SKETCH_SIZE
+)
+daily_sending_mta_ip_sketches = CRUDDailySendingMtaIpSketch(
+    DailySendingMtaIpSketch, settings.MTA_STS_HYPERLOGLOG_PRECISION
+)
@@ -1,4 +1,6 @@
-IDENTIFIER_INFORMATION = {
+from typing import Any, Dict
+
+IDENTIFIER_INFORMATION: Dict[str, Any] = {
     "title": "The identifier.",
     "description": "The identifier of the resource.",
     "max_length": 64,
@@ -0,0 +1,68 @@
+from typing import Any, Dict, List, Optional
+
+import pydantic
+from app.schemas import IDENTIFIER_INFORMATION
+from app.schemas.http_exception import ExceptionDetail
+
+_IDENTIFIER_INFORMATION: Dict[str, Any] = {
+    **IDENTIFIER_INFORMATION,
+    "description": "The identifier of the created resource, if any.",
+}
+
+
+class BulkItemResult(pydantic.BaseModel):
+    """The outcome of a single report of a bulk request."""
+
+    index: int = pydantic.Field(
+        ...,
+        title="The position of the report.",
+        description="The zero-based position of the report in the request.",
+        ge=0,
+    )
+    name: str = pydantic.Field(
+        ...,
+        title="The name of the report.",
+        description="The file name, archive member or NDJSON line the report was read from.",
+    )
+    status_code: int = pydantic.Field(
+        ...,
+        title="The HTTP status code.",
+        description="The status code a single upload of this report would have been answered with.",
+    )
+    identifier: Optional[str] = pydantic.Field(None, **_IDENTIFIER_INFORMATION)
+    detail: Optional[ExceptionDetail] = pydantic.Field(
+        None, title="The error.", description="Why the report was not created."
+    )
+
+
+class BulkResourcesCreated(pydantic.BaseModel):
+    results: List[BulkItemResult] = pydantic.Field(
+        ..., description="One result per report, in the order of the request."
+    )
+
+    @staticmethod
+    def openapi_examples() -> dict:
+        return {
+            "mixed": {
+                "value": {
+                    "results": [
+                        {
+                            "index": 0,
+                            "name": "google.com!company-y.example!1459468800!1459555199.json.gz",
+                            "status_code": 201,
+                            "identifier": IDENTIFIER_INFORMATION["example"],
+                        },
+                        {
+                            "index": 1,
+                            "name": "line 2",
+                            "status_code": 409,
+                            "detail": {
+                                "code": "409-01",
+                                "message": "Indicates that the resource already exists.",
+                                "additional": ["cjld2cyuq0000t3rmniod1foz"],
+                            },
+                        },
+                    ]
+                }
+            }
+        }
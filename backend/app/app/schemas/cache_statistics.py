@@ -0,0 +1,30 @@
+import pydantic
+
+
+class CacheStatistics(pydantic.BaseModel):
+    """The counters of an in-process cache of a single worker process."""
+
+    size: int = pydantic.Field(
+        ...,
+        title="The number of entries.",
+        description="The current number of entries.",
+        ge=0,
+    )
+    maxsize: int = pydantic.Field(
+        ...,
+        title="The capacity.",
+        description="The maximum number of entries before the least recently used entry is evicted.",
+        ge=0,
+    )
+    hits: int = pydantic.Field(
+        ...,
+        title="The hits.",
+        description="The number of lookups answered by the cache.",
+        ge=0,
+    )
+    misses: int = pydantic.Field(
+        ...,
+        title="The misses.",
+        description="The number of lookups that fell back to the database.",
+        ge=0,
+    )
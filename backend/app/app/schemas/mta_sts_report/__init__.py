@@ -5,12 +5,13 @@ from app.schemas.mta_sts_report.mta_sts_policy import PolicyContainer
 from pydantic import BaseModel, EmailStr, Field
 
 
-class MtaStsReport(BaseModel):
+class MtaStsReportHeader(BaseModel):
     organization_name: str = Field(
         ...,
         description="The name of the organization responsible for the report.",
         example="Company-X",
         alias="organization-name",
+        max_length=255,
     )
     date_range: MtaStsDatetime = Field(
         ...,
@@ -29,7 +30,11 @@ class MtaStsReport(BaseModel):
         "generate a unique identifier.",
         alias="report-id",
         example="5065427c-23d3-47ca-b6e0-946ea0e8c4be",
+        max_length=255,
     )
+
+
+class MtaStsReport(MtaStsReportHeader):
     policies: List[PolicyContainer] = Field(
         ..., description="List of all policies the report covers."
     )
@@ -3,6 +3,15 @@ import datetime
 from pydantic import BaseModel, Field
 
 
+def encode_datetime(value: datetime.datetime) -> str:
+    """The RFC 3339 form of the report, in UTC with a `Z` suffix; naive datetimes are taken as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    else:
+        value = value.astimezone(datetime.timezone.utc)
+    return value.isoformat().replace("+00:00", "Z")
+
+
 class MtaStsDatetime(BaseModel):
     start_datetime: datetime.datetime = Field(
         ...,
@@ -67,7 +67,9 @@ class Summary(BaseModel):
 
 
 class FailureDetail(BaseModel):
-    result_type: str = Field(..., description="The result type.", alias="result-type")
+    result_type: str = Field(
+        ..., description="The result type.", alias="result-type", max_length=64
+    )
     sending_mta_ip: IPvAnyAddress = Field(
         ...,
         description="The IP address of the Sending MTA that attempted the STARTTLS connection. It is provided as a "
@@ -80,12 +82,14 @@ class FailureDetail(BaseModel):
         description="The hostname of the receiving MTA MX record with which the Sending MTA attempted to negotiate a "
         "STARTTLS connection",
         alias="receiving-mx-hostname",
+        max_length=255,
     )
     receiving_mx_helo: str = Field(
         None,
         description="The HELLO (HELO) or Extended HELLO (EHLO) string from the banner announced during the reported "
         "session.",
         alias="receiving-mx-helo",
+        max_length=255,
     )
     receiving_ip: IPvAnyAddress = Field(
         None,
@@ -1,4 +1,5 @@
 import datetime
+from typing import Optional
 
 from pydantic import BaseModel, EmailStr, Field
 
@@ -13,6 +14,7 @@ class ReportBase(BaseModel):
     contact_info: EmailStr
     external_id: str
     organisation_id: str
+    content_hash: Optional[str] = None
 
 
 ReportCreate = ReportBase
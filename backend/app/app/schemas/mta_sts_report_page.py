@@ -0,0 +1,29 @@
+import datetime
+from typing import List, Optional
+
+import pydantic
+from app.schemas import IDENTIFIER_INFORMATION
+from app.schemas.mta_sts_report import MtaStsReportHeader
+from app.schemas.mta_sts_report.mta_sts_datetime import encode_datetime
+
+
+class MtaStsReportListItem(MtaStsReportHeader):
+    """The metadata of a stored report, the policies are retrieved with `GET /mta-sts/{identifier}`."""
+
+    identifier: str = pydantic.Field(..., **IDENTIFIER_INFORMATION)
+
+
+class MtaStsReportPage(pydantic.BaseModel):
+    reports: List[MtaStsReportListItem] = pydantic.Field(
+        ...,
+        description="The reports of this page, the most recent (by start of the date range) first.",
+    )
+    next_cursor: Optional[str] = pydantic.Field(
+        None,
+        title="The cursor of the next page.",
+        description="Pass as `cursor` to retrieve the next page, absent on the last page.",
+    )
+
+    class Config:
+        # The same form as `GET /mta-sts/{identifier}` and the exports
+        json_encoders = {datetime.datetime: encode_datetime}
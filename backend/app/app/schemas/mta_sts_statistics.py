@@ -0,0 +1,126 @@
+import datetime
+from typing import Dict, List, Optional
+
+import pydantic
+
+
+class DailyMtaStsStatistics(pydantic.BaseModel):
+    day: datetime.date = pydantic.Field(
+        ...,
+        title="The day.",
+        description="The day (UTC) the date range of the reports starts on.",
+    )
+    organization_name: str = pydantic.Field(
+        ...,
+        description="The name of the organization responsible for the reports.",
+        example="Company-X",
+        alias="organization-name",
+    )
+    policy_domain: str = pydantic.Field(
+        ...,
+        description="The domain for which the policies are applied.",
+        example="company-y.example",
+        alias="policy-domain",
+    )
+    total_successful_session_count: int = pydantic.Field(
+        ...,
+        description="The sum of the successful sessions of the policies.",
+        alias="total-successful-session-count",
+        ge=0,
+        example=5326,
+    )
+    total_failure_session_count: int = pydantic.Field(
+        ...,
+        description="The sum of the failed sessions of the policies.",
+        alias="total-failure-session-count",
+        ge=0,
+        example=303,
+    )
+    failed_session_counts: Dict[str, int] = pydantic.Field(
+        {},
+        description="The sum of the failed sessions of the failure details, by result type.",
+        alias="failed-session-counts",
+        example={"certificate-expired": 100, "starttls-not-supported": 200},
+    )
+
+
+class MtaStsStatistics(pydantic.BaseModel):
+    days: List[DailyMtaStsStatistics] = pydantic.Field(
+        ..., description="The statistics by day, policy domain and organization."
+    )
+
+
+class TopFailure(pydantic.BaseModel):
+    value: str = pydantic.Field(
+        ...,
+        description="The sending MTA IP or result type.",
+        example="2001:db8:abcd:0012::1",
+    )
+    failed_session_count: int = pydantic.Field(
+        ...,
+        description="The estimated sum of the failed sessions, never less than the exact sum.",
+        alias="failed-session-count",
+        ge=0,
+        example=100,
+    )
+    error: int = pydantic.Field(
+        ...,
+        description="The maximum overestimation of `failed-session-count`, the exact sum is at least "
+        "`failed-session-count - error`.",
+        ge=0,
+        example=0,
+    )
+
+
+class TopFailures(pydantic.BaseModel):
+    policy_domain: str = pydantic.Field(
+        ...,
+        description="The domain for which the policies are applied.",
+        example="company-y.example",
+        alias="policy-domain",
+    )
+    dimension: str = pydantic.Field(
+        ...,
+        description="The field of the failure details ranked.",
+        example="sending-mta-ip",
+    )
+    total_failed_session_count: int = pydantic.Field(
+        ...,
+        description="The exact sum of the failed sessions of all failure details.",
+        alias="total-failed-session-count",
+        ge=0,
+        example=300,
+    )
+    unlisted_failed_session_count: int = pydantic.Field(
+        ...,
+        description="The maximum sum of the failed sessions of any value which is not listed.",
+        alias="unlisted-failed-session-count",
+        ge=0,
+        example=0,
+    )
+    values: List[TopFailure] = pydantic.Field(
+        ..., description="The values with the most failed sessions, the most first."
+    )
+
+
+class DistinctSendingMtaIps(pydantic.BaseModel):
+    policy_domain: Optional[str] = pydantic.Field(
+        None,
+        description="The domain for which the policies are applied, all domains if absent.",
+        example="company-y.example",
+        alias="policy-domain",
+    )
+    distinct_sending_mta_ip_count: int = pydantic.Field(
+        ...,
+        description="The estimated number of distinct sending MTA IPs of the failure details.",
+        alias="distinct-sending-mta-ip-count",
+        ge=0,
+        example=3,
+    )
+    relative_error: float = pydantic.Field(
+        ...,
+        description="The relative standard error of the estimate.",
+        alias="relative-error",
+        ge=0,
+        example=0.01625,
+    )
@@ -0,0 +1,39 @@
+import datetime
+from typing import Optional
+
+import pydantic
+
+
+class ProfileSummary(pydantic.BaseModel):
+    """A sampling profile of a single request, kept in memory by a single worker process."""
+
+    identifier: str = pydantic.Field(
+        ...,
+        title="The identifier of the profile.",
+        description="Returned in the profiling header of the profiled request as well.",
+    )
+    operation: str = pydantic.Field(
+        ...,
+        title="The operation profiled.",
+        description="The name of the endpoint handling the request.",
+    )
+    started: datetime.datetime = pydantic.Field(
+        ..., title="When the request started to be handled."
+    )
+    duration_seconds: float = pydantic.Field(
+        ...,
+        title="The duration.",
+        description="The seconds taken to handle the request, while being profiled.",
+        ge=0,
+    )
+    samples: int = pydantic.Field(
+        ...,
+        title="The number of samples.",
+        description="The number of times the stack of the request was sampled.",
+        ge=0,
+    )
+    error_code: Optional[str] = pydantic.Field(
+        None,
+        title="The error code.",
+        description="The code of the error the request was answered with, if any.",
+    )
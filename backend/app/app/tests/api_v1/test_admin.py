@@ -0,0 +1,125 @@
+import json
+import uuid
+
+import pytest
+from app.core.config import settings
+from app.schemas.cache_statistics import CacheStatistics
+from app.tests.utils.utils import (
+    get_metrics,
+    get_test_data_path,
+    send_request,
+    unique_report,
+)
+from fastapi import status
+
+
+def get_cache_statistics() -> dict:
+    response = send_request("get_cache_statistics")
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    return {
+        name: CacheStatistics(**statistics)
+        for name, statistics in response.json().items()
+    }
+
+
+def test_get_cache_statistics_organisations():
+    organisation_name = f"Company-{uuid.uuid4()}"
+    before = get_cache_statistics()["organisations"]
+
+    for _ in range(2):
+        report = json.loads(unique_report())
+        report["organization-name"] = organisation_name
+        response = send_request(
+            "create_mta_sts_report",
+            files={"report": ("report.json", json.dumps(report).encode())},
+        )
+        assert response.status_code == status.HTTP_201_CREATED, response.json()
+
+    after = get_cache_statistics()["organisations"]
+    # The first report creates the organisation, the second finds it in the cache
+    assert after.misses == before.misses + 1
+    assert after.hits == before.hits + 1
+    assert after.size == before.size + 1
+
+
+def test_get_metrics():
+    response = send_request("get_metrics")
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    report = unique_report()
+    before = get_metrics()
+
+    for expected in (status.HTTP_201_CREATED, status.HTTP_409_CONFLICT):
+        response = send_request(
+            "create_mta_sts_report", files={"report": ("report.json", report)}
+        )
+        assert response.status_code == expected, response.json()
+
+    after = get_metrics()
+    # The json and validation stages are not observed when the report is streamed, see MTA_STS_STREAMING_THRESHOLD
+    for stage in ("organisation", "report", "failure_details"):
+        name = f'tls_reporting_ingest_stage_seconds_count{{stage="{stage}"}}'
+        assert after[name] == before.get(name, 0) + 1
+    for name in (
+        "tls_reporting_ingest_upload_bytes_count",
+        "tls_reporting_ingest_inflated_bytes_count",
+        "tls_reporting_ingest_failure_details_count",
+    ):
+        assert after[name] == before.get(name, 0) + 1
+    # The retried upload is rejected before it is decoded
+    conflicts = 'tls_reporting_errors_total{code="409-01",status_code="409"}'
+    assert after[conflicts] == before.get(conflicts, 0) + 1
+
+
+def test_get_profile_not_found():
+    headers = {settings.PROFILING_HEADER: settings.PROFILING_TOKEN}
+    response = send_request("list_profiles", headers=headers)
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    identifiers = {profile["identifier"] for profile in response.json()}
+
+    identifier = str(uuid.uuid4())
+    assert identifier not in identifiers
+    response = send_request(
+        "get_profile", path_params={"identifier": identifier}, headers=headers
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND, response.json()
+    assert response.json()["detail"]["code"] == "404-01"
+
+
+def test_get_profile_of_failed_request():
+    headers = {settings.PROFILING_HEADER: settings.PROFILING_TOKEN}
+    with open(get_test_data_path("truncated.gz"), "rb") as f:
+        response = send_request(
+            "create_mta_sts_report", files={"report": f}, headers=headers
+        )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    # The identifier of the profile is returned along with the error
+    identifier = response.headers[settings.PROFILING_HEADER]
+    response = send_request(
+        "get_profile", path_params={"identifier": identifier}, headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+
+
+@pytest.mark.parametrize("headers", [None, {settings.PROFILING_HEADER: "wrong"}])
+def test_get_profiles_forbidden(headers):
+    response = send_request("list_profiles", headers=headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN, response.json()
+    assert response.json()["detail"]["code"] == "403-01"
+
+    response = send_request(
+        "get_profile", path_params={"identifier": str(uuid.uuid4())}, headers=headers
+    )
+    assert response.status_code == status.HTTP_403_FORBIDDEN, response.json()
+
+
+def test_get_metrics_request_validation_error():
+    errors = 'tls_reporting_errors_total{code="request-validation",status_code="422"}'
+    before = get_metrics()
+
+    response = send_request("create_mta_sts_report", files={"file": b"{}"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    assert get_metrics()[errors] == before.get(errors, 0) + 1
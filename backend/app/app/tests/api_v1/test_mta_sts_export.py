@@ -0,0 +1,144 @@
+import csv
+import io
+import ipaddress
+import json
+import uuid
+from typing import Optional
+
+import pytest
+from app.core.mta_sts_columnar import COLUMNS
+from app.core.mta_sts_export import FIELDS
+from app.tests.utils.utils import send_request, unique_report
+from fastapi import status
+
+
+def _create_report(organisation_name: Optional[str] = None) -> dict:
+    report = json.loads(unique_report())
+    report["organization-name"] = organisation_name or f"Company-{uuid.uuid4()}"
+    response = send_request(
+        "create_mta_sts_report",
+        files={"report": ("report.json", json.dumps(report).encode())},
+    )
+    assert response.status_code == status.HTTP_201_CREATED, response.json()
+    return report
+
+
+def test_export_ndjson():
+    report = _create_report()
+
+    response = send_request(
+        "export_mta_sts_failure_details",
+        params={"organisation": report["organization-name"]},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    (policy,) = report["policies"]
+    assert len(rows) == len(policy["failure-details"])
+    for row, failure_detail in zip(rows, policy["failure-details"]):
+        assert row["report-id"] == report["report-id"]
+        assert row["organization-name"] == report["organization-name"]
+        assert row["policy-domain"] == policy["policy"]["policy-domain"]
+        assert row["result-type"] == failure_detail["result-type"]
+        assert row["failed-session-count"] == failure_detail["failed-session-count"]
+
+
+def test_export_csv_gzip():
+    report = _create_report()
+
+    response = send_request(
+        "export_mta_sts_failure_details",
+        params={
+            "organisation": report["organization-name"],
+            "format": "csv",
+            "gzip": True,
+        },
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "gzip"
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert tuple(rows[0]) == FIELDS
+    (policy,) = report["policies"]
+    assert len(rows) == 1 + len(policy["failure-details"])
+    assert {row[FIELDS.index("report-id")] for row in rows[1:]} == {report["report-id"]}
+
+
+def test_export_across_months():
+    # Stored first, but starting a month after the other report
+    later = json.loads(unique_report())
+    later["organization-name"] = f"Company-{uuid.uuid4()}"
+    later["date-range"] = {
+        "start-datetime": "2016-05-01T00:00:00Z",
+        "end-datetime": "2016-05-01T23:59:59Z",
+    }
+    response = send_request(
+        "create_mta_sts_report",
+        files={"report": ("report.json", json.dumps(later).encode())},
+    )
+    assert response.status_code == status.HTTP_201_CREATED, response.json()
+    report = _create_report(later["organization-name"])
+
+    response = send_request(
+        "export_mta_sts_failure_details",
+        params={"organisation": report["organization-name"]},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    expected = [
+        (stored["report-id"], stored["date-range"]["start-datetime"])
+        for stored in (report, later)
+        for _ in stored["policies"][0]["failure-details"]
+    ]
+    assert [(row["report-id"], row["start-datetime"]) for row in rows] == expected
+
+
+def test_export_nothing():
+    response = send_request(
+        "export_mta_sts_failure_details",
+        params={"organisation": f"Company-{uuid.uuid4()}", "format": "csv"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.text.splitlines() == [",".join(FIELDS)]
+
+
+@pytest.mark.parametrize("export_format", ["arrow", "parquet"])
+def test_export_columnar(export_format):
+    pa = pytest.importorskip("pyarrow")
+    report = _create_report()
+
+    response = send_request(
+        "export_mta_sts_failure_details",
+        params={"organisation": report["organization-name"], "format": export_format},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    if export_format == "arrow":
+        table = pa.ipc.open_stream(response.content).read_all()
+    else:
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(pa.BufferReader(response.content))
+    assert tuple(table.column_names) == COLUMNS
+    assert pa.types.is_dictionary(table.schema.field("policy-domain").type)
+    assert table.schema.field("sending-mta-ip").type == pa.binary(16)
+    rows = table.to_pylist()
+    (policy,) = report["policies"]
+    assert len(rows) == len(policy["failure-details"])
+    for row, failure_detail in zip(rows, policy["failure-details"]):
+        assert row["report-id"] == report["report-id"]
+        assert (
+            row["total-successful-session-count"]
+            == policy["summary"]["total-successful-session-count"]
+        )
+        assert row["result-type"] == failure_detail["result-type"]
+        assert ipaddress.ip_address(row["sending-mta-ip"]) == ipaddress.ip_address(
+            failure_detail["sending-mta-ip"]
+        ) or ipaddress.ip_address(
+            row["sending-mta-ip"]
+        ).ipv4_mapped == ipaddress.ip_address(
+            failure_detail["sending-mta-ip"]
+        )
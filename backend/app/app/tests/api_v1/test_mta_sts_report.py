@@ -1,16 +1,31 @@
+import gzip
 import io
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
-from app.core.exceptions import GzipError, JsonError
+from app.core.config import settings
+from app.core.exceptions import (
+    GzipError,
+    InvalidCursor,
+    JsonError,
+    ResourceAlreadyExists,
+    ResourceNotFound,
+)
+from app.core.mta_sts import MtaSts
+from app.core.mta_sts_stream import MtaStsReportStream
 from app.schemas.http_exception import HttpException
 from app.schemas.mta_sts_report import MtaStsReport
+from app.schemas.mta_sts_report_page import MtaStsReportPage
 from app.schemas.resource_created import ResourceCreated
 from app.tests.utils.utils import (
+    assert_max_queries,
     get_endpoint,
     get_test_data_path,
     pydandict_example,
     send_request,
+    unique_report,
 )
 from fastapi import status
 from fastapi.encoders import jsonable_encoder
@@ -54,6 +69,61 @@ def test_create_mta_sts_report_success_from_model():
     )
 
 
+def test_create_mta_sts_report_identical_upload():
+    report = unique_report()
+    created = send_request(
+        "create_mta_sts_report", files={"report": ("report.json", report)}
+    )
+    assert created.status_code == status.HTTP_201_CREATED, created.json()
+    identifier = ResourceCreated(**created.json()).identifier
+
+    response = send_request(
+        "create_mta_sts_report", files={"report": ("retry.json", report)}
+    )
+
+    assert response.status_code == status.HTTP_409_CONFLICT
+    exception = HttpException(**response.json())
+    assert exception.detail.code == ResourceAlreadyExists.ERROR_CODE
+    assert exception.detail.additional == [identifier]
+
+    response = send_request(
+        "create_mta_sts_reports", files={"reports": ("retry.json", report)}
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    (result,) = response.json()["results"]
+    assert result["status_code"] == status.HTTP_409_CONFLICT
+    assert result["detail"]["additional"] == [identifier]
+
+
+def test_create_mta_sts_report_concurrent_duplicates():
+    report = json.loads(unique_report())
+    report["organization-name"] = f"Company-{uuid.uuid4()}"
+    # Different bytes for the same report, so every upload gets past the content hash check and races for the INSERT
+    uploads = [json.dumps(report, indent=indent).encode() for indent in range(8)]
+
+    def upload(content: bytes):
+        return send_request(
+            "create_mta_sts_report", files={"report": ("report.json", content)}
+        )
+
+    with ThreadPoolExecutor(max_workers=len(uploads)) as executor:
+        responses = list(executor.map(upload, uploads))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [status.HTTP_201_CREATED] + [status.HTTP_409_CONFLICT] * 7
+    (identifier,) = {
+        ResourceCreated(**response.json()).identifier
+        for response in responses
+        if response.status_code == status.HTTP_201_CREATED
+    }
+    for response in responses:
+        if response.status_code == status.HTTP_409_CONFLICT:
+            exception = HttpException(**response.json())
+            assert exception.detail.code == ResourceAlreadyExists.ERROR_CODE
+            assert exception.detail.additional == [identifier]
+
+
 @pytest.mark.parametrize(
     "test_file_name", ["date_error.json", "missing_required_field.json"]
 )
@@ -72,6 +142,27 @@ def test_create_mta_sts_report_invalid_json(test_file_name: str):
     assert exception.detail.message == JsonError.MESSAGE
 
 
+def test_stream_mta_sts_report_invalid_json_before_large_tail():
+    padding = b"x" * max(64 * settings.MTA_STS_STREAM_CHUNK_SIZE, 1024 * 1024)
+    file = io.BytesIO(b'{"organization-name": tru, "padding": "' + padding + b'"}')
+
+    with pytest.raises(JsonError):
+        list(MtaStsReportStream(file))
+    # The syntax error is raised without reading the rest of the report
+    assert file.tell() < len(padding) // 16
+
+
+def test_inflated_size():
+    report = unique_report()
+    padded = report[:-1] + b', "padding": "' + b" " * (6 * 1024 * 1024) + b'"}'
+    compressed = gzip.compress(padded)
+    assert len(compressed) < len(padded) // 100
+
+    # From the gzip trailer, so a highly compressed report is streamed as well
+    assert MtaSts.inflated_size(io.BytesIO(compressed)) == len(padded)
+    assert MtaSts.inflated_size(io.BytesIO(report)) == len(report)
+
+
 def test_create_mta_sts_report_invalid_gz():
     test_file_path = get_test_data_path("truncated.gz")
 
@@ -103,3 +194,162 @@ def test_create_mta_sts_report_missing_parameter(files):
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
     assert response.headers.get("content-type") == "application/json"
     assert response.json() == expected_error
+
+
+def test_get_mta_sts_report():
+    report = json.loads(unique_report())
+    report["policies"][0]["failure-details"] *= 100
+    created = send_request(
+        "create_mta_sts_report",
+        files={"report": ("report.json", json.dumps(report).encode())},
+    )
+    assert created.status_code == status.HTTP_201_CREATED, created.json()
+    identifier = ResourceCreated(**created.json()).identifier
+
+    response = send_request(
+        "get_mta_sts_report", path_params={"identifier": identifier}
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    assert response.headers.get("content-type") == "application/json"
+    assert MtaStsReport(**response.json()) == MtaStsReport(**report)
+    etag = response.headers.get("etag")
+    assert etag
+
+    for if_none_match in (etag, f'"other", W/{etag}', "*"):
+        response = send_request(
+            "get_mta_sts_report",
+            path_params={"identifier": identifier},
+            headers={"If-None-Match": if_none_match},
+        )
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers.get("etag") == etag
+        assert response.content == b""
+
+    response = send_request(
+        "get_mta_sts_report",
+        path_params={"identifier": identifier},
+        headers={"If-None-Match": '"other"'},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers.get("etag") == etag
+
+
+def test_get_mta_sts_report_not_found():
+    response = send_request(
+        "get_mta_sts_report", path_params={"identifier": "cjld2cyuq0000t3rmniod1foy"}
+    )
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    exception = HttpException(**response.json())
+    assert exception.detail.code == ResourceNotFound.ERROR_CODE
+
+
+def test_list_mta_sts_reports():
+    organisation_name = f"Company-{uuid.uuid4()}"
+    identifiers = []
+    for day in range(1, 6):
+        report = json.loads(unique_report())
+        report["organization-name"] = organisation_name
+        report["date-range"] = {
+            "start-datetime": f"2016-04-0{day}T00:00:00Z",
+            "end-datetime": f"2016-04-0{day}T23:59:59Z",
+        }
+        if day == 3:
+            report["policies"][0]["policy"]["policy-domain"] = "company-z.example"
+        response = send_request(
+            "create_mta_sts_report",
+            files={"report": ("report.json", json.dumps(report).encode())},
+        )
+        assert response.status_code == status.HTTP_201_CREATED, response.json()
+        identifiers.append(ResourceCreated(**response.json()).identifier)
+
+    listed = []
+    params = {"organisation": organisation_name, "limit": 2}
+    while True:
+        response = send_request("list_mta_sts_reports", params=params)
+        assert response.status_code == status.HTTP_200_OK, response.json()
+        page = MtaStsReportPage(**response.json())
+        assert len(page.reports) <= 2
+        listed.extend(report.identifier for report in page.reports)
+        if page.next_cursor is None:
+            break
+        params["cursor"] = page.next_cursor
+    # The most recent first
+    assert listed == identifiers[::-1]
+
+    response = send_request(
+        "list_mta_sts_reports",
+        params={
+            "organisation": organisation_name,
+            "start-datetime": "2016-04-02T00:00:00Z",
+            "end-datetime": "2016-04-04T23:59:59Z",
+        },
+    )
+    assert response.json()["reports"][0]["date-range"] == {
+        "start-datetime": "2016-04-04T00:00:00Z",
+        "end-datetime": "2016-04-04T23:59:59Z",
+    }
+    page = MtaStsReportPage(**response.json())
+    assert [report.identifier for report in page.reports] == identifiers[3:0:-1]
+    assert page.next_cursor is None
+
+    response = send_request(
+        "list_mta_sts_reports",
+        params={
+            "organisation": organisation_name,
+            "policy-domain": "company-z.example",
+        },
+    )
+    page = MtaStsReportPage(**response.json())
+    assert [report.identifier for report in page.reports] == [identifiers[2]]
+
+
+def test_list_mta_sts_reports_invalid_cursor():
+    response = send_request("list_mta_sts_reports", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    exception = HttpException(**response.json())
+    assert exception.detail.code == InvalidCursor.ERROR_CODE
+
+
+def test_create_mta_sts_report_query_budget():
+    # The failure details of a policy are inserted together, however many there are
+    report = json.loads(unique_report())
+    report["policies"][0]["failure-details"] *= 100
+
+    with assert_max_queries("create_mta_sts_report", 20):
+        response = send_request(
+            "create_mta_sts_report",
+            files={"report": ("report.json", json.dumps(report).encode())},
+        )
+
+    assert response.status_code == status.HTTP_201_CREATED, response.json()
+
+
+def test_get_mta_sts_report_query_budget():
+    # The same number of queries however many policies the report has
+    report = json.loads(unique_report())
+    report["policies"] *= 10
+    created = send_request(
+        "create_mta_sts_report",
+        files={"report": ("report.json", json.dumps(report).encode())},
+    )
+    assert created.status_code == status.HTTP_201_CREATED, created.json()
+    identifier = ResourceCreated(**created.json()).identifier
+
+    with assert_max_queries("get_mta_sts_report", 5):
+        response = send_request(
+            "get_mta_sts_report", path_params={"identifier": identifier}
+        )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    assert len(response.json()["policies"]) == 10
+
+
+def test_list_mta_sts_reports_query_budget():
+    with assert_max_queries("list_mta_sts_reports", 2):
+        response = send_request("list_mta_sts_reports", params={"limit": 100})
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
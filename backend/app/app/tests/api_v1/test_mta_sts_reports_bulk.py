@@ -0,0 +1,125 @@
+import gzip
+import io
+import json
+import tarfile
+
+from app.core.exceptions import JsonError, ResourceAlreadyExists
+from app.schemas.bulk_resources_created import BulkResourcesCreated
+from app.tests.utils.utils import get_test_data_path, send_request, unique_report
+from fastapi import status
+
+
+def test_create_mta_sts_reports_ndjson():
+    report = unique_report()
+    with open(get_test_data_path("missing_required_field.json"), "rb") as f:
+        invalid = json.dumps(json.load(f)).encode()
+    body = b"\n".join([report, invalid, b"", report])
+
+    response = send_request(
+        "create_mta_sts_reports",
+        data=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    results = BulkResourcesCreated(**response.json()).results
+    assert [result.status_code for result in results] == [
+        status.HTTP_201_CREATED,
+        status.HTTP_422_UNPROCESSABLE_ENTITY,
+        status.HTTP_409_CONFLICT,
+    ]
+    assert [result.name for result in results] == ["line 1", "line 2", "line 4"]
+    assert results[1].detail.code == JsonError.ERROR_CODE
+    assert results[2].detail.code == ResourceAlreadyExists.ERROR_CODE
+    assert results[2].detail.additional == [results[0].identifier]
+
+
+def test_create_mta_sts_reports_ndjson_chunked():
+    reports = [unique_report(), unique_report()]
+    body = b"\n".join([reports[0], b"  ", reports[1], b""])
+
+    # Sent with chunked transfer encoding, the lines span several chunks
+    response = send_request(
+        "create_mta_sts_reports",
+        data=(body[start : start + 100] for start in range(0, len(body), 100)),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    results = BulkResourcesCreated(**response.json()).results
+    assert [result.status_code for result in results] == [status.HTTP_201_CREATED] * 2
+    assert [result.name for result in results] == ["line 1", "line 3"]
+
+
+def test_create_mta_sts_reports_value_too_long():
+    report = json.loads(unique_report())
+    # Longer than the ResultType column
+    report["policies"][0]["failure-details"][0]["result-type"] = "x" * 65
+    body = b"\n".join([unique_report(), json.dumps(report).encode()])
+
+    response = send_request(
+        "create_mta_sts_reports",
+        data=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    results = BulkResourcesCreated(**response.json()).results
+    assert [result.status_code for result in results] == [
+        status.HTTP_201_CREATED,
+        status.HTTP_422_UNPROCESSABLE_ENTITY,
+    ]
+    assert results[1].detail.code == JsonError.ERROR_CODE
+
+
+def test_create_mta_sts_reports_archive():
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for name in ("first.json.gz", "second.json.gz"):
+            content = gzip.compress(unique_report())
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+    response = send_request(
+        "create_mta_sts_reports",
+        data=archive.getvalue(),
+        headers={"Content-Type": "application/gzip"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    results = BulkResourcesCreated(**response.json()).results
+    assert [result.name for result in results] == ["first.json.gz", "second.json.gz"]
+    assert all(result.status_code == status.HTTP_201_CREATED for result in results)
+
+
+def test_create_mta_sts_reports_multipart():
+    response = send_request(
+        "create_mta_sts_reports",
+        files=[
+            ("reports", ("first.json", unique_report())),
+            ("reports", ("second.json.gz", gzip.compress(unique_report()))),
+            (
+                "reports",
+                ("truncated.gz", open(get_test_data_path("truncated.gz"), "rb")),
+            ),
+        ],
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    results = BulkResourcesCreated(**response.json()).results
+    assert [result.status_code for result in results] == [
+        status.HTTP_201_CREATED,
+        status.HTTP_201_CREATED,
+        status.HTTP_422_UNPROCESSABLE_ENTITY,
+    ]
+
+
+def test_create_mta_sts_reports_unsupported_media_type():
+    response = send_request(
+        "create_mta_sts_reports",
+        data=b"report",
+        headers={"Content-Type": "text/plain"},
+    )
+
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
@@ -0,0 +1,146 @@
+import ipaddress
+import json
+import uuid
+
+from app.schemas.mta_sts_statistics import (
+    DistinctSendingMtaIps,
+    MtaStsStatistics,
+    TopFailures,
+)
+from app.tests.utils.utils import send_request, unique_report
+from fastapi import status
+
+
+def test_get_mta_sts_statistics():
+    organisation_name = f"Company-{uuid.uuid4()}"
+    report = json.loads(unique_report())
+    for _ in range(2):
+        report["organization-name"] = organisation_name
+        report["report-id"] = str(uuid.uuid4())
+        response = send_request(
+            "create_mta_sts_report",
+            files={"report": ("report.json", json.dumps(report).encode())},
+        )
+        assert response.status_code == status.HTTP_201_CREATED, response.json()
+
+    response = send_request(
+        "get_mta_sts_statistics",
+        params={
+            "organisation": organisation_name,
+            "start-date": "2016-04-01",
+            "end-date": "2016-04-01",
+        },
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    (day,) = MtaStsStatistics(**response.json()).days
+    (policy,) = report["policies"]
+    assert day.organization_name == organisation_name
+    assert day.policy_domain == policy["policy"]["policy-domain"]
+    assert (
+        day.total_successful_session_count
+        == 2 * policy["summary"]["total-successful-session-count"]
+    )
+    assert (
+        day.total_failure_session_count
+        == 2 * policy["summary"]["total-failure-session-count"]
+    )
+    expected_failures = {}
+    for failure_detail in policy["failure-details"]:
+        result_type = failure_detail["result-type"]
+        expected_failures[result_type] = (
+            expected_failures.get(result_type, 0)
+            + 2 * failure_detail["failed-session-count"]
+        )
+    assert day.failed_session_counts == expected_failures
+
+    response = send_request(
+        "get_mta_sts_statistics",
+        params={"organisation": organisation_name, "start-date": "2016-04-02"},
+    )
+    assert MtaStsStatistics(**response.json()).days == []
+
+
+def test_get_mta_sts_top_failures():
+    policy_domain = f"{uuid.uuid4()}.example"
+    report = json.loads(unique_report())
+    (policy,) = report["policies"]
+    policy["policy"]["policy-domain"] = policy_domain
+    for _ in range(2):
+        report["report-id"] = str(uuid.uuid4())
+        response = send_request(
+            "create_mta_sts_report",
+            files={"report": ("report.json", json.dumps(report).encode())},
+        )
+        assert response.status_code == status.HTTP_201_CREATED, response.json()
+
+    expected = {}
+    for failure_detail in policy["failure-details"]:
+        sending_mta_ip = str(ipaddress.ip_address(failure_detail["sending-mta-ip"]))
+        expected[sending_mta_ip] = (
+            expected.get(sending_mta_ip, 0) + 2 * failure_detail["failed-session-count"]
+        )
+
+    response = send_request(
+        "get_mta_sts_top_failures",
+        params={"policy-domain": policy_domain, "start-date": "2016-04-01"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    top_failures = TopFailures(**response.json())
+    assert top_failures.total_failed_session_count == sum(expected.values())
+    assert top_failures.unlisted_failed_session_count == 0
+    assert {
+        value.value: value.failed_session_count for value in top_failures.values
+    } == expected
+    assert all(value.error == 0 for value in top_failures.values)
+    counts = [value.failed_session_count for value in top_failures.values]
+    assert counts == sorted(counts, reverse=True)
+
+    response = send_request(
+        "get_mta_sts_top_failures",
+        params={"policy-domain": policy_domain, "dimension": "result-type", "limit": 1},
+    )
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    (top,) = TopFailures(**response.json()).values
+    assert top.failed_session_count == max(
+        2 * failure_detail["failed-session-count"]
+        for failure_detail in policy["failure-details"]
+    )
+
+
+def test_get_mta_sts_distinct_sending_mta_ips():
+    policy_domain = f"{uuid.uuid4()}.example"
+    report = json.loads(unique_report())
+    (policy,) = report["policies"]
+    policy["policy"]["policy-domain"] = policy_domain
+    for _ in range(2):
+        report["report-id"] = str(uuid.uuid4())
+        response = send_request(
+            "create_mta_sts_report",
+            files={"report": ("report.json", json.dumps(report).encode())},
+        )
+        assert response.status_code == status.HTTP_201_CREATED, response.json()
+
+    response = send_request(
+        "get_mta_sts_distinct_sending_mta_ips",
+        params={"policy-domain": policy_domain, "start-date": "2016-04-01"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    distinct = DistinctSendingMtaIps(**response.json())
+    assert distinct.policy_domain == policy_domain
+    # Exact for so few senders
+    assert distinct.distinct_sending_mta_ip_count == len(
+        {
+            ipaddress.ip_address(failure_detail["sending-mta-ip"])
+            for failure_detail in policy["failure-details"]
+        }
+    )
+    assert 0 < distinct.relative_error < 0.05
+
+    response = send_request(
+        "get_mta_sts_distinct_sending_mta_ips",
+        params={"policy-domain": policy_domain, "start-date": "2016-04-02"},
+    )
+    assert DistinctSendingMtaIps(**response.json()).distinct_sending_mta_ip_count == 0
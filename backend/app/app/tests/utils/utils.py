@@ -1,5 +1,8 @@
+import contextlib
+import json
 import os
-from typing import Tuple
+import uuid
+from typing import Dict, Iterator, Tuple
 
 import requests
 from app.core.config import settings
@@ -15,6 +18,14 @@ def get_test_data_path(filename: str = None) -> str:
     return data_dir
 
 
+def unique_report() -> bytes:
+    """The example report with a new report-id, so it can be created again."""
+    with open(get_test_data_path("example.json"), "rb") as f:
+        report = json.load(f)
+    report["report-id"] = str(uuid.uuid4())
+    return json.dumps(report).encode()
+
+
 def init_operation_id_endpoints():
     """Caches the mapping between operation ids and endpoint/request method based on the the OpenAPI definition."""
     server_api = settings.SERVER_NAME
@@ -35,6 +46,7 @@ def get_endpoint(operation_id: str) -> Tuple[str, str]:
 
 def send_request(
     operation_id: str,
+    path_params=None,
     params=None,
     data=None,
     headers=None,
@@ -55,6 +67,7 @@ def send_request(
     All keyword arguments are passed directly to the requests.request method.
 
     :param operation_id: Endpoint identified by the operation id as found in the OpenAPI definition.
+    :param path_params: (optional) Dictionary of the values of the path parameters of the endpoint.
     :param params: (optional) Dictionary, list of tuples or bytes to send
         in the query string for the :class:`Request`.
     :param data: (optional) Dictionary, list of tuples, bytes, or file-like
@@ -87,7 +100,7 @@ def send_request(
     endpoint, method = get_endpoint(operation_id=operation_id)
     return requests.request(
         method=method,
-        url=endpoint,
+        url=endpoint.format(**(path_params or {})),
         params=params,
         data=data,
         headers=headers,
@@ -105,6 +118,50 @@ def send_request(
     )
 
 
+def get_metrics() -> Dict[str, float]:
+    """The samples of `GET /metrics` by name and labels, e.g. `tls_reporting_errors_total{code="409-01",...}`."""
+    response = send_request("get_metrics")
+    assert response.status_code == 200, response.text
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def _request_queries(operation_id: str) -> Tuple[float, float]:
+    """The SQL statements of the requests to the operation so far, and the number of requests."""
+    samples = get_metrics()
+    labels = f'{{operation="{operation_id}"}}'
+    return (
+        samples.get(f"tls_reporting_request_queries_sum{labels}", 0),
+        samples.get(f"tls_reporting_request_queries_count{labels}", 0),
+    )
+
+
+@contextlib.contextmanager
+def assert_max_queries(operation_id: str, budget: int) -> Iterator[None]:
+    """Asserts that each request to the operation sent by the block runs at most ``budget`` SQL statements.
+
+    The statements are counted by the server, see app/db/queries.py, so the server must have a single worker process
+    and no other requests to the operation may run meanwhile.
+
+    :param operation_id: The operation as found in the OpenAPI definition.
+    :param budget: The maximum number of statements per request, on average if the block sends more than one.
+    """
+    queries_before, requests_before = _request_queries(operation_id)
+    yield
+    queries_after, requests_after = _request_queries(operation_id)
+    requests = requests_after - requests_before
+    assert requests > 0, f"No request to {operation_id} was counted"
+    queries = queries_after - queries_before
+    assert queries <= budget * requests, (
+        f"{operation_id} ran {queries:g} SQL statements in {requests:g} requests, "
+        f"the budget being {budget} per request"
+    )
+
+
 def pydandict_example(schema: dict, definitions=None):
     if definitions is None:
         definitions = schema["definitions"]
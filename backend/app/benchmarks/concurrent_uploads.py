@@ -0,0 +1,119 @@
+"""Measures the throughput of concurrent uploads to `POST /mta-sts` of a running server.
+
+Run against the server before and after a change, e.g.
+
+    python -m benchmarks.concurrent_uploads --url http://127.0.0.1:8000 --uploads 500 --concurrency 32
+
+While the uploads are running, `GET /openapi.json` is polled as well: its latency shows how long the event loop is
+blocked by the uploads.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import List
+
+import httpx
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "app", "tests", "data"
+)
+
+
+def make_report(failure_details: int) -> bytes:
+    with open(os.path.join(DATA_DIR, "example.json")) as f:
+        report = json.load(f)
+    report["report-id"] = str(uuid.uuid4())
+    details = report["policies"][0]["failure-details"]
+    report["policies"][0]["failure-details"] = [
+        details[i % len(details)] for i in range(failure_details)
+    ]
+    return json.dumps(report).encode()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def upload(
+    client: httpx.AsyncClient,
+    queue: "asyncio.Queue[bytes]",
+    latencies: List[float],
+    statuses: List[int],
+):
+    while True:
+        try:
+            report = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        response = await client.post(
+            "/mta-sts", files={"report": ("report.json", report)}
+        )
+        latencies.append(time.perf_counter() - start)
+        statuses.append(response.status_code)
+
+
+async def probe(client: httpx.AsyncClient, done: asyncio.Event, latencies: List[float]):
+    while not done.is_set():
+        start = time.perf_counter()
+        await client.get("/openapi.json")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    queue: "asyncio.Queue[bytes]" = asyncio.Queue()
+    for _ in range(args.uploads):
+        queue.put_nowait(make_report(args.failure_details))
+
+    latencies: List[float] = []
+    probe_latencies: List[float] = []
+    statuses: List[int] = []
+    done = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=None
+    ) as client:
+        await client.get("/openapi.json")
+        probing = asyncio.ensure_future(probe(client, done, probe_latencies))
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                upload(client, queue, latencies, statuses)
+                for _ in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probing
+
+    return {
+        "uploads": args.uploads,
+        "concurrency": args.concurrency,
+        "failure_details": args.failure_details,
+        "seconds": round(elapsed, 3),
+        "uploads_per_second": round(args.uploads / elapsed, 1),
+        "upload_latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "upload_latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "probe_latency_p50_ms": round(percentile(probe_latencies, 0.5) * 1000, 1),
+        "probe_latency_p95_ms": round(percentile(probe_latencies, 0.95) * 1000, 1),
+        "statuses": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--failure-details", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
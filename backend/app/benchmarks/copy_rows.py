@@ -0,0 +1,254 @@
+"""Compares inserting policies and failure details on Postgres with ORM objects, a single ``executemany`` per batch
+and ``COPY ... FROM STDIN`` per batch, see ``bulk_insert``.
+
+The rows are inserted batch by batch, as by the ingestion, committing a transaction every ``--per-transaction`` rows,
+into a throwaway database migrated to the latest revision. The database is created on the server of
+``--database-url``, e.g. of a container started with
+
+    docker run --rm -e POSTGRES_HOST_AUTH_METHOD=trust -p 5432:5432 postgres:16
+    python -m benchmarks.copy_rows --database-url postgresql://postgres@localhost:5432/postgres
+
+or, without ``--database-url``, on a cluster initialised in a temporary directory with ``initdb`` and ``pg_ctl``,
+looked up in ``--pg-bin`` or on the PATH (Postgres refuses to run as root), e.g.
+
+    python -m benchmarks.copy_rows --pg-bin /usr/lib/postgresql/16/bin --rows 50000
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import ASYNC_DRIVERS, settings
+from app.db.utils import bulk_insert
+from app.models.mta_sts.failure_detail import (
+    FailureDetail,
+    failure_detail_partitions,
+    failure_details,
+)
+from app.models.mta_sts.policy import Policy, policies
+from app.schemas.mta_sts_report import MtaStsReport
+from benchmarks.concurrent_uploads import make_report
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+REPOSITORY = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+MONTH = datetime.date(2016, 4, 1)
+
+
+def _async_url(url: str) -> str:
+    scheme, separator, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+
+@contextlib.contextmanager
+def temporary_cluster(pg_bin: Optional[str]) -> Iterator[str]:
+    """A Postgres cluster in a temporary directory, stopped and removed afterwards.
+
+    :return: The URL of its ``postgres`` database.
+    """
+    executables = {}
+    for name in ("initdb", "pg_ctl"):
+        path = os.path.join(pg_bin, name) if pg_bin else shutil.which(name)
+        if path is None or not os.path.exists(path):
+            raise SystemExit(f"{name} not found, pass --pg-bin or --database-url")
+        executables[name] = path
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    with tempfile.TemporaryDirectory() as directory:
+        data = os.path.join(directory, "data")
+        subprocess.run(
+            [executables["initdb"], "-D", data, "-U", "postgres", "-A", "trust"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        subprocess.run(
+            [
+                executables["pg_ctl"],
+                "-D",
+                data,
+                "-o",
+                f"-p {port} -k {directory} -c listen_addresses=127.0.0.1",
+                "-l",
+                os.path.join(directory, "postgres.log"),
+                "-w",
+                "start",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            yield f"postgresql://postgres@127.0.0.1:{port}/postgres"
+        finally:
+            subprocess.run(
+                [executables["pg_ctl"], "-D", data, "-m", "fast", "-w", "stop"],
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+
+
+@contextlib.contextmanager
+def throwaway_database(server_url: str) -> Iterator[str]:
+    """A new database on the server, migrated to the latest revision and dropped afterwards.
+
+    :return: Its URL.
+    """
+    name = f"tls_reporting_benchmark_{uuid.uuid4().hex[:8]}"
+    # CREATE DATABASE cannot run in a transaction
+    server = create_engine(server_url, isolation_level="AUTOCOMMIT")
+    with server.connect() as connection:
+        connection.execute(text(f'CREATE DATABASE "{name}"'))
+    url = str(make_url(server_url).set(database=name))
+    try:
+        # Alembic migrates the database of the settings, see alembic/env.py
+        subprocess.run(
+            [sys.executable, "-m", "alembic", "upgrade", "head"],
+            cwd=REPOSITORY,
+            env={
+                **os.environ,
+                "SQLALCHEMY_DATABASE_URI": url,
+                "PYTHONPATH": os.path.join(REPOSITORY, "backend", "app"),
+            },
+            check=True,
+            stderr=subprocess.DEVNULL,
+        )
+        yield url
+    finally:
+        with server.connect() as connection:
+            connection.execute(text(f'DROP DATABASE "{name}"'))
+        server.dispose()
+
+
+def _failure_detail_rows(report_id: str, policy_id: str, count: int) -> List[dict]:
+    report = MtaStsReport.parse_raw(make_report(count))
+    return failure_details.rows(
+        report_id, policy_id, MONTH, report.policies[0].failure_details
+    )
+
+
+def _policy_rows(report_id: str, count: int) -> List[dict]:
+    policy = MtaStsReport.parse_raw(make_report(0)).policies[0]
+    return [
+        policies.row(report_id, policy.policy, policy.summary) for _ in range(count)
+    ]
+
+
+async def _insert(session, model, rows: List[Dict[str, Any]], method: str, args) -> int:
+    """Inserts the rows by the method, returning the rows per second."""
+    table = model.__table__
+    if model is FailureDetail:
+        async with session() as db:
+            table = await failure_detail_partitions.create(db, MONTH)
+            await db.commit()
+    settings.POSTGRES_BULK_COPY = method == "copy"
+    attributes = {
+        attribute.columns[0].name: attribute.key
+        for attribute in model.__mapper__.column_attrs
+    }
+    start = time.perf_counter()
+    for offset in range(0, len(rows), args.per_transaction):
+        async with session() as db:
+            transaction = rows[offset : offset + args.per_transaction]
+            for batch in range(0, len(transaction), args.batch_size):
+                batch_rows = transaction[batch : batch + args.batch_size]
+                if method == "orm":
+                    # The ORM inserts into the partitioned table, which routes the rows to the partition
+                    db.add_all(
+                        model(
+                            **{attributes[name]: value for name, value in row.items()}
+                        )
+                        for row in batch_rows
+                    )
+                    await db.flush()
+                else:
+                    await bulk_insert(db, table, batch_rows)
+            await db.commit()
+    return round(len(rows) / (time.perf_counter() - start))
+
+
+async def run(url: str, args: argparse.Namespace) -> dict:
+    engine = create_async_engine(_async_url(url))
+    session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    report_id = "benchmark"
+    async with session() as db:
+        await db.execute(
+            text(
+                'INSERT INTO "Organisations" ("OrganisationID", "Name") VALUES (\'benchmark\', \'Benchmark\')'
+            )
+        )
+        await db.execute(
+            text(
+                'INSERT INTO "Reports" ("ReportID", "StartDatetime", "EndDatetime", "ContactInfo", "ExternalID", '
+                "\"OrganisationID\") VALUES (:report_id, '2016-04-01', '2016-04-02', 'benchmark', 'benchmark', "
+                "'benchmark')"
+            ).bindparams(report_id=report_id)
+        )
+        await db.commit()
+    (policy_row,) = _policy_rows(report_id, 1)
+    async with session() as db:
+        await bulk_insert(db, Policy.__table__, [policy_row])
+        await db.commit()
+
+    results: Dict[str, Any] = {
+        "rows": args.rows,
+        "batch_size": args.batch_size,
+        "per_transaction": args.per_transaction,
+    }
+    for model, make_rows in (
+        (Policy, lambda: _policy_rows(report_id, args.rows)),
+        (
+            FailureDetail,
+            lambda: _failure_detail_rows(report_id, policy_row["PolicyID"], args.rows),
+        ),
+    ):
+        rows_per_second = {}
+        for method in args.methods:
+            rows_per_second[method] = await _insert(
+                session, model, make_rows(), method, args
+            )
+        results[f"{model.__table__.name}_rows_per_second"] = rows_per_second
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="Of a running server")
+    parser.add_argument("--pg-bin", help="The directory of initdb and pg_ctl")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.MTA_STS_FAILURE_DETAIL_BATCH_SIZE
+    )
+    parser.add_argument("--per-transaction", type=int, default=10_000)
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        choices=("orm", "executemany", "copy"),
+        default=["orm", "executemany", "copy"],
+    )
+    args = parser.parse_args()
+    with contextlib.ExitStack() as stack:
+        server_url = args.database_url or stack.enter_context(
+            temporary_cluster(args.pg_bin)
+        )
+        url = stack.enter_context(throwaway_database(server_url))
+        results = asyncio.run(run(url, args))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Compares the distinct sending MTA IPs of a policy domain estimated from the daily HyperLogLogs with the exact
+COUNT(DISTINCT) over the failure details, in latency and accuracy, over periods of increasing length.
+
+The database is filled as by ``benchmarks.top_failures``, the sketches are updated report by report as during
+ingestion, e.g.
+
+    python -m benchmarks.distinct_sending_mta_ips --days 30 --ips 200000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import time
+
+from app.crud import mta_sts
+from app.models.mta_sts import daily_sending_mta_ip_sketches
+from app.models.mta_sts.failure_detail import failure_detail_partitions
+from app.models.mta_sts.policy import Policy
+from app.models.mta_sts.report import Report
+from benchmarks.top_failures import POLICY_DOMAIN, populate, timed
+from sqlalchemy import func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+START = datetime.date(2016, 1, 1)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results = {
+        "failure_details": args.days * args.reports_per_day * args.failure_details,
+        "ips": args.ips,
+        "precision": daily_sending_mta_ip_sketches.precision,
+        "periods": [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        counts_by_day = populate(path, args)
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session = sessionmaker(engine, class_=AsyncSession)
+        async with session() as db:
+            start = time.perf_counter()
+            for day, counts in counts_by_day:
+                await daily_sending_mta_ip_sketches.add(db, day=day, counts=counts)
+            await db.commit()
+            results["sketch_update_ms_per_report"] = round(
+                (time.perf_counter() - start) / len(counts_by_day) * 1000, 2
+            )
+
+            for days in sorted({1, 7, args.days}):
+                end_day = START + datetime.timedelta(days=days - 1)
+
+                async def sketch():
+                    return await mta_sts.get_distinct_sending_mta_ips(
+                        db,
+                        policy_domain=POLICY_DOMAIN,
+                        start_day=START,
+                        end_day=end_day,
+                    )
+
+                async def exact():
+                    sending_mta_ips = union_all(
+                        *(
+                            select(partition.c.SendingMtaIp)
+                            .join(Policy, partition.c.PolicyID == Policy.policy_id)
+                            .join(Report, partition.c.ReportID == Report.report_id)
+                            .where(
+                                Policy.policy_domain == POLICY_DOMAIN,
+                                Report.start_datetime
+                                >= datetime.datetime.combine(START, datetime.time()),
+                                Report.start_datetime
+                                < datetime.datetime.combine(
+                                    end_day + datetime.timedelta(days=1),
+                                    datetime.time(),
+                                ),
+                            )
+                            for partition in map(
+                                failure_detail_partitions.table,
+                                await failure_detail_partitions.get_months(
+                                    db,
+                                    start=START,
+                                    end=end_day + datetime.timedelta(days=1),
+                                ),
+                            )
+                        )
+                    ).subquery()
+                    result = await db.execute(
+                        select(func.count(sending_mta_ips.c.SendingMtaIp.distinct()))
+                    )
+                    return result.scalar_one()
+
+                sketch_ms, estimate = await timed(sketch, args.repeat)
+                exact_ms, count = await timed(exact, args.repeat)
+                results["periods"].append(
+                    {
+                        "days": days,
+                        "exact": count,
+                        "estimate": estimate.distinct_sending_mta_ip_count,
+                        "relative_error": round(
+                            abs(estimate.distinct_sending_mta_ip_count - count) / count,
+                            4,
+                        ),
+                        "sketch_ms": sketch_ms,
+                        "exact_ms": exact_ms,
+                    }
+                )
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--reports-per-day", type=int, default=200)
+    parser.add_argument("--failure-details", type=int, default=100)
+    parser.add_argument("--ips", type=int, default=200_000)
+    parser.add_argument("--exponent", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
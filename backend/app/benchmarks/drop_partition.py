@@ -0,0 +1,88 @@
+"""Compares purging the failure details of a month by dropping its partition with deleting them chunk by chunk, as
+the retention job does for the months which did not expire as a whole.
+
+Two fresh SQLite databases are filled as by ``benchmarks.export_failure_details``, with all reports in January 2016,
+e.g.
+
+    python -m benchmarks.drop_partition --failure-details 2000000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import time
+
+from app.models.mta_sts import failure_details
+from app.models.mta_sts.failure_detail import failure_detail_partitions
+from app.models.mta_sts.report import Report
+from benchmarks.export_failure_details import populate
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+MONTH = datetime.date(2016, 1, 1)
+
+
+async def drop(session) -> dict:
+    async with session() as db:
+        start = time.perf_counter()
+        await failure_detail_partitions.drop(db, MONTH)
+        await db.commit()
+        seconds = time.perf_counter() - start
+    return {
+        "seconds": round(seconds, 3),
+        "longest_transaction_seconds": round(seconds, 3),
+    }
+
+
+async def delete_chunks(session, chunk_size: int) -> dict:
+    async with session() as db:
+        report_ids = (await db.execute(select(Report.report_id))).scalars().all()
+    start = time.perf_counter()
+    longest = 0.0
+    while True:
+        started = time.perf_counter()
+        async with session() as db:
+            count = await failure_details.delete_chunk(
+                db, report_ids=report_ids, start_month=MONTH, limit=chunk_size
+            )
+            await db.commit()
+        longest = max(longest, time.perf_counter() - started)
+        if count < chunk_size:
+            break
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "longest_transaction_seconds": round(longest, 3),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results = {"failure_details": args.failure_details}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("drop", "delete_chunks"):
+            path = os.path.join(directory, f"{name}.db")
+            populate(path, args.failure_details, args.per_report)
+            engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+            session = sessionmaker(engine, class_=AsyncSession)
+            if name == "drop":
+                results[name] = await drop(session)
+            else:
+                results[name] = await delete_chunks(session, args.chunk_size)
+            await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--failure-details", type=int, default=2_000_000)
+    # At most 44640 reports, one a minute, stay in January
+    parser.add_argument("--per-report", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
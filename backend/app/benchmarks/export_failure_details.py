@@ -0,0 +1,154 @@
+"""Measures the throughput and memory of `GET /mta-sts/export` on a large number of failure details.
+
+A fresh SQLite database is filled with synthetic reports of a single policy with a number of failure details each,
+after which all failure details are exported as the endpoint does, e.g.
+
+    python -m benchmarks.export_failure_details --failure-details 10000000 --format csv --gzip
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import resource
+import sqlite3
+import tempfile
+import time
+
+from app.core.mta_sts_export import ExportFormat
+from app.crud import mta_sts
+from app.db.base_class import Base
+from app.db.partitions import month_of, months_between
+from app.models.mta_sts.failure_detail import failure_detail_partitions
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+ORGANISATIONS = 300
+
+
+def populate(path: str, count: int, per_report: int) -> None:
+    report_count = -(-count // per_report)
+    start = datetime.datetime(2016, 1, 1)
+
+    def report_month(report: int) -> datetime.date:
+        return month_of(start + datetime.timedelta(minutes=report))
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    for month in months_between(start, report_month(report_count - 1)):
+        failure_detail_partitions.table(month).create(engine)
+    engine.dispose()
+
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany(
+            'INSERT INTO "Organisations" ("OrganisationID", "Name") VALUES (?, ?)',
+            ((f"org{i:022d}", f"Company-{i}") for i in range(ORGANISATIONS)),
+        )
+        connection.executemany(
+            'INSERT INTO "Reports" ("ReportID", "StartDatetime", "EndDatetime", "ContactInfo", "ExternalID", '
+            '"OrganisationID") VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                (
+                    f"rep{i:022d}",
+                    str(start + datetime.timedelta(minutes=i)),
+                    str(start + datetime.timedelta(minutes=i, hours=24)),
+                    "sts-reporting@company-x.example",
+                    str(i),
+                    f"org{i % ORGANISATIONS:022d}",
+                )
+                for i in range(report_count)
+            ),
+        )
+        connection.executemany(
+            'INSERT INTO "Policies" ("PolicyID", "PolicyType", "PolicyString", "PolicyDomain", "MxHost", '
+            '"TotalSuccessfulSessionCount", "TotalFailureSessionCount", "ReportID") VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                (
+                    f"pol{i:022d}",
+                    "sts",
+                    '["version: STSv1", "mode: testing"]',
+                    "company-y.example",
+                    "*.mail.company-y.example",
+                    5326,
+                    per_report,
+                    f"rep{i:022d}",
+                )
+                for i in range(report_count)
+            ),
+        )
+        for month, indexes in itertools.groupby(
+            range(count), key=lambda i: report_month(i // per_report)
+        ):
+            connection.executemany(
+                f'INSERT INTO "{failure_detail_partitions.name(month)}" ("ResultType", "SendingMtaIp", '
+                '"ReceivingMxHostname", "ReceivingIp", "FailedSessionCount", "PolicyID", "ReportID", "StartMonth") '
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        "certificate-expired",
+                        f"2001:db8:abcd:{i % 65536:x}::1",
+                        "mx1.mail.company-y.example",
+                        "203.0.113.56",
+                        1 + i % 100,
+                        f"pol{i // per_report:022d}",
+                        f"rep{i // per_report:022d}",
+                        str(month),
+                    )
+                    for i in indexes
+                ),
+            )
+    connection.execute("ANALYZE")
+    connection.close()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results = {
+        "failure_details": args.failure_details,
+        "format": args.format.value,
+        "gzip": args.gzip,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        start = time.perf_counter()
+        populate(path, args.failure_details, args.per_report)
+        results["populate_seconds"] = round(time.perf_counter() - start, 1)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        size = 0
+        start = time.perf_counter()
+        async with engine.connect() as connection:
+            async for chunk in mta_sts.export_failure_details(
+                connection, export_format=args.format, compress=args.gzip
+            ):
+                size += len(chunk)
+        seconds = time.perf_counter() - start
+        await engine.dispose()
+
+    results["export_seconds"] = round(seconds, 1)
+    results["rows_per_second"] = round(args.failure_details / seconds)
+    results["export_megabytes"] = round(size / 2 ** 20, 1)
+    # Kilobytes on Linux, the peak of the process including the population
+    results["peak_rss_megabytes_before"] = round(rss_before / 1024, 1)
+    results["peak_rss_megabytes_after"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--failure-details", type=int, default=10_000_000)
+    parser.add_argument("--per-report", type=int, default=100)
+    parser.add_argument(
+        "--format", type=ExportFormat, choices=list(ExportFormat), default="ndjson"
+    )
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
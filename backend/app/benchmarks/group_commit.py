@@ -0,0 +1,82 @@
+"""Compares concurrent uploads with and without group commit, see ``MTA_STS_GROUP_COMMIT``.
+
+A server is started per configuration on a fresh database: without group commit, then with group commit for each of
+``--delays``. Reports are uploaded to `POST /mta-sts` by ``--concurrency`` clients, as by
+``benchmarks.sqlite_profiles``, on SQLite (with the ``--sqlite-profile``), e.g.
+
+    python -m benchmarks.group_commit --uploads 2000 --concurrency 64 --delays 0 0.002 0.01
+
+or on a throwaway database on the Postgres server of ``--database-url``, see ``benchmarks.copy_rows``.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import tempfile
+from typing import Dict, Iterator, Optional
+
+from app.core.config import settings
+from benchmarks.copy_rows import throwaway_database
+from benchmarks.sqlite_profiles import PROFILES, run, server
+
+
+def _configurations(args: argparse.Namespace) -> Dict[str, Dict[str, str]]:
+    configurations = {"off": {"MTA_STS_GROUP_COMMIT": "false"}}
+    for delay in args.delays:
+        configurations[f"delay_{delay}"] = {
+            "MTA_STS_GROUP_COMMIT": "true",
+            "MTA_STS_GROUP_COMMIT_DELAY": str(delay),
+            "MTA_STS_GROUP_COMMIT_MAX_REPORTS": str(args.max_reports),
+        }
+    return configurations
+
+
+@contextlib.contextmanager
+def database(directory: str, name: str, server_url: Optional[str]) -> Iterator[str]:
+    if server_url:
+        with throwaway_database(server_url) as url:
+            yield url
+    else:
+        yield f"sqlite:///{os.path.join(directory, f'{name}.db')}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--failure-details", type=int, default=3)
+    parser.add_argument("--delays", type=float, nargs="+", default=[0, 0.002, 0.01])
+    parser.add_argument(
+        "--max-reports", type=int, default=settings.MTA_STS_GROUP_COMMIT_MAX_REPORTS
+    )
+    parser.add_argument(
+        "--sqlite-profile", choices=sorted(PROFILES), default="production"
+    )
+    parser.add_argument("--database-url", help="Of a running Postgres server")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8123)
+    args = parser.parse_args()
+    # The uploads only, see benchmarks.sqlite_profiles for concurrent reads
+    args.readers = 0
+    args.read_interval = 0
+    results = {
+        "uploads": args.uploads,
+        "concurrency": args.concurrency,
+        "failure_details": args.failure_details,
+        "database": "postgresql" if args.database_url else args.sqlite_profile,
+        "workers": args.workers,
+    }
+    environment = {} if args.database_url else PROFILES[args.sqlite_profile]
+    with tempfile.TemporaryDirectory() as directory:
+        for name, configuration in _configurations(args).items():
+            with database(directory, name, args.database_url) as database_uri:
+                with server(
+                    database_uri, {**environment, **configuration}, args
+                ) as url:
+                    results[name] = asyncio.run(run(url, args))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
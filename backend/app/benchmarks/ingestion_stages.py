@@ -0,0 +1,230 @@
+"""Measures the stages of ingesting a report one by one, and end-to-end through the app in-process.
+
+The report is made by ``benchmarks.report_generator``. The stages are:
+- read: reading the spooled upload
+- hash: the content hash
+- gunzip: only for ``--gzip``
+- json: parsing the JSON
+- validation: into an ``MtaStsReport``
+- persistence: ``create_mta_sts_report``
+- end_to_end: `POST /mta-sts` to the app through an in-process ASGI client, after the startup events of the app
+
+Every stage is repeated ``--repeat`` times, after ``--warmup`` runs. The stages that store a report get a new report
+of the same shape each time, generated with the next seed. Reports are stored in the database of
+SQLALCHEMY_DATABASE_URI, which must be migrated already, or in a fresh SQLite database migrated to the latest
+revision.
+
+The results are written as JSON to ``--output`` (and printed), stating the commit they were measured at. Pass the
+results of another commit as ``--baseline`` to add the change of each median, e.g.
+
+    python -m benchmarks.ingestion_stages --failure-details 100000 --gzip --output before.json
+    git checkout my-branch
+    python -m benchmarks.ingestion_stages --failure-details 100000 --gzip --baseline before.json
+"""
+import argparse
+import asyncio
+import contextlib
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Union
+
+import httpx
+from benchmarks.report_generator import add_arguments, generate_report, report_arguments
+from benchmarks.sqlite_profiles import BACKEND, REPOSITORY
+
+APP = os.path.join(BACKEND, "app")
+
+
+@contextlib.contextmanager
+def database() -> Iterator[None]:
+    """The database of SQLALCHEMY_DATABASE_URI, or a new SQLite database for the duration."""
+    if "SQLALCHEMY_DATABASE_URI" in os.environ:
+        yield
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(directory, 'stages.db')}",
+            "PYTHONPATH": BACKEND,
+        }
+        # Alembic migrates the database of the settings, see alembic/env.py
+        subprocess.run(
+            [sys.executable, "-m", "alembic", "upgrade", "head"],
+            cwd=REPOSITORY,
+            env=env,
+            check=True,
+            stderr=subprocess.DEVNULL,
+        )
+        os.environ["SQLALCHEMY_DATABASE_URI"] = env["SQLALCHEMY_DATABASE_URI"]
+        try:
+            yield
+        finally:
+            del os.environ["SQLALCHEMY_DATABASE_URI"]
+
+
+def commit() -> Optional[str]:
+    """The commit measured, marked as dirty if there are uncommitted changes."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=REPOSITORY,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def measure(
+    args: argparse.Namespace,
+    stage: Callable[[Any], Union[Any, Awaitable[Any]]],
+    prepare: Callable[[int], Any],
+) -> List[float]:
+    """The seconds of each repetition of the (async) stage, the input of repetition ``i`` being ``prepare(i)``."""
+    seconds = []
+    for repetition in range(args.warmup + args.repeat):
+        stage_input = prepare(repetition)
+        start = time.perf_counter()
+        result = stage(stage_input)
+        if inspect.isawaitable(result):
+            await result
+        if repetition >= args.warmup:
+            seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    # The settings are read from the environment on the first import of the app, see database()
+    from app.core.mta_sts import MtaSts
+    from app.crud import mta_sts
+    from app.db.session import AsyncSessionLocal, async_engine
+    from app.schemas.mta_sts_report import MtaStsReport
+    from starlette.datastructures import UploadFile
+
+    sys.path.insert(0, APP)
+    import main
+
+    arguments = report_arguments(args)
+
+    def report(repetition: int = 0) -> bytes:
+        return generate_report(**{**arguments, "seed": args.seed + repetition})
+
+    # The seeds of the reports stored by the stages do not overlap
+    stored_seeds = iter(range(args.seed + 1, sys.maxsize))
+
+    upload = report()
+    inflated = MtaSts.unzip(upload) if args.gzip else upload
+    raw_report = json.loads(inflated)
+
+    def spooled(_) -> UploadFile:
+        file = UploadFile("report.json")
+        file.file.write(upload)
+        return file
+
+    async def read(file: UploadFile) -> None:
+        await file.seek(0)
+        await file.read()
+        await file.close()
+
+    async def persist(mta_sts_report: MtaStsReport) -> None:
+        async with AsyncSessionLocal() as db:
+            await mta_sts.create_mta_sts_report(db, mta_sts_report)
+
+    stages: Dict[str, List[float]] = {}
+    stages["read"] = await measure(args, read, spooled)
+    stages["hash"] = await measure(args, MtaSts.content_hash, lambda _: upload)
+    if args.gzip:
+        stages["gunzip"] = await measure(args, MtaSts.unzip, lambda _: upload)
+    stages["json"] = await measure(args, json.loads, lambda _: inflated)
+    stages["validation"] = await measure(
+        args, lambda raw: MtaStsReport(**raw), lambda _: raw_report
+    )
+    stages["persistence"] = await measure(
+        args, persist, lambda _: MtaSts.decode(report(next(stored_seeds)))
+    )
+
+    await main.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+
+            async def post(body: bytes) -> None:
+                response = await client.post(
+                    "/mta-sts", files={"report": ("report.json", body)}
+                )
+                response.raise_for_status()
+
+            stages["end_to_end"] = await measure(
+                args, post, lambda _: report(next(stored_seeds))
+            )
+    finally:
+        await main.app.router.shutdown()
+        await async_engine.dispose()
+
+    return {
+        name: {
+            "median_seconds": round(statistics.median(seconds), 6),
+            "min_seconds": round(min(seconds), 6),
+            "failure_details_per_second": round(
+                args.failure_details / statistics.median(seconds)
+            ),
+        }
+        for name, seconds in stages.items()
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Adds the median of each stage relative to the baseline, above 1 being slower."""
+    if baseline["report"] != results["report"]:
+        print("The baseline was measured on another report", file=sys.stderr)
+    results["baseline_commit"] = baseline.get("commit")
+    for name, stage in results["stages"].items():
+        if name in baseline["stages"]:
+            stage["change"] = round(
+                stage["median_seconds"] / baseline["stages"][name]["median_seconds"], 3
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--output", help="The file to write the results to")
+    parser.add_argument("--baseline", help="The results of an earlier run")
+    args = parser.parse_args()
+
+    upload = generate_report(**report_arguments(args))
+    results: Dict[str, Any] = {
+        "commit": commit(),
+        "python": platform.python_version(),
+        "report": {
+            **report_arguments(args),
+            "upload_bytes": len(upload),
+        },
+        "repeat": args.repeat,
+    }
+    with database():
+        results["stages"] = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Measures the latency of `GET /mta-sts` pages, shallow and deep, on a large `Reports` table.
+
+A fresh SQLite database is filled with synthetic reports, after which the first and a deep page are retrieved both
+by seeking past a cursor, as the endpoint does, and by OFFSET for comparison, e.g.
+
+    python -m benchmarks.list_reports --reports 2000000 --page 10000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from app.db.base_class import Base
+from app.models.mta_sts import reports
+from app.models.mta_sts.report import Report
+from sqlalchemy import create_engine, desc, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+ORGANISATIONS = 300
+
+
+def populate(path: str, count: int) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    start = datetime.datetime(2016, 1, 1)
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany(
+            'INSERT INTO "Organisations" ("OrganisationID", "Name") VALUES (?, ?)',
+            ((f"org{i:022d}", f"Company-{i}") for i in range(ORGANISATIONS)),
+        )
+        connection.executemany(
+            'INSERT INTO "Reports" ("ReportID", "StartDatetime", "EndDatetime", "ContactInfo", "ExternalID", '
+            '"OrganisationID") VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                (
+                    f"rep{i:022d}",
+                    str(start + datetime.timedelta(minutes=i)),
+                    str(start + datetime.timedelta(minutes=i, hours=24)),
+                    "sts-reporting@company-x.example",
+                    str(i),
+                    f"org{i % ORGANISATIONS:022d}",
+                )
+                for i in range(count)
+            ),
+        )
+    connection.execute("ANALYZE")
+    connection.close()
+
+
+async def timed(coroutine_function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await coroutine_function()
+    return round((time.perf_counter() - start) / repeat * 1000, 2)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results = {"reports": args.reports, "page_size": args.page_size}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        start = time.perf_counter()
+        populate(path, args.reports)
+        results["populate_seconds"] = round(time.perf_counter() - start, 1)
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session = sessionmaker(engine, class_=AsyncSession)
+        async with session() as db:
+            order = (desc(Report.start_datetime), desc(Report.report_id))
+            for page in (1, args.page):
+                offset = (page - 1) * args.page_size
+                before = None
+                if offset:
+                    # The cursor a client would have received with the previous page
+                    before = tuple(
+                        (
+                            await db.execute(
+                                select(Report.start_datetime, Report.report_id)
+                                .order_by(*order)
+                                .offset(offset - 1)
+                                .limit(1)
+                            )
+                        ).one()
+                    )
+
+                async def keyset():
+                    await reports.get_page(db, limit=args.page_size, before=before)
+
+                async def by_offset():
+                    await db.execute(
+                        select(Report)
+                        .order_by(*order)
+                        .offset(offset)
+                        .limit(args.page_size)
+                    )
+
+                results[f"page_{page}_keyset_ms"] = await timed(keyset, args.repeat)
+                results[f"page_{page}_offset_ms"] = await timed(by_offset, args.repeat)
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=2_000_000)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
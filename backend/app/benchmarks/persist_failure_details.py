@@ -0,0 +1,108 @@
+"""Measures how fast the failure details of a single large report are persisted.
+
+The same report is stored twice in a fresh SQLite database, once by adding an ORM object per failure detail and once
+with the batched ``executemany`` inserts used by the ingestion, e.g.
+
+    python -m benchmarks.persist_failure_details --failure-details 100000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import time
+import uuid
+
+from app.core.mta_sts_stream import (
+    StreamedFailureDetails,
+    StreamedPolicy,
+    events_from_report,
+)
+from app.crud.mta_sts import create_mta_sts_report_from_events
+from app.db.base_class import Base
+from app.db.partitions import month_of
+from app.models.mta_sts import failure_details as crud_failure_details
+from app.models.mta_sts import policies
+from app.models.mta_sts.failure_detail import FailureDetail
+from app.schemas.mta_sts_report import MtaStsReport
+from benchmarks.concurrent_uploads import make_report
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+
+async def _persist_orm(db: AsyncSession, report_id: str, events) -> None:
+    """The policies as usual, but an ORM object per failure detail, in the (otherwise unused) unpartitioned table."""
+    policy_identifiers = {}
+    for event in events:
+        if isinstance(event, StreamedPolicy):
+            row = policies.row(report_id, event.policy, event.summary)
+            await policies.create_many(db, rows=[row])
+            policy_identifiers[event.policy_index] = row["PolicyID"]
+        elif isinstance(event, StreamedFailureDetails):
+            for row in crud_failure_details.rows(
+                report_id,
+                policy_identifiers[event.policy_index],
+                month_of(datetime.date.today()),
+                event.failure_details,
+            ):
+                db.add(
+                    FailureDetail(  # type: ignore
+                        **{
+                            attribute.key: row[attribute.columns[0].name]
+                            for attribute in inspect(FailureDetail).column_attrs
+                            if attribute.columns[0].name in row
+                        }
+                    )
+                )
+    await db.flush()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    report = MtaStsReport.parse_raw(make_report(args.failure_details))
+    results = {"failure_details": args.failure_details, "batch_size": args.batch_size}
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(directory, 'benchmark.db')}"
+        )
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with session() as db:
+            report.report_id = str(uuid.uuid4())
+            start = time.perf_counter()
+            await create_mta_sts_report_from_events(
+                db, events_from_report(report, args.batch_size)
+            )
+            results["executemany_seconds"] = round(time.perf_counter() - start, 3)
+
+        async with session() as db:
+            report.report_id = str(uuid.uuid4())
+            events = events_from_report(report, args.batch_size)
+            start = time.perf_counter()
+            identifier = await create_mta_sts_report_from_events(
+                db, [next(events)], commit=False
+            )
+            await _persist_orm(db, identifier.identifier, events)
+            await db.commit()
+            results["orm_seconds"] = round(time.perf_counter() - start, 3)
+        await engine.dispose()
+
+    results["speedup"] = round(
+        results["orm_seconds"] / results["executemany_seconds"], 1
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--failure-details", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Generates synthetic RFC 8460 (SMTP TLS reporting) reports, the same report for the same arguments.
+
+The failure details are spread evenly over the policies, the policies over ``domains`` policy domains, and the sending
+MTA IPs (IPv4 and IPv6 alternately) drawn from ``ips`` distinct addresses. Used by the benchmarks, or to write a report
+to a file, e.g.
+
+    python -m benchmarks.report_generator --policies 10 --failure-details 100000 --gzip --output report.json.gz
+"""
+import argparse
+import datetime
+import gzip as gzip_module
+import ipaddress
+import json
+import random
+import sys
+import uuid
+from typing import Any, Dict, List
+
+# The result types of RFC 8460, section 4.3
+RESULT_TYPES = (
+    "starttls-not-supported",
+    "certificate-host-mismatch",
+    "certificate-expired",
+    "certificate-not-trusted",
+    "validation-failure",
+    "tlsa-invalid",
+    "dnssec-invalid",
+    "dane-required",
+    "sts-policy-fetch-error",
+    "sts-policy-invalid",
+    "sts-webpki-invalid",
+)
+FAILURE_REASON_CODES = (
+    "X509_V_ERR_CERT_HAS_EXPIRED",
+    "X509_V_ERR_HOSTNAME_MISMATCH",
+    "X509_V_ERR_PROXY_PATH_LENGTH_EXCEEDED",
+    "X509_V_ERR_UNABLE_TO_GET_ISSUER_CERT_LOCALLY",
+)
+REPORT_INFO_URL = "https://reports.company-x.example/"
+IPV4_NETWORK = int(ipaddress.IPv4Address("10.0.0.0"))
+IPV6_NETWORK = int(ipaddress.IPv6Address("2001:db8::"))
+
+
+def sending_mta_ip(index: int) -> str:
+    """The ``index``-th of the distinct sending MTA IPs."""
+    if index % 2:
+        return str(ipaddress.IPv6Address(IPV6_NETWORK + index // 2))
+    return str(ipaddress.IPv4Address(IPV4_NETWORK + index // 2))
+
+
+def _policy(rng: random.Random, domain: str) -> Dict[str, Any]:
+    policy_type = rng.choices(("sts", "tlsa", "no-policy-found"), (7, 2, 1))[0]
+    if policy_type == "sts":
+        return {
+            "policy-type": "sts",
+            "policy-string": [
+                "version: STSv1",
+                f"mode: {rng.choice(('testing', 'enforce'))}",
+                f"mx: *.mail.{domain}",
+                "max_age: 86400",
+            ],
+            "policy-domain": domain,
+            "mx-host": f"*.mail.{domain}",
+        }
+    if policy_type == "tlsa":
+        return {
+            "policy-type": "tlsa",
+            "policy-string": [f"3 0 1 {rng.getrandbits(256):064X}"],
+            "policy-domain": domain,
+        }
+    return {
+        "policy-type": "no-policy-found",
+        "policy-string": [],
+        "policy-domain": domain,
+    }
+
+
+def _failure_detail(rng: random.Random, domain: str, ips: int) -> Dict[str, Any]:
+    detail = {
+        "result-type": rng.choice(RESULT_TYPES),
+        "sending-mta-ip": sending_mta_ip(rng.randrange(ips)),
+        "receiving-mx-hostname": f"mx{rng.randrange(1, 4)}.mail.{domain}",
+        "receiving-ip": f"203.0.113.{rng.randrange(1, 255)}",
+        "failed-session-count": rng.randint(1, 1000),
+    }
+    if rng.random() < 0.1:
+        information = f"report_info?id={rng.getrandbits(32):08x}"
+        detail["additional-information"] = REPORT_INFO_URL + information
+    if rng.random() < 0.1:
+        detail["failure-reason-code"] = rng.choice(FAILURE_REASON_CODES)
+    return detail
+
+
+def generate_report(
+    seed: int = 0,
+    policies: int = 1,
+    failure_details: int = 3,
+    ips: int = 100,
+    domains: int = 1,
+    gzip: bool = False,
+    day: datetime.date = datetime.date(2016, 4, 1),
+) -> bytes:
+    """A report as uploaded, its report ID (and so its content hash) differing per seed.
+
+    :param seed: Seeds the choices, such as the result types and the session counts.
+    :param policies: The number of policies.
+    :param failure_details: The number of failure details of all policies together.
+    :param ips: The number of distinct sending MTA IPs to choose from.
+    :param domains: The number of distinct policy domains, at most ``policies`` are used.
+    :param gzip: Whether the report is gzipped.
+    :param day: The day covered by the report.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime.combine(day, datetime.time())
+    report_policies: List[Dict[str, Any]] = []
+    for index in range(policies):
+        domain = f"company-{index % domains}.example"
+        count = failure_details // policies + (index < failure_details % policies)
+        details = [_failure_detail(rng, domain, ips) for _ in range(count)]
+        report_policies.append(
+            {
+                "policy": _policy(rng, domain),
+                "summary": {
+                    "total-successful-session-count": rng.randint(0, 100_000),
+                    "total-failure-session-count": sum(
+                        detail["failed-session-count"] for detail in details
+                    ),
+                },
+                "failure-details": details,
+            }
+        )
+    report = {
+        "organization-name": "Company-X",
+        "date-range": {
+            "start-datetime": f"{start:%Y-%m-%dT%H:%M:%SZ}",
+            "end-datetime": f"{start + datetime.timedelta(seconds=86399):%Y-%m-%dT%H:%M:%SZ}",
+        },
+        "contact-info": "sts-reporting@company-x.example",
+        "report-id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "policies": report_policies,
+    }
+    body = json.dumps(report).encode()
+    # Without a modification time in the header, the same report is gzipped to the same bytes
+    return gzip_module.compress(body, mtime=0) if gzip else body
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the arguments of ``generate_report`` to the parser, see ``report_arguments``."""
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--policies", type=int, default=1)
+    parser.add_argument("--failure-details", type=int, default=1000)
+    parser.add_argument("--ips", type=int, default=100)
+    parser.add_argument("--domains", type=int, default=1)
+    parser.add_argument("--gzip", action="store_true")
+
+
+def report_arguments(args: argparse.Namespace) -> Dict[str, Any]:
+    """The keyword arguments of ``generate_report`` parsed by a parser of ``add_arguments``."""
+    return {
+        "seed": args.seed,
+        "policies": args.policies,
+        "failure_details": args.failure_details,
+        "ips": args.ips,
+        "domains": args.domains,
+        "gzip": args.gzip,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument(
+        "--output", default="-", help="The file to write, - for standard output"
+    )
+    args = parser.parse_args()
+    report = generate_report(**report_arguments(args))
+    if args.output == "-":
+        sys.stdout.buffer.write(report)
+    else:
+        with open(args.output, "wb") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Compares concurrent uploads and reads of a server on SQLite with and without the production profile.
+
+For each profile a server is started on a fresh SQLite database migrated to the latest revision. Reports are uploaded
+to `POST /mta-sts` by ``--concurrency`` clients, as by ``benchmarks.concurrent_uploads``, while ``--readers`` clients
+list the reports and get the statistics every ``--read-interval`` seconds, e.g.
+
+    python -m benchmarks.sqlite_profiles --uploads 2000 --concurrency 64 --readers 8 --workers 2
+
+Failed requests, such as `database is locked` errors, are counted by status code.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List
+
+import httpx
+from benchmarks.concurrent_uploads import make_report, percentile, upload
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPOSITORY = os.path.dirname(os.path.dirname(BACKEND))
+
+PROFILES = {
+    "default": {"SQLITE_PRODUCTION": "false"},
+    "production": {"SQLITE_PRODUCTION": "true"},
+}
+
+
+@contextlib.contextmanager
+def server(
+    database_uri: str, environment: Dict[str, str], args: argparse.Namespace
+) -> Iterator[str]:
+    """A server with the environment on the database, migrated to the latest revision first.
+
+    :return: Its URL.
+    """
+    env = {
+        **os.environ,
+        **environment,
+        "SQLALCHEMY_DATABASE_URI": database_uri,
+        "PYTHONPATH": BACKEND,
+    }
+    # Alembic migrates the database of the settings, see alembic/env.py
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=REPOSITORY,
+        env=env,
+        check=True,
+        stderr=subprocess.DEVNULL,
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(args.port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=os.path.join(BACKEND, "app"),
+        env=env,
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{url}/openapi.json")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def read(
+    client: httpx.AsyncClient,
+    done: asyncio.Event,
+    interval: float,
+    latencies: List[float],
+    statuses: List[int],
+):
+    """Reads every ``interval`` seconds, so the readers put the same load on the server whatever the profile."""
+    while not done.is_set():
+        for path in ("/mta-sts?limit=10", "/mta-sts/statistics"):
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+            await asyncio.sleep(interval)
+
+
+async def run(url: str, args: argparse.Namespace) -> dict:
+    queue: "asyncio.Queue[bytes]" = asyncio.Queue()
+    for _ in range(args.uploads):
+        queue.put_nowait(make_report(args.failure_details))
+
+    upload_latencies: List[float] = []
+    upload_statuses: List[int] = []
+    read_latencies: List[float] = []
+    read_statuses: List[int] = []
+    done = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.concurrency + args.readers)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=None) as client:
+        readers = [
+            asyncio.ensure_future(
+                read(client, done, args.read_interval, read_latencies, read_statuses)
+            )
+            for _ in range(args.readers)
+        ]
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                upload(client, queue, upload_latencies, upload_statuses)
+                for _ in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*readers)
+
+    def statuses(values: List[int]) -> Dict[str, int]:
+        return {str(code): values.count(code) for code in sorted(set(values))}
+
+    results = {
+        "uploads_per_second": round(args.uploads / elapsed, 1),
+        "upload_latency_p50_ms": round(percentile(upload_latencies, 0.5) * 1000, 1),
+        "upload_latency_p95_ms": round(percentile(upload_latencies, 0.95) * 1000, 1),
+        "upload_statuses": statuses(upload_statuses),
+    }
+    if read_latencies:
+        results.update(
+            reads_per_second=round(len(read_latencies) / elapsed, 1),
+            read_latency_p50_ms=round(percentile(read_latencies, 0.5) * 1000, 1),
+            read_latency_p95_ms=round(percentile(read_latencies, 0.95) * 1000, 1),
+            read_statuses=statuses(read_statuses),
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--read-interval", type=float, default=0.05)
+    parser.add_argument("--failure-details", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument(
+        "--profiles", nargs="+", choices=sorted(PROFILES), default=sorted(PROFILES)
+    )
+    args = parser.parse_args()
+    results = {
+        "uploads": args.uploads,
+        "concurrency": args.concurrency,
+        "readers": args.readers,
+        "failure_details": args.failure_details,
+        "workers": args.workers,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in args.profiles:
+            database_uri = f"sqlite:///{os.path.join(directory, f'{profile}.db')}"
+            with server(database_uri, PROFILES[profile], args) as url:
+                results[profile] = asyncio.run(run(url, args))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
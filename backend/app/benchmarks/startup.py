@@ -0,0 +1,143 @@
+"""Measures the cold start of a worker: importing the app, and starting a server until it answers its first request.
+
+The import is timed in ``--runs`` fresh interpreters, reporting the median and the modules taking the longest to import
+themselves according to ``python -X importtime``. Then ``--runs`` servers are started one after the other on a fresh
+SQLite database, each timed from starting the process until `GET /mta-sts` answers, followed by the first and the
+second `GET /openapi.json`, e.g.
+
+    python -m benchmarks.startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+from benchmarks.sqlite_profiles import BACKEND, REPOSITORY
+
+APP = os.path.join(BACKEND, "app")
+
+IMPORT = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def _environment(database_uri: str) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "SQLALCHEMY_DATABASE_URI": database_uri,
+        "PYTHONPATH": BACKEND,
+    }
+
+
+def import_seconds(env: Dict[str, str]) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT],
+        cwd=APP,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output.splitlines()[-1])
+
+
+def slowest_imports(env: Dict[str, str], count: int) -> Dict[str, float]:
+    """The modules taking the longest to import, excluding the modules they import, in milliseconds."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=APP,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        modules.append((int(own) / 1000, name.strip()))
+    return {name: round(ms, 1) for ms, name in sorted(modules, reverse=True)[:count]}
+
+
+def serve(env: Dict[str, str], port: int) -> Dict[str, float]:
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=APP,
+        env=env,
+    )
+    try:
+        # A single client, as creating one takes longer than some of the requests
+        with httpx.Client(base_url=url) as client:
+            while True:
+                try:
+                    client.get("/mta-sts?limit=1").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    if process.poll() is not None:
+                        raise SystemExit("The server exited")
+                    time.sleep(0.005)
+            results = {"first_request_seconds": time.perf_counter() - start}
+            for name in ("first_openapi_seconds", "second_openapi_seconds"):
+                started = time.perf_counter()
+                client.get("/openapi.json").raise_for_status()
+                results[name] = time.perf_counter() - started
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _median(values: List[float]) -> float:
+    return round(statistics.median(values), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--slowest-imports", type=int, default=15)
+    parser.add_argument("--port", type=int, default=8123)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        env = _environment(f"sqlite:///{os.path.join(directory, 'startup.db')}")
+        # Alembic migrates the database of the settings, see alembic/env.py
+        subprocess.run(
+            [sys.executable, "-m", "alembic", "upgrade", "head"],
+            cwd=REPOSITORY,
+            env=env,
+            check=True,
+            stderr=subprocess.DEVNULL,
+        )
+        # Warms the bytecode cache, as a deployed image would
+        import_seconds(env)
+        imports = [import_seconds(env) for _ in range(args.runs)]
+        servers = [serve(env, args.port) for _ in range(args.runs)]
+        results = {
+            "runs": args.runs,
+            "import_seconds": _median(imports),
+            **{
+                name: _median([server[name] for server in servers])
+                for name in servers[0]
+            },
+            "slowest_imports_ms": slowest_imports(env, args.slowest_imports),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
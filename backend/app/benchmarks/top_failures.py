@@ -0,0 +1,205 @@
+"""Compares the top failing sending MTA IPs of a policy domain from the daily sketches with the exact GROUP BY over
+the failure details, in latency and accuracy.
+
+A fresh SQLite database is filled with synthetic reports whose failure details come from Zipf distributed sending
+MTA IPs; the sketches are updated report by report as during ingestion, e.g.
+
+    python -m benchmarks.top_failures --days 30 --reports-per-day 200 --failure-details 100
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from app.crud import mta_sts
+from app.db.base_class import Base
+from app.db.partitions import month_of
+from app.models.mta_sts import daily_failure_sketches
+from app.models.mta_sts.failure_detail import failure_detail_partitions
+from app.models.mta_sts.report import Report
+from app.models.mta_sts.rollup import ReportCounts
+from app.models.mta_sts.sketch import SketchDimension
+from sqlalchemy import create_engine, func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+POLICY_DOMAIN = "company-y.example"
+
+
+def zipf_ips(count: int, exponent: float):
+    weights = [1 / rank ** exponent for rank in range(1, count + 1)]
+    ips = [f"2001:db8:{rank >> 16:x}:{rank & 0xFFFF:x}::1" for rank in range(count)]
+    return ips, weights
+
+
+def populate(path: str, args: argparse.Namespace):
+    """Inserts the reports and returns the ReportCounts of every report, by day."""
+    rng = random.Random(42)
+    ips, weights = zipf_ips(args.ips, args.exponent)
+    start = datetime.datetime(2016, 1, 1)
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    for day in range(args.days):
+        failure_detail_partitions.table(
+            month_of(start + datetime.timedelta(days=day))
+        ).create(engine, checkfirst=True)
+    engine.dispose()
+
+    counts_by_day = []
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute(
+            'INSERT INTO "Organisations" ("OrganisationID", "Name") VALUES (?, ?)',
+            ("org", "Company-X"),
+        )
+        for day in range(args.days):
+            report_start = start + datetime.timedelta(days=day)
+            for report in range(args.reports_per_day):
+                report_id = f"rep{day:06d}{report:06d}"
+                connection.execute(
+                    'INSERT INTO "Reports" ("ReportID", "StartDatetime", "EndDatetime", "ContactInfo", '
+                    '"ExternalID", "OrganisationID") VALUES (?, ?, ?, ?, ?, ?)',
+                    (
+                        report_id,
+                        str(report_start),
+                        str(report_start + datetime.timedelta(hours=24)),
+                        "sts-reporting@company-x.example",
+                        report_id,
+                        "org",
+                    ),
+                )
+                connection.execute(
+                    'INSERT INTO "Policies" ("PolicyID", "PolicyType", "PolicyString", "PolicyDomain", '
+                    '"TotalSuccessfulSessionCount", "TotalFailureSessionCount", "ReportID") '
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (report_id, "sts", "[]", POLICY_DOMAIN, 0, 0, report_id),
+                )
+                counts = ReportCounts()
+                rows = []
+                for ip in rng.choices(ips, weights, k=args.failure_details):
+                    failed = rng.randint(1, 10)
+                    counts.add_failure(POLICY_DOMAIN, "certificate-expired", ip, failed)
+                    rows.append(
+                        (
+                            "certificate-expired",
+                            ip,
+                            failed,
+                            report_id,
+                            report_id,
+                            str(month_of(report_start)),
+                        )
+                    )
+                connection.executemany(
+                    f'INSERT INTO "{failure_detail_partitions.name(month_of(report_start))}" ("ResultType", '
+                    '"SendingMtaIp", "FailedSessionCount", "PolicyID", "ReportID", "StartMonth") '
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                counts_by_day.append((report_start.date(), counts))
+    connection.execute("ANALYZE")
+    connection.close()
+    return counts_by_day
+
+
+async def timed(coroutine_function, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = await coroutine_function()
+    return round((time.perf_counter() - start) / repeat * 1000, 2), result
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results = {
+        "failure_details": args.days * args.reports_per_day * args.failure_details,
+        "distinct_ips": args.ips,
+        "sketch_size": daily_failure_sketches.capacity,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+        counts_by_day = populate(path, args)
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session = sessionmaker(engine, class_=AsyncSession)
+        async with session() as db:
+            start = time.perf_counter()
+            for day, counts in counts_by_day:
+                await daily_failure_sketches.add(db, day=day, counts=counts)
+            await db.commit()
+            results["sketch_update_ms_per_report"] = round(
+                (time.perf_counter() - start) / len(counts_by_day) * 1000, 2
+            )
+
+            async def sketch():
+                return await mta_sts.get_top_failures(
+                    db,
+                    policy_domain=POLICY_DOMAIN,
+                    dimension=SketchDimension.SENDING_MTA_IP,
+                    limit=args.top,
+                )
+
+            async def exact():
+                failures = union_all(
+                    *(
+                        select(
+                            partition.c.SendingMtaIp, partition.c.FailedSessionCount
+                        ).join(Report, partition.c.ReportID == Report.report_id)
+                        for partition in map(
+                            failure_detail_partitions.table,
+                            await failure_detail_partitions.get_months(db),
+                        )
+                    )
+                ).subquery()
+                total = func.sum(failures.c.FailedSessionCount)
+                result = await db.execute(
+                    select(failures.c.SendingMtaIp, total)
+                    .group_by(failures.c.SendingMtaIp)
+                    .order_by(total.desc())
+                    .limit(args.top)
+                )
+                return result.all()
+
+            results["sketch_ms"], top_failures = await timed(sketch, args.repeat)
+            results["exact_ms"], exact_top = await timed(exact, args.repeat)
+        await engine.dispose()
+
+    exact_counts = dict(exact_top)
+    within_bounds = all(
+        value.failed_session_count - value.error
+        <= exact_counts.get(value.value, 0)
+        <= value.failed_session_count
+        for value in top_failures.values
+        if value.value in exact_counts
+    )
+    results["top_overlap"] = len(
+        {value.value for value in top_failures.values} & set(exact_counts)
+    )
+    results["max_error"] = max(value.error for value in top_failures.values)
+    results["max_relative_error"] = round(
+        max(value.error / value.failed_session_count for value in top_failures.values),
+        4,
+    )
+    results["within_bounds"] = within_bounds
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--reports-per-day", type=int, default=200)
+    parser.add_argument("--failure-details", type=int, default=100)
+    parser.add_argument("--ips", type=int, default=100_000)
+    parser.add_argument("--exponent", type=float, default=1.1)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()